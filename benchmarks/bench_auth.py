@@ -0,0 +1,104 @@
+"""Micro-benchmark of the overhead KeycloakAuth adds to each request.
+
+Run it with:
+```bash
+uv run python benchmarks/bench_auth.py
+```
+
+100 requests are sent concurrently through an `httpx.AsyncClient` backed by a `MockTransport`,
+once without auth, once with the previous implementation (lock and INFO log on every request)
+and once with the current one (lock-free while the token is valid). Log lines are rendered at
+INFO level into /dev/null, so their cost is included, but not the terminal output.
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+import httpx
+import structlog
+
+from exp_coord.services.s3i.base import auth as auth_module
+from exp_coord.services.s3i.base.auth import KeycloakAuth
+
+CONCURRENCY = 100
+ROUNDS = 200
+TOKEN_URL = "https://keycloak.example.com/realms/bench/protocol/openid-connect/token"
+
+
+class LockingKeycloakAuth(KeycloakAuth):
+    """The previous implementation, taking the lock and logging on every call."""
+
+    async def get_valid_token(self) -> str:
+        async with self._lock:
+            if not self._token_data or not self._is_token_valid(self._token_data):
+                await self._replace_token()
+            auth_module.logger.info("Got a valid token.")
+            return self._token_data.access_token
+
+
+def _token_endpoint(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(
+        200, json={"access_token": "token", "refresh_token": "refresh", "expires_in": 3600}
+    )
+
+
+def _api(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json=[])
+
+
+def _create_auth(auth_class: type[KeycloakAuth]) -> KeycloakAuth:
+    return auth_class(
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(_token_endpoint)),
+        keycloak_url="https://keycloak.example.com",
+        realm="bench",
+        client_id="bench",
+        client_secret="secret",
+        username="user",
+        password="password",
+    )
+
+
+async def _time_per_request(auth: KeycloakAuth | None) -> float:
+    """Return the median time per request of a round of concurrent requests, in microseconds."""
+    async with httpx.AsyncClient(
+        base_url="https://broker.example.com", transport=httpx.MockTransport(_api), auth=auth
+    ) as client:
+        await client.get("/warmup")  # Get the initial token outside of the measurement
+
+        durations = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            await asyncio.gather(*(client.get("/queue") for _ in range(CONCURRENCY)))
+            durations.append((time.perf_counter() - start) / CONCURRENCY * 1e6)
+
+    if auth is not None:
+        await auth.aclose()
+    return statistics.median(durations)
+
+
+async def main() -> None:
+    devnull = open(os.devnull, "w")  # noqa: SIM115
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+        logger_factory=structlog.PrintLoggerFactory(devnull),
+    )
+
+    baseline = await _time_per_request(None)
+    locking = await _time_per_request(_create_auth(LockingKeycloakAuth))
+    lock_free = await _time_per_request(_create_auth(KeycloakAuth))
+
+    print(f"{CONCURRENCY} concurrent requests, median of {ROUNDS} rounds")
+    print(f"{'variant':>22} {'per request [µs]':>18} {'auth overhead [µs]':>20}")
+    for name, value in (
+        ("no auth", baseline),
+        ("lock + log per call", locking),
+        ("lock-free fast path", lock_free),
+    ):
+        print(f"{name:>22} {value:>18.1f} {value - baseline:>20.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
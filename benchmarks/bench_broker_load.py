@@ -0,0 +1,168 @@
+"""Load test of the `run forever` loop against the in-process S3I stand-in.
+
+Run it with:
+```bash
+uv run python benchmarks/bench_broker_load.py --backlog 20000 --latency 0.02 --error-rate 0.05
+```
+
+The real Coordinator, S3IBrokerClient (with KeycloakAuth) and Processor receive events from
+`s3i_standin.S3IStandIn` instead of the S3I broker. The event queue starts with a backlog, and
+optionally more events arrive at a fixed rate while the coordinator runs. The handler only
+records when each event was handled, optionally after sleeping, so the numbers show the overhead
+of receiving and dispatching, not of MongoDB.
+
+Reported are the handled events per second and the p50/p99 latency from the moment an event
+entered the queue until its handler finished.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+
+import httpx
+import structlog
+from s3i_standin import S3IStandIn, StandInConfig
+
+from exp_coord.cli.run.coordinator import Coordinator
+from exp_coord.core.config import S3ISettings
+from exp_coord.services.s3i import (
+    EventHandler,
+    EventProcessor,
+    HTTPPool,
+    MessageProcessor,
+    S3IBrokerClient,
+    S3IEvent,
+)
+
+CLIENT_ID = "s3i:ab1b96cb-2181-41c6-8aaa-8ad61b813198"
+SETTINGS = S3ISettings(
+    client_id=CLIENT_ID,
+    client_secret="secret",
+    username="bench",
+    password="bench",
+    message_queue=f"s3ibs://{CLIENT_ID}",
+    event_queue=f"s3ib://{CLIENT_ID}/event",
+    auth_url="https://keycloak.example.com",
+    auth_realm="bench",
+    broker_url="https://broker.example.com",
+    config_url="https://config.example.com",
+)
+TOPICS = ("plant-growth-observation_status", "plant-growth-observation_new-image", "unknown")
+
+
+def _event(index: int) -> dict:
+    return {
+        "sender": "s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3",
+        "identifier": f"s3i:{uuid.uuid4()}",
+        "timestamp": int(time.time()),
+        "topic": TOPICS[index % len(TOPICS)],
+        "messageType": "eventMessage",
+        "content": {"type": "status", "status": "fetch", "index": index},
+    }
+
+
+async def _produce(standin: S3IStandIn, rate: float, duration: float, start_index: int) -> int:
+    """Add `rate * duration` events evenly over `duration` seconds, returning how many were added."""
+    total = int(rate * duration)
+    produced = 0
+    start = time.monotonic()
+    while produced < total:
+        due = min(int((time.monotonic() - start) * rate), total) - produced
+        if due > 0:
+            standin.fill_event_queue(
+                SETTINGS.event_queue, [_event(start_index + produced + i) for i in range(due)]
+            )
+            produced += due
+        await asyncio.sleep(0.01)
+    return produced
+
+
+async def run(args: argparse.Namespace) -> None:
+    standin = S3IStandIn(
+        StandInConfig(
+            latency=args.latency,
+            latency_jitter=args.jitter,
+            token_latency=args.latency,
+            error_rate=args.error_rate,
+            max_items_per_receive=args.max_items,
+            seed=args.seed,
+        )
+    )
+    standin.fill_event_queue(SETTINGS.event_queue, [_event(i) for i in range(args.backlog)])
+    expected = args.backlog + int(args.rate * args.duration)
+
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def handle(event: S3IEvent) -> None:
+        if args.handler_time:
+            await asyncio.sleep(args.handler_time)
+        latencies.append(time.monotonic() - standin.enqueued_at[event.identifier])
+        if len(latencies) >= expected:
+            done.set()
+
+    pool = HTTPPool(transport=httpx.ASGITransport(app=standin))
+    async with S3IBrokerClient(SETTINGS, pool=pool) as broker_client:
+        coordinator = Coordinator(
+            broker_client,
+            MessageProcessor([]),
+            EventProcessor(
+                [EventHandler("bench", None, handle)], max_concurrency=args.max_concurrency
+            ),
+            min_interval=0,
+            max_interval=args.max_interval,
+            exit_on_failure=False,
+        )
+
+        start = time.monotonic()
+        coordinator_task = asyncio.create_task(coordinator.run())
+        producer = asyncio.create_task(_produce(standin, args.rate, args.duration, args.backlog))
+        try:
+            await asyncio.wait_for(done.wait(), args.timeout)
+        except TimeoutError:
+            print(f"Timed out, {expected - len(latencies)} of {expected} events were not handled")
+        elapsed = time.monotonic() - start
+        coordinator.stop()
+        await coordinator_task
+        await producer
+    await pool.aclose()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"Handled {len(latencies)} events in {elapsed:.2f}s over {coordinator.cycles} cycles")
+    print(f"  throughput:    {len(latencies) / elapsed:>10,.0f} events/s")
+    print(f"  latency p50:   {quantiles[49] * 1000:>10.1f} ms")
+    print(f"  latency p99:   {quantiles[98] * 1000:>10.1f} ms")
+    print(
+        f"  broker:        {sum(standin.stats.requests.values())} requests, "
+        f"{standin.stats.errors} simulated errors, {standin.stats.tokens_issued} tokens issued"
+    )
+    print(f"  left in queue: {standin.backlog()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backlog", type=int, default=10_000, help="Events queued at the start")
+    parser.add_argument("--rate", type=float, default=0, help="Events arriving per second")
+    parser.add_argument("--duration", type=float, default=0, help="Seconds events arrive for")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 503s")
+    parser.add_argument("--max-items", type=int, default=None, help="Most events per receive")
+    parser.add_argument("--handler-time", type=float, default=0.0, help="Seconds per handler")
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--max-interval", type=float, default=1.0, help="Longest poll interval")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds until giving up")
+    args = parser.parse_args()
+    if args.backlog + int(args.rate * args.duration) == 0:
+        parser.error("Nothing to process, set --backlog or --rate and --duration")
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
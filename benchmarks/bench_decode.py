@@ -0,0 +1,87 @@
+"""Micro-benchmark of decoding broker JSON per message type, smart-mode union vs. tagged union.
+
+Run it with:
+```bash
+uv run python benchmarks/bench_decode.py
+```
+
+For every message type, a JSON array of messages of only that type is decoded with
+`validate_json`, once with the plain `Union` of all models like before, and once with the union
+tagged by `messageType`. Events are decoded with the union of messages and events, like the
+documents of the all_messages_and_events collection.
+"""
+
+import json
+import logging
+import timeit
+from typing import Any, Union, get_args
+
+import structlog
+from pydantic import TypeAdapter
+
+from exp_coord.services.s3i.broker.models import S3IEvent, S3IMessage, S3IMessageOrEvent
+
+MESSAGES_PER_ARRAY = 1_000
+
+_COMMON = {
+    "sender": "s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3",
+    "identifier": "s3i:6b1e5b41-1b0a-4bb8-9a2e-3fb8e58b6d35",
+    "receivers": ["s3i:ab1b96cb-2181-41c6-8aaa-8ad61b813198"],
+}
+_REQUEST = {**_COMMON, "replyToEndpoint": "s3ibs://s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3"}
+_REPLY = {**_COMMON, "replyingToMessage": "s3i:0e0e4d3f-5a5c-4ab4-b0ba-d2f0a1e1a1f4"}
+
+SAMPLES: dict[str, dict[str, Any]] = {
+    "userMessage": {
+        **_REQUEST,
+        "attachments": [{"filename": "image.jpg", "data": "aGVsbG8="}],
+        "subject": "Hello",
+        "text": "World",
+    },
+    "serviceRequest": {**_REQUEST, "serviceType": "fetch", "parameters": {"a": 1}},
+    "serviceReply": {**_REPLY, "serviceType": "fetch", "results": {"a": [1, 2, 3]}},
+    "getValueRequest": {**_REQUEST, "attributePath": "/attributes/name"},
+    "getValueReply": {**_REPLY, "value": "name"},
+    "setValueRequest": {**_REQUEST, "attributePath": "/attributes/name", "newValue": "name"},
+    "setValueReply": _REPLY,
+    "createAttributeRequest": {**_REQUEST, "attributePath": "/attributes/a", "newValue": "a"},
+    "createAttributeReply": {**_REPLY, "ok": True},
+    "deleteAttributeRequest": {**_REQUEST, "attributePath": "/attributes/a"},
+    "deleteAttributeReply": {**_REPLY, "ok": True},
+    "eventMessage": {
+        "sender": _COMMON["sender"],
+        "identifier": _COMMON["identifier"],
+        "timestamp": 1744000000,
+        "topic": "plant-growth-observation_status",
+        "content": {"type": "status", "status": "fetch"},
+    },
+}
+
+
+def _time_decode(adapter: TypeAdapter, content: bytes) -> float:
+    """Return the best throughput in messages per second."""
+    best = min(timeit.repeat(lambda: adapter.validate_json(content), number=5, repeat=5)) / 5
+    return MESSAGES_PER_ARRAY / best
+
+
+def main() -> None:
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+
+    message_models = get_args(get_args(S3IMessage)[0])
+    smart_messages = TypeAdapter(list[Union[message_models]])  # type: ignore[valid-type]
+    smart_all = TypeAdapter(list[Union[*message_models, S3IEvent]])  # type: ignore[valid-type]
+    tagged_messages = TypeAdapter(list[S3IMessage])
+    tagged_all = TypeAdapter(list[S3IMessageOrEvent])
+
+    print(f"Decoding arrays of {MESSAGES_PER_ARRAY} messages")
+    print(f"{'messageType':>24} {'smart union [msg/s]':>20} {'tagged [msg/s]':>16} {'speedup':>9}")
+    for message_type, sample in SAMPLES.items():
+        is_event = message_type == "eventMessage"
+        content = json.dumps([{**sample, "messageType": message_type}] * MESSAGES_PER_ARRAY)
+        smart = _time_decode(smart_all if is_event else smart_messages, content.encode())
+        tagged = _time_decode(tagged_all if is_event else tagged_messages, content.encode())
+        print(f"{message_type:>24} {smart:>20,.0f} {tagged:>16,.0f} {tagged / smart:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
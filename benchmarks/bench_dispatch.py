@@ -0,0 +1,78 @@
+"""Micro-benchmark comparing predicate-based handler lookup with the topic-indexed dispatch.
+
+Run it with:
+```bash
+uv run python benchmarks/bench_dispatch.py
+```
+
+For every handler count, each handler listens to its own topic. The "linear scan" handlers use
+a predicate like the handlers did before (including the `get_settings()` call), the "indexed"
+handlers declare their topic instead.
+"""
+
+import logging
+import timeit
+
+import structlog
+
+from exp_coord.core.config import get_settings
+from exp_coord.services.s3i import EventHandler, EventProcessor, S3IEvent
+
+HANDLER_COUNTS = (10, 100, 1_000)
+LOOKUPS = 2_000
+
+
+async def _handle(event: S3IEvent) -> None:
+    pass
+
+
+def _predicate_handler(topic: str) -> EventHandler:
+    def predicate(event: S3IEvent) -> bool:
+        get_settings()  # Like the predicates of the handlers, which read the topic from there
+        return event.topic == topic
+
+    return EventHandler(name=topic, predicate=predicate, handle=_handle)
+
+
+def _indexed_handler(topic: str) -> EventHandler:
+    return EventHandler(name=topic, predicate=None, handle=_handle, topic=topic)
+
+
+def _events(topics: list[str]) -> list[S3IEvent]:
+    return [
+        S3IEvent(
+            sender="s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3",
+            identifier=f"s3i:00000000-0000-0000-0000-{i:012d}",
+            timestamp=1744000000,
+            topic=topics[i % len(topics)],
+            content={},
+        )
+        for i in range(LOOKUPS)
+    ]
+
+
+def _time_lookups(processor: EventProcessor, events: list[S3IEvent]) -> float:
+    """Return the best time per lookup in microseconds."""
+
+    def run() -> None:
+        for event in events:
+            processor.find_handlers(event)
+
+    return min(timeit.repeat(run, number=1, repeat=5)) / len(events) * 1e6
+
+
+def main() -> None:
+    # Measure the lookup itself, not the rendering of the log lines
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+
+    print(f"{'handlers':>10} {'linear scan [µs]':>18} {'indexed [µs]':>14} {'speedup':>9}")
+    for count in HANDLER_COUNTS:
+        topics = [f"topic-{i}" for i in range(count)]
+        events = _events(topics)
+        linear = _time_lookups(EventProcessor([_predicate_handler(t) for t in topics]), events)
+        indexed = _time_lookups(EventProcessor([_indexed_handler(t) for t in topics]), events)
+        print(f"{count:>10} {linear:>18.2f} {indexed:>14.2f} {linear / indexed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
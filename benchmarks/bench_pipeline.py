@@ -0,0 +1,409 @@
+"""End-to-end benchmark of the event handlers, replaying synthetic event mixes.
+
+Run it with:
+```bash
+# Against an in-memory stand-in for MongoDB
+uv run python benchmarks/bench_pipeline.py --output results/$(git rev-parse --short HEAD).json
+# Against a local MongoDB, using (and dropping afterwards) the database exp_coord_benchmark
+uv run python benchmarks/bench_pipeline.py --mongodb-url mongodb://localhost:27017
+# Compare with an earlier run, failing if the throughput of a mix dropped by more than 10%
+uv run python benchmarks/bench_pipeline.py --compare results/baseline.json --threshold 10
+```
+
+Every mix is processed by an EventProcessor with `EVENT_HANDLERS`, like `run all` does,
+including the final flush of the batched writes. The mixes are:
+- status: Status events of known devices.
+- images: New image events with JPEGs of 1 to 10 MB.
+- unknown: Events of topics without a handler apart from saving every event.
+- mixed: 75% status, 5% images, 20% unknown.
+
+Per mix, the following is recorded:
+- The throughput in events per second.
+- A latency histogram per handler.
+- The MongoDB round trips by command: counted by a CommandListener for a real MongoDB, or by the
+  stand-in, which counts every operation as one round trip.
+- A second pass runs with tracemalloc, to record peak and allocated memory with the largest
+  allocation sites. It is separate, as tracemalloc slows everything down.
+
+The results are written as JSON, with the commit they were measured at.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator
+
+import structlog
+from beanie import init_beanie
+from memory_mongo import MemoryDatabase
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import monitoring
+
+import exp_coord.handlers.new_image
+from exp_coord.core.config import get_settings
+from exp_coord.db.connection import __models__
+from exp_coord.db.device import Device, device_registry
+from exp_coord.handlers import EVENT_HANDLERS
+from exp_coord.services.s3i import EventHandler, EventProcessor, S3IEvent
+
+MIXES: dict[str, dict[str, float]] = {
+    "status": {"status": 1.0},
+    "images": {"new_image": 1.0},
+    "unknown": {"unknown": 1.0},
+    "mixed": {"status": 0.75, "new_image": 0.05, "unknown": 0.2},
+}
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, math.inf)
+DEVICE_COUNT = 20
+IMAGE_SIZES_MB = (1, 2, 3, 5, 8, 10)
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands sent to a real MongoDB."""
+
+    def __init__(self) -> None:
+        self.round_trips: Counter[str] = Counter()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self.round_trips[event.command_name] += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+def _jpeg(size: int, rng: random.Random) -> str:
+    """A base64url-encoded blob of the given size, framed like a JPEG."""
+    payload = b"\xff\xd8\xff\xe0" + rng.randbytes(size - 6) + b"\xff\xd9"
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+class EventFactory:
+    """Creates the events of a mix lazily, reusing a few image payloads to bound the memory."""
+
+    def __init__(self, devices: list[str], seed: int) -> None:
+        self.devices = devices
+        self.rng = random.Random(seed)
+        self.images = [_jpeg(size * 1024 * 1024, self.rng) for size in IMAGE_SIZES_MB]
+        self.topics = get_settings().s3i.topics
+
+    def events(self, mix: dict[str, float], count: int) -> Iterator[S3IEvent]:
+        kinds, weights = list(mix), list(mix.values())
+        for index in range(count):
+            yield self._event(self.rng.choices(kinds, weights)[0], index)
+
+    def _event(self, kind: str, index: int) -> S3IEvent:
+        now = int(time.time())
+        if kind == "status":
+            topic, content = self.topics.status, {"type": "status", "status": "idle"}
+        elif kind == "new_image":
+            topic = self.topics.new_image
+            content = {
+                "type": "image/jpeg; encoding=base64url",
+                "path": f"/images/{index}.jpg",
+                "takenAt": now - index,
+                "image": self.rng.choice(self.images),
+            }
+        else:
+            topic, content = f"unknown_topic_{index % 5}", {"value": index}
+        return S3IEvent(
+            sender=self.rng.choice(self.devices),
+            # Unique across mixes, as the handlers skip events whose identifier they have seen
+            identifier=f"s3i:{uuid.UUID(int=self.rng.getrandbits(128), version=4)}",
+            timestamp=now,
+            topic=topic,
+            content=content,
+        )
+
+
+def _timed_handlers(latencies: dict[str, list[float]]) -> list[EventHandler]:
+    """Copy the event handlers, recording the duration of every call."""
+
+    def timed(name: str, handle: Callable[[S3IEvent], Awaitable[None]]):
+        async def timed_handle(event: S3IEvent) -> None:
+            start = time.perf_counter()
+            try:
+                await handle(event)
+            finally:
+                latencies[name].append(time.perf_counter() - start)
+
+        return timed_handle
+
+    return [
+        replace(handler, handle=timed(handler.name, handler.handle)) for handler in EVENT_HANDLERS
+    ]
+
+
+def _histogram(durations: list[float]) -> dict[str, Any]:
+    milliseconds = [duration * 1000 for duration in durations]
+    buckets = dict.fromkeys(HISTOGRAM_BUCKETS_MS, 0)
+    for value in milliseconds:
+        buckets[next(bound for bound in HISTOGRAM_BUCKETS_MS if value <= bound)] += 1
+    quantiles = (
+        statistics.quantiles(milliseconds, n=100, method="inclusive")
+        if len(milliseconds) > 1
+        else milliseconds * 99
+    )
+    return {
+        "count": len(milliseconds),
+        "p50_ms": quantiles[49],
+        "p90_ms": quantiles[89],
+        "p99_ms": quantiles[98],
+        "max_ms": max(milliseconds),
+        "buckets_ms": {
+            ("+Inf" if bound == math.inf else str(bound)): n for bound, n in buckets.items()
+        },
+    }
+
+
+class Backend:
+    """The database the handlers write to, with a way to count round trips."""
+
+    async def setup(self) -> None:
+        raise NotImplementedError
+
+    def round_trips(self) -> Counter[str]:
+        raise NotImplementedError
+
+    async def teardown(self) -> None:
+        pass
+
+
+class MemoryBackend(Backend):
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.database = MemoryDatabase()
+
+    async def setup(self) -> None:
+        await init_beanie(database=self.database, document_models=__models__)
+
+        async def upload(filename: str, file_data: Any, metadata: Any, bucket_name: str = "fs"):
+            # Like GridFS: check the indexes, insert all chunks at once, then the file document
+            self.database.round_trips["find"] += 1
+            self.database.round_trips["insert"] += 2
+            file_id = metadata.from_id
+            self.database.files[bucket_name][file_id] = len(file_data)
+            return file_id
+
+        exp_coord.handlers.new_image.upload_to_gridfs = upload
+
+    def round_trips(self) -> Counter[str]:
+        return self.database.round_trips
+
+
+class MongoBackend(Backend):
+    name = "mongodb"
+
+    def __init__(self, url: str, db_name: str) -> None:
+        self.counter = CommandCounter()
+        self.client = AsyncIOMotorClient(url, event_listeners=[self.counter])
+        self.client.get_io_loop = asyncio.get_running_loop
+        self.database = self.client[db_name]
+
+    async def setup(self) -> None:
+        await self.client.drop_database(self.database.name)
+        await init_beanie(database=self.database, document_models=__models__)
+
+        async def upload(filename: str, file_data: Any, metadata: Any, bucket_name: str = "fs"):
+            bucket = AsyncIOMotorGridFSBucket(self.database, bucket_name=bucket_name)
+            return await bucket.upload_from_stream(filename, file_data, metadata=metadata.dict())
+
+        exp_coord.handlers.new_image.upload_to_gridfs = upload
+
+    def round_trips(self) -> Counter[str]:
+        return self.counter.round_trips
+
+    async def teardown(self) -> None:
+        await self.client.drop_database(self.database.name)
+        self.client.close()
+
+
+async def _create_devices() -> list[str]:
+    devices = [
+        Device(
+            s3i_id=f"s3i:{index:08d}-1111-4111-8111-111111111111",
+            type="camera",
+            rhizotron_num=index,
+        )
+        for index in range(DEVICE_COUNT)
+    ]
+    await Device.insert_many(devices)
+    await device_registry.load()
+    return [device.s3i_id for device in devices]
+
+
+async def _run_mix(
+    backend: Backend,
+    factory: EventFactory,
+    mix: dict[str, float],
+    count: int,
+    max_concurrency: int | None,
+) -> dict[str, Any]:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    processor = EventProcessor(_timed_handlers(latencies), max_concurrency=max_concurrency)
+    before = Counter(backend.round_trips())
+
+    start = time.perf_counter()
+    processed = await processor.process_all(factory.events(mix, count))
+    elapsed = time.perf_counter() - start
+
+    round_trips = backend.round_trips() - before
+    return {
+        "events": processed,
+        "seconds": elapsed,
+        "events_per_second": processed / elapsed,
+        "handlers": {name: _histogram(durations) for name, durations in sorted(latencies.items())},
+        "round_trips": dict(sorted(round_trips.items())),
+        "round_trips_per_event": sum(round_trips.values()) / processed,
+    }
+
+
+async def _trace_mix(
+    factory: EventFactory, mix: dict[str, float], count: int, max_concurrency: int | None
+) -> dict[str, Any]:
+    processor = EventProcessor(EVENT_HANDLERS, max_concurrency=max_concurrency)
+    tracemalloc.start(10)
+    try:
+        await processor.process_all(factory.events(mix, count))
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    top = snapshot.statistics("lineno")[:10]
+    return {
+        "peak_bytes": peak,
+        "retained_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+        "top": [
+            {"location": str(stat.traceback[0]), "bytes": stat.size, "count": stat.count}
+            for stat in top
+        ],
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    backend: Backend = (
+        MongoBackend(args.mongodb_url, args.db_name) if args.mongodb_url else MemoryBackend()
+    )
+    await backend.setup()
+    try:
+        factory = EventFactory(await _create_devices(), args.seed)
+        results: dict[str, Any] = {}
+        for name in args.mix:
+            count = args.image_events if name == "images" else args.events
+            print(f"Running mix {name!r} with {count} events...")
+            results[name] = await _run_mix(
+                backend, factory, MIXES[name], count, args.max_concurrency
+            )
+            if args.tracemalloc:
+                results[name]["memory"] = await _trace_mix(
+                    factory, MIXES[name], count, args.max_concurrency
+                )
+    finally:
+        await backend.teardown()
+
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "backend": backend.name,
+        "parameters": {
+            "events": args.events,
+            "image_events": args.image_events,
+            "max_concurrency": args.max_concurrency,
+            "seed": args.seed,
+        },
+        "mixes": results,
+    }
+
+
+def _print_results(results: dict[str, Any]) -> None:
+    print(f"\n{'mix':>8} {'events/s':>10} {'round trips/event':>18} {'peak memory [MB]':>17}")
+    for name, mix in results["mixes"].items():
+        peak = mix.get("memory", {}).get("peak_bytes")
+        peak_mb = f"{peak / 1024**2:.1f}" if peak is not None else "-"
+        print(
+            f"{name:>8} {mix['events_per_second']:>10,.0f} {mix['round_trips_per_event']:>18.2f} {peak_mb:>17}"
+        )
+        for handler, histogram in mix["handlers"].items():
+            print(
+                f"{'':>8} {handler:>10}: p50 {histogram['p50_ms']:.2f} ms, "
+                f"p99 {histogram['p99_ms']:.2f} ms over {histogram['count']} calls"
+            )
+
+
+def _compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float) -> bool:
+    """Print the changes against the baseline, returning False if a mix regressed."""
+    print(f"\nCompared to {baseline.get('commit') or 'the baseline'}:")
+    ok = True
+    for name, mix in results["mixes"].items():
+        if name not in baseline["mixes"]:
+            continue
+        before = baseline["mixes"][name]
+        change = (mix["events_per_second"] / before["events_per_second"] - 1) * 100
+        trips = mix["round_trips_per_event"] - before["round_trips_per_event"]
+        regressed = change < -threshold
+        ok &= not regressed
+        print(
+            f"{name:>8}: throughput {change:+.1f}%, round trips/event {trips:+.2f}"
+            + ("  <-- REGRESSION" if regressed else "")
+        )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=MIXES, action="append", help="Default: all mixes")
+    parser.add_argument("--events", type=int, default=2_000, help="Events per mix")
+    parser.add_argument("--image-events", type=int, default=50, help="Events of the images mix")
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--mongodb-url", help="Use this MongoDB instead of the in-memory stand-in")
+    parser.add_argument("--db-name", default="exp_coord_benchmark", help="Dropped before and after")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=10, help="Allowed throughput drop in %%")
+    args = parser.parse_args()
+    args.mix = args.mix or list(MIXES)
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    results = asyncio.run(run(args))
+    _print_results(results)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"\nWrote the results to {args.output}")
+    if args.compare and not _compare(results, json.loads(args.compare.read_text()), args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""An in-memory stand-in for the parts of a motor database used by Beanie and the handlers.
+
+It is only meant for benchmarks without a MongoDB at hand. Documents are kept as dicts, and
+only the operations the handlers use are implemented, with filters limited to equality and
+`$in`, and bulk writes limited to `UpdateOne`. Every operation counts as one round trip, by command name, like a CommandListener would
+see it on a real server.
+"""
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.get_io_loop = None
+
+
+@dataclass
+class _InsertOneResult:
+    inserted_id: Any
+
+
+@dataclass
+class _InsertManyResult:
+    inserted_ids: list[Any]
+
+
+@dataclass
+class _UpdateResult:
+    matched_count: int
+    modified_count: int
+    upserted_id: Any = None
+    raw_result: dict[str, Any] = field(default_factory=dict)
+
+
+def _matches(document: dict[str, Any], query: dict[str, Any]) -> bool:
+    for key, expected in query.items():
+        value = document
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(expected, dict) and "$in" in expected:
+            if value not in expected["$in"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class MemoryCursor:
+    def __init__(self, documents: list[dict[str, Any]]) -> None:
+        self._documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._documents:
+            yield document
+
+    async def to_list(self, length: int | None = None) -> list[dict[str, Any]]:
+        return self._documents[:length] if length else list(self._documents)
+
+    # Beanie calls these on the cursor before iterating
+    def sort(self, *args: Any, **kwargs: Any) -> "MemoryCursor":
+        return self
+
+    def skip(self, *args: Any, **kwargs: Any) -> "MemoryCursor":
+        return self
+
+    def limit(self, *args: Any, **kwargs: Any) -> "MemoryCursor":
+        return self
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str) -> None:
+        self.database = database
+        self.name = name
+        self.documents: dict[Any, dict[str, Any]] = {}
+
+    def _count(self, command: str) -> None:
+        self.database.round_trips[command] += 1
+
+    async def index_information(self) -> dict[str, Any]:
+        return {"_id_": {"key": [("_id", 1)], "v": 2}}
+
+    async def create_indexes(self, indexes: list[Any], **kwargs: Any) -> list[str]:
+        self._count("createIndexes")
+        return [str(index) for index in indexes]
+
+    async def insert_one(self, document: dict[str, Any], **kwargs: Any) -> _InsertOneResult:
+        self._count("insert")
+        document.setdefault("_id", ObjectId())
+        self.documents[document["_id"]] = document
+        return _InsertOneResult(document["_id"])
+
+    async def insert_many(self, documents: list[dict[str, Any]], **kwargs: Any):
+        self._count("insert")
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self.documents[document["_id"]] = document
+        return _InsertManyResult([document["_id"] for document in documents])
+
+    async def find_one(self, query: dict[str, Any] | None = None, *args: Any, **kwargs: Any):
+        self._count("find")
+        # Beanie passes the query as a keyword argument
+        query = query if query is not None else kwargs.get("filter")
+        return next((d for d in self.documents.values() if _matches(d, query or {})), None)
+
+    def find(self, query: dict[str, Any] | None = None, *args: Any, **kwargs: Any):
+        self._count("find")
+        query = query if query is not None else kwargs.get("filter")
+        return MemoryCursor([d for d in self.documents.values() if _matches(d, query or {})])
+
+    async def update_one(self, query: dict[str, Any], update: dict[str, Any], **kwargs: Any):
+        self._count("update")
+        return self._update(query, update, upsert=kwargs.get("upsert", False))
+
+    async def bulk_write(self, requests: list[UpdateOne], **kwargs: Any) -> None:
+        # A single update command on a server, as long as all requests are updates
+        self._count("update")
+        for request in requests:
+            self._update(request._filter, request._doc, upsert=bool(request._upsert))
+
+    def _update(self, query: dict[str, Any], update: dict[str, Any], upsert: bool) -> _UpdateResult:
+        document = next((d for d in self.documents.values() if _matches(d, query)), None)
+        if document is None:
+            if not upsert:
+                return _UpdateResult(0, 0)
+            document = {"_id": ObjectId(), **{k: v for k, v in query.items() if "." not in k}}
+            self.documents[document["_id"]] = document
+        for key, value in update.get("$set", {}).items():
+            document[key] = value
+        for key, value in update.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + value
+        return _UpdateResult(1, 1)
+
+
+class MemoryDatabase:
+    """Pass it to `init_beanie(database=...)` instead of a motor database."""
+
+    def __init__(self, name: str = "benchmark") -> None:
+        self.name = name
+        self.client = _Client()
+        self.collections: dict[str, MemoryCollection] = {}
+        self.round_trips: Counter[str] = Counter()
+        # Sizes of the files stored through `upload_to_gridfs`, by bucket and file ID
+        self.files: dict[str, dict[Any, int]] = defaultdict(dict)
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(self, name)
+        return self.collections[name]
+
+    def get_collection(self, name: str, **kwargs: Any) -> MemoryCollection:
+        return self[name]
+
+    async def command(self, command: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        if "buildInfo" in command:
+            return {"version": "7.0.0"}
+        self.round_trips[next(iter(command))] += 1
+        return {"ok": 1}
+
+    async def list_collection_names(self, **kwargs: Any) -> list[str]:
+        return list(self.collections)
+
+    def reset_round_trips(self) -> None:
+        self.round_trips.clear()
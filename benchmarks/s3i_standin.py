@@ -0,0 +1,199 @@
+"""An in-process stand-in for the S3I broker and Keycloak, to load-test without the real services.
+
+The stand-in is a plain ASGI app, so it can be used with `httpx.ASGITransport` without any
+server or network:
+
+```python
+standin = S3IStandIn(StandInConfig(latency=0.005, error_rate=0.01))
+standin.fill_event_queue(settings.event_queue, [...])
+pool = HTTPPool(transport=httpx.ASGITransport(app=standin))
+async with S3IBrokerClient(settings, pool=pool) as client:
+    events = await client.receive_all_events()
+```
+
+It implements the endpoints used by the clients:
+- `POST /realms/{realm}/protocol/openid-connect/token`: Hands out tokens for any credentials.
+- `GET /{queue}`: Pops the oldest item of the queue, or returns an empty body.
+- `GET /{queue}/all`: Pops all items of the queue, or up to `max_items_per_receive`.
+- `POST /{queue}[,{queue}...]`: Appends the message to every listed message queue.
+- `POST /{topic}`: Appends the event to all event queues.
+
+Broker endpoints require a token from the token endpoint. Latency and errors are simulated per
+request according to the `StandInConfig`.
+"""
+
+import asyncio
+import json
+import random
+import secrets
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class StandInConfig:
+    # Seconds every broker request takes, plus a uniformly distributed jitter of up to latency_jitter
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    # Seconds every token request takes
+    token_latency: float = 0.0
+    # Fraction of broker requests answered with a 503, without changing any queue
+    error_rate: float = 0.0
+    # Seconds until a token expires
+    token_lifetime: int = 300
+    # Most items returned by one `/{queue}/all`, all of them if None
+    max_items_per_receive: int | None = None
+    seed: int | None = None
+
+
+@dataclass
+class StandInStats:
+    requests: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    errors: int = 0
+    tokens_issued: int = 0
+    items_delivered: int = 0
+
+
+class S3IStandIn:
+    """An ASGI app standing in for the S3I broker and Keycloak."""
+
+    def __init__(self, config: StandInConfig | None = None) -> None:
+        self.config = config if config is not None else StandInConfig()
+        self.stats = StandInStats()
+        self.queues: dict[str, deque[bytes]] = defaultdict(deque)
+        self.event_queues: set[str] = set()
+        # Monotonic time each item was enqueued, by its identifier, to measure the latency
+        self.enqueued_at: dict[str, float] = {}
+        self._tokens: set[str] = set()
+        self._random = random.Random(self.config.seed)
+
+    def fill_event_queue(self, queue: str, events: list[dict[str, Any]]) -> None:
+        """Create an event queue, which receives all events sent to any topic, with a backlog."""
+        self.event_queues.add(queue)
+        self._enqueue(queue, events)
+
+    def fill_message_queue(self, queue: str, messages: list[dict[str, Any]]) -> None:
+        """Create a message queue with a backlog."""
+        self._enqueue(queue, messages)
+
+    def backlog(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            return
+        method: str = scope["method"]
+        path: str = scope["path"].lstrip("/")
+        body = await _read_body(receive)
+
+        if path.startswith("realms/") and path.endswith("/protocol/openid-connect/token"):
+            await self._sleep(self.config.token_latency)
+            await self._respond_token(send)
+            return
+
+        self.stats.requests[method] += 1
+        if not self._is_authorized(scope):
+            await _respond(send, 401, {"error": "Invalid or missing token"})
+            return
+        await self._sleep(self.config.latency + self._random.uniform(0, self.config.latency_jitter))
+        if self._random.random() < self.config.error_rate:
+            self.stats.errors += 1
+            await _respond(send, 503, {"error": "Simulated error"})
+            return
+
+        if method == "GET" and path.endswith("/all"):
+            await self._respond_all(send, path.removesuffix("/all"))
+        elif method == "GET":
+            await self._respond_one(send, path)
+        elif method == "POST":
+            self._receive(path, body)
+            await _respond(send, 201, None)
+        else:  # pragma: no cover
+            await _respond(send, 405, {"error": f"{method} is not supported"})
+
+    def _enqueue(self, queue: str, items: list[dict[str, Any]]) -> None:
+        now = time.monotonic()
+        for item in items:
+            self.enqueued_at.setdefault(item["identifier"], now)
+            self.queues[queue].append(json.dumps(item).encode())
+
+    def _receive(self, path: str, body: bytes) -> None:
+        item = json.loads(body)
+        self.enqueued_at.setdefault(item["identifier"], time.monotonic())
+        queues = path.split(",") if path.startswith("s3ibs://") else self.event_queues
+        for queue in queues:
+            self.queues[queue].append(body)
+
+    async def _respond_all(self, send: Send, queue_name: str) -> None:
+        queue = self.queues[queue_name]
+        count = len(queue)
+        if self.config.max_items_per_receive is not None:
+            count = min(count, self.config.max_items_per_receive)
+        items = [queue.popleft() for _ in range(count)]
+        self.stats.items_delivered += count
+        await _respond_raw(send, 200, b"[" + b",".join(items) + b"]")
+
+    async def _respond_one(self, send: Send, queue_name: str) -> None:
+        queue = self.queues[queue_name]
+        if not queue:
+            await _respond_raw(send, 200, b"")
+            return
+        self.stats.items_delivered += 1
+        await _respond_raw(send, 200, queue.popleft())
+
+    async def _respond_token(self, send: Send) -> None:
+        token = secrets.token_hex(16)
+        self._tokens.add(token)
+        self.stats.tokens_issued += 1
+        await _respond(
+            send,
+            200,
+            {
+                "access_token": token,
+                "refresh_token": secrets.token_hex(16),
+                "expires_in": self.config.token_lifetime,
+            },
+        )
+
+    def _is_authorized(self, scope: Scope) -> bool:
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"").decode()
+        return authorization.removeprefix("Bearer ") in self._tokens
+
+    @staticmethod
+    async def _sleep(seconds: float) -> None:
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def _respond(send: Send, status: int, content: Any) -> None:
+    await _respond_raw(send, status, b"" if content is None else json.dumps(content).encode())
+
+
+async def _respond_raw(send: Send, status: int, body: bytes) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -52,15 +52,13 @@ async def _(AllMessagesAndEvents, mo, total_message_count):
 
 
 @app.cell
-async def _(AllMessagesAndEvents, mo):
-    _pipeline = [
-        # Not actually needed as only events have topics
-        {"$match": {"data.messageType": "eventMessage"}},
-        {"$group": {"_id": "$data.topic", "count": {"$sum": 1}}},
-    ]
-    _raw_results = await AllMessagesAndEvents.aggregate(_pipeline).to_list()
+async def _(count_messages_by, mo):
+    # Summed up from the hourly rollups instead of grouping all messages and events
     _counts: list[dict[str, str | int]] = [
-        {"topic": item["_id"], "count": item["count"]} for item in _raw_results
+        {"topic": topic, "count": count}
+        for topic, count in (
+            await count_messages_by("topic", match={"message_type": "eventMessage"})
+        ).items()
     ]
 
     # Extract for use down below
@@ -82,15 +80,10 @@ async def _(AllMessagesAndEvents, mo):
 
 
 @app.cell
-async def _(AllMessagesAndEvents, mo):
-    _pipeline = [
-        {"$match": {"data.messageType": "eventMessage"}},
-        {"$match": {"data.topic": "plant-growth-observation_status"}},
-        {"$group": {"_id": "$data.content.status", "count": {"$sum": 1}}},
-    ]
-    _raw_results = await AllMessagesAndEvents.aggregate(_pipeline).to_list()
+async def _(count_statuses_by, mo):
     _counts: list[dict[str, str | int]] = [
-        {"status": item["_id"], "count": item["count"]} for item in _raw_results
+        {"status": status, "count": count}
+        for status, count in (await count_statuses_by("status")).items()
     ]
 
     # Extract the amount of capture statuses for later use
@@ -186,7 +179,8 @@ async def _(AllMessagesAndEvents, datetime, mo):
 def _():
     from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
     from exp_coord.db.image import Image
-    return AllMessagesAndEvents, Image
+    from exp_coord.db.rollups import count_messages_by, count_statuses_by
+    return AllMessagesAndEvents, Image, count_messages_by, count_statuses_by
 
 
 @app.cell(hide_code=True)
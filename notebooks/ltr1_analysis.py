@@ -32,58 +32,51 @@ def _(datetime, mo, timedelta):
 
 @app.cell
 async def _(AllMessagesAndEvents, Image, Status, end_time, start_time):
-    # Fetch all messages, all images and all statuses in the time period above
-
-    all_images = await Image.find_many(
-        Image.taken_at > start_time.value and Image.taken_at < end_time.value
-    ).to_list()
-    all_statuses = await Status.find_many(
-        Status.received_timestamp > start_time.value
-        and Status.received_timestamp < end_time.value
-    ).to_list()
-    all_messages = await AllMessagesAndEvents.find_many(
-        AllMessagesAndEvents.added_at > start_time.value
-        and AllMessagesAndEvents.added_at < end_time.value
-    ).to_list()
-
-    from itertools import chain as _chain
-
-    for entry in _chain(all_images, all_statuses, all_messages):
-        await entry.fetch_all_links()
+    # Count all messages, all images and all statuses in the time period above. The counts are
+    # computed by MongoDB, so no documents are loaded.
+    from exp_coord.db.queries import (
+        TimeWindow,
+        count_by,
+        count_in_window,
+        stream_messages_and_events,
+    )
 
-    {
-        "all_images": all_images,
-        "all_statuses": all_statuses,
-        "all_messages": all_messages,
-    }
-    return all_images, all_messages, all_statuses
+    window = TimeWindow(start_time.value, end_time.value)
+    message_types = await count_by(AllMessagesAndEvents, window, "data.messageType")
+    image_count = await count_in_window(Image, window)
+    status_count = await count_in_window(Status, window)
+    return (
+        count_by,
+        image_count,
+        message_types,
+        status_count,
+        stream_messages_and_events,
+        window,
+    )
 
 
 @app.cell
-def _(all_images, all_messages, all_statuses, mo):
+def _(image_count, message_types, mo, status_count):
     mo.md(
-        rf"""Received {len(all_images)} images, {len(all_statuses)} statuses and a total of {len(all_messages)} messages and events."""
+        rf"""Received {image_count} images, {status_count} statuses and a total of {sum(message_types.values())} messages and events."""
     )
     return
 
 
 @app.cell
-def _(Counter, all_messages, mo):
-    mo.ui.table(
-        Counter(msg.data.messageType for msg in all_messages),
-        label="**Message Types**",
-    )
+def _(message_types, mo):
+    mo.ui.table(message_types, label="**Message Types**")
     return
 
 
 @app.cell
-def _(Counter, all_messages, mo):
+async def _(AllMessagesAndEvents, count_by, mo, window):
     mo.ui.table(
-        Counter(
-            msg.data.content["status"]
-            for msg in all_messages
-            if msg.data.messageType == "eventMessage"
-            and msg.data.content["type"] == "status"
+        await count_by(
+            AllMessagesAndEvents,
+            window,
+            "data.content.status",
+            match={"data.messageType": "eventMessage", "data.content.type": "status"},
         ),
         label="**Status Event Types**",
     )
@@ -91,10 +84,17 @@ def _(Counter, all_messages, mo):
 
 
 @app.cell
-def _(all_messages, deepcopy):
-    _err_msgs = [msg for msg in all_messages if msg.data.messageType == "eventMessage" and msg.data.content["type"] == "status" and msg.data.content["status"] == "error"]
-    _err_msgs = deepcopy(_err_msgs)
-    _err_msgs = [msg.data for msg in _err_msgs]
+async def _(stream_messages_and_events, window):
+    # Only the error statuses are loaded, with their whole content
+    _err_msgs = [
+        msg
+        async for msg in stream_messages_and_events(
+            window,
+            message_type="eventMessage",
+            match={"data.content.type": "status", "data.content.status": "error"},
+            content_fields=None,
+        )
+    ]
 
     _err_msgs
     return
@@ -131,17 +131,5 @@ def _():
     return
 
 
-@app.cell(hide_code=True)
-def _():
-    from collections import Counter
-    return (Counter,)
-
-
-@app.cell(hide_code=True)
-def _():
-    from copy import deepcopy
-    return (deepcopy,)
-
-
 if __name__ == "__main__":
     app.run()
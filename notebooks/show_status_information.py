@@ -66,19 +66,18 @@ def _(mo):
 async def _():
     import datetime
 
-    from exp_coord.db.status import Status
+    from exp_coord.db.device import get_device_by_s3i_id
+    from exp_coord.db.status import get_status_timeline
 
-    # Query all statuses between the 6th of april and the 11th of april
+    # Query the statuses of the camera between the 6th of april and the 11th of april
     start_time = datetime.datetime(2025, 4, 6)
     end_time = datetime.datetime(2025, 4, 12)
 
-    statuses = await Status.find(
-        Status.sent_timestamp >= start_time,
-        Status.sent_timestamp <= end_time,
-        fetch_links=True,  # Fetch linked documents
-    ).to_list()
+    device = await get_device_by_s3i_id("s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c")
+    # Only reads the status fields, and selects whole buckets in a time-series collection
+    statuses = await get_status_timeline(device.id, start_time, end_time)
     statuses
-    return Status, datetime, end_time, start_time, statuses
+    return datetime, device, end_time, start_time, statuses
 
 
 @app.cell(hide_code=True)
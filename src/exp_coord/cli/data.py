@@ -1,14 +1,21 @@
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 
 import typer
-from pydantic import TypeAdapter
 from structlog.stdlib import get_logger
 
 from exp_coord.core.config import get_settings
-from exp_coord.db.connection import create_grid_fs_client, init_db
-from exp_coord.db.gridfs import ImageFileMetadata
+from exp_coord.db.device_snapshots import backfill_device_snapshots
+from exp_coord.db.export import TABLES, export_tables
+from exp_coord.db.image_download import download_images
+from exp_coord.db.indexes import sync_indexes
+from exp_coord.db.orphans import sweep_orphaned_image_files
+from exp_coord.db.queries import TimeWindow
+from exp_coord.db.retention import archive_messages_and_events, restore_messages_and_events
+from exp_coord.db.rollups import rebuild_rollups
+from exp_coord.db.status import migrate_statuses_to_time_series
 
-from .utils import async_command
+from .utils import db_command
 
 logger = get_logger(__name__)
 
@@ -19,31 +26,180 @@ app.add_typer(images_app, no_args_is_help=True)
 
 
 @images_app.command("load-all")
-@async_command
-async def load_all_images(output_dir: Path):
+@db_command()
+async def load_all_images(
+    output_dir: Path,
+    device: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    concurrency: int = 8,
+    verify: bool = False,
+):
+    """Download the image files to OUTPUT_DIR, skipping those downloaded before.
+
+    Files already present with the stored length are skipped, with --verify only if their hash
+    matches as well. Use --device with an S3I ID, and --start and --end, to only download some of
+    the images.
+    """
+    if (start is None) != (end is None):
+        raise typer.BadParameter("Give both --start and --end, or neither.", param_hint="--end")
+    if start is not None and end is not None and end < start:
+        raise typer.BadParameter("Must not be before --start.", param_hint="--end")
+    if concurrency < 1:
+        raise typer.BadParameter("Must be at least 1.", param_hint="--concurrency")
+    window = TimeWindow(start, end) if start is not None and end is not None else None
     output_dir = output_dir.resolve()
-    output_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"Using output directory: {output_dir}")
 
-    # TODO: This should not be done here
-    await init_db()
-    bucket = create_grid_fs_client(get_settings().mongodb.collection_names.image_gridfs)
-    metadata_dict: dict[str, ImageFileMetadata] = {}
+    result = await download_images(
+        output_dir,
+        device_s3i_id=device,
+        window=window,
+        concurrency=concurrency,
+        verify=verify,
+    )
+    typer.echo(
+        f"Downloaded {result.downloaded} files ({result.bytes_downloaded / 2**20:.1f} MiB) in "
+        f"{result.seconds:.1f} s, {result.bytes_per_second / 2**20:.2f} MiB/s, "
+        f"skipped {result.skipped} present and {result.failed} failed"
+    )
+    if result.failed:
+        raise typer.Exit(1)
+
+
+@images_app.command("sweep-orphans")
+@db_command()
+async def sweep_orphans(grace_minutes: int = 10, delete_unrecoverable: bool = False):
+    """Restore the records of image files left behind by an interrupted ingestion."""
+    result = await sweep_orphaned_image_files(
+        timedelta(minutes=grace_minutes), delete_unrecoverable=delete_unrecoverable
+    )
+    typer.echo(result)
+
+
+@app.command("sync-indexes")
+@db_command(create_indexes=False)
+async def sync_indexes_command(drop_undeclared: bool = False):
+    """Create the indexes declared by the documents and report the usage and size of all indexes.
+
+    Usage is counted by MongoDB since the server started or the index was created. Indexes that
+    are not declared by any document are only dropped with --drop-undeclared.
+    """
+    reports = await sync_indexes(drop_undeclared=drop_undeclared)
+
+    typer.echo(f"{'collection':<28} {'index':<28} {'size':>10} {'accesses':>10}  state")
+    for report in reports:
+        size = f"{report.size_bytes / 1024:.0f} KiB" if report.size_bytes is not None else "-"
+        accesses = str(report.accesses) if report.accesses is not None else "-"
+        typer.echo(
+            f"{report.collection:<28} {report.name:<28} {size:>10} {accesses:>10}  {report.state}"
+        )
+
+
+@app.command("migrate-statuses")
+@db_command()
+async def migrate_statuses(batch_size: int = 1000):
+    """Copy the statuses into the time-series collection set up by mongodb.status_time_series.
+
+    Resumes where an interrupted migration stopped. The old collection is left untouched, drop it
+    yourself once the migration is verified.
+    """
+    if not get_settings().mongodb.status_time_series.enabled:
+        raise typer.BadParameter("Set mongodb.status_time_series.enabled in the config first")
+    if batch_size < 1:
+        raise typer.BadParameter("Must be at least 1.", param_hint="--batch-size")
+
+    copied = await migrate_statuses_to_time_series(batch_size)
+    typer.echo(f"Copied {copied} statuses")
+
+
+@app.command("archive")
+@db_command()
+async def archive(older_than_days: int | None = None):
+    """Move raw messages and events older than mongodb.retention.hot_days to the archive.
+
+    The archive consists of compressed JSONL files below mongodb.retention.archive_dir, one
+    directory per day. Use --older-than-days to override the hot window for this run.
+    """
+    if older_than_days is not None and older_than_days < 0:
+        raise typer.BadParameter("Must not be negative.", param_hint="--older-than-days")
+    before = (
+        datetime.now(UTC) - timedelta(days=older_than_days) if older_than_days is not None else None
+    )
+
+    result = await archive_messages_and_events(before)
+    typer.echo(f"Archived {result.archived} messages and events to {len(result.files)} files")
+
+
+@app.command("restore")
+@db_command()
+async def restore(start: datetime, end: datetime):
+    """Insert the archived raw messages and events added from START to END, both inclusive."""
+    if end < start:
+        raise typer.BadParameter("Must not be before START.", param_hint="END")
+
+    restored = await restore_messages_and_events(start.date(), end.date())
+    typer.echo(f"Restored {restored} messages and events")
+
+
+@app.command("backfill-device-snapshots")
+@db_command()
+async def backfill_device_snapshots_command():
+    """Embed a snapshot of the device in statuses and images stored without one.
+
+    The snapshots show the devices as they are now, not when the documents were stored.
+    """
+    for collection, updated in (await backfill_device_snapshots()).items():
+        typer.echo(f"Updated {updated} documents in {collection}")
+
+
+@app.command("rebuild-rollups")
+@db_command()
+async def rebuild_rollups_command(since: datetime | None = None):
+    """Recompute the hourly message and status counts from the raw messages and events.
 
-    cursor = bucket.find({})  # find all files (empty filter)
-    async for grid_out in cursor:
-        file_id = grid_out._id
-        filename = grid_out.filename or str(file_id)
-        output_file = output_dir / filename.replace(":", "_")
+    Without --since, all hours still in the raw log are recomputed. Counts of earlier hours, e.g.
+    of archived messages and events, are kept. Stop `run forever` first for exact counts.
+    """
+    for collection, written in (await rebuild_rollups(since)).items():
+        typer.echo(f"Wrote {written} rollups to {collection}")
 
-        # Download the file content asynchronously and write to disk
 
-        with open(output_file, "wb") as f:
-            async for chunk in await bucket.open_download_stream(file_id):
-                f.write(chunk)
+@app.command("export")
+@db_command()
+async def export(
+    output_dir: Path,
+    table: list[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    incremental: bool = False,
+    batch_size: int = 10_000,
+):
+    """Export statuses, image records and raw message headers to Parquet files in OUTPUT_DIR.
 
-        metadata_dict[filename] = ImageFileMetadata.model_validate(grid_out.metadata)
+    There is a directory per table and day, e.g. OUTPUT_DIR/statuses/date=2025-04-06. Repeat
+    --table to only export some of the tables. With --incremental, only documents stored after the
+    previous incremental export are exported. Requires pyarrow.
+    """
+    for name in table or ():
+        if name not in TABLES:
+            raise typer.BadParameter(
+                f"Must be one of {', '.join(TABLES)}, not {name}.", param_hint="--table"
+            )
+    if (start is None) != (end is None):
+        raise typer.BadParameter("Give both --start and --end, or neither.", param_hint="--end")
+    if start is not None and end is not None and end < start:
+        raise typer.BadParameter("Must not be before --start.", param_hint="--end")
+    if batch_size < 1:
+        raise typer.BadParameter("Must be at least 1.", param_hint="--batch-size")
+    window = TimeWindow(start, end) if start is not None and end is not None else None
 
-    with (output_dir / "metadata.json").open("wb") as f:
-        ta = TypeAdapter(dict[str, ImageFileMetadata])
-        f.write(ta.dump_json(metadata_dict))
+    exported = await export_tables(
+        [name for name in TABLES if not table or name in table],
+        output_dir,
+        window=window,
+        incremental=incremental,
+        batch_size=batch_size,
+    )
+    for name, files in exported.items():
+        typer.echo(f"Wrote {len(files)} files for {name}")
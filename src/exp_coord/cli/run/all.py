@@ -4,11 +4,18 @@ import typer
 
 from exp_coord.services.s3i import EventProcessor, MessageProcessor, S3IBrokerClient
 
+from .setup import override_max_concurrency, profile_run
+
 all_app = typer.Typer(
     name="all", help="Run the specified pipeline until all messages have been processed."
 )
 
 
+@all_app.callback()
+def all_(ctx: typer.Context, max_concurrency: int | None = None) -> None:
+    override_max_concurrency(ctx, max_concurrency)
+
+
 @all_app.command()
 def message(ctx: typer.Context) -> None:
     """Process all messages from the queue."""
@@ -17,8 +24,10 @@ def message(ctx: typer.Context) -> None:
     message_processor: MessageProcessor = ctx.obj["message_processor"]
     async_runner: asyncio.Runner = ctx.obj["async_runner"]
 
-    messages = async_runner.run(broker_client.receive_all_messages())
-    async_runner.run(message_processor.process_all(messages))
+    with profile_run(ctx) as profile:
+        count = async_runner.run(message_processor.process_all(broker_client.iter_all_messages()))
+        if profile is not None:
+            profile.messages = count
 
 
 @all_app.command()
@@ -29,5 +38,7 @@ def event(ctx: typer.Context) -> None:
     event_processor: EventProcessor = ctx.obj["event_processor"]
     async_runner: asyncio.Runner = ctx.obj["async_runner"]
 
-    events = async_runner.run(broker_client.receive_all_events())
-    async_runner.run(event_processor.process_all(events))
+    with profile_run(ctx) as profile:
+        count = async_runner.run(event_processor.process_all(broker_client.iter_all_events()))
+        if profile is not None:
+            profile.events = count
@@ -0,0 +1,256 @@
+"""The long-lived main loop behind `run forever`."""
+
+import asyncio
+import signal
+from contextlib import nullcontext, suppress
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Generic, TypeVar
+
+from structlog.stdlib import get_logger
+
+from exp_coord.cli.run.profiling import CycleProfiler
+from exp_coord.core.metrics import CYCLE_DURATION
+from exp_coord.services.s3i import (
+    EventProcessor,
+    MessageProcessor,
+    S3IBrokerClient,
+    S3IEvent,
+    S3IMessage,
+)
+
+logger = get_logger(__name__)
+T = TypeVar("T")
+
+
+class Received(Generic[T]):
+    """A streamed receive from the broker, of which only the first item was received yet.
+
+    Awaiting the first item sends the request and tells whether anything was received, while the
+    rest of the response is only decoded as it is iterated. So a prefetched receive holds one
+    item, not the whole response.
+    """
+
+    def __init__(self, iterator: AsyncIterator[T] | None = None, first: list[T] | None = None):
+        self._iterator = iterator
+        self._first = first or []
+        self._any = bool(self._first)
+
+    @classmethod
+    async def open(cls, iterator: AsyncIterator[T]) -> "Received[T]":
+        """Start receiving, until the first item arrived or the response turned out empty."""
+        try:
+            return cls(iterator, [await anext(iterator)])
+        except StopAsyncIteration:
+            return cls()
+
+    def __bool__(self) -> bool:
+        """Whether anything was received, also after iterating."""
+        return self._any
+
+    async def __aiter__(self) -> AsyncIterator[T]:
+        if self._iterator is None:
+            return
+        first, self._first = self._first, []
+        for item in first:
+            yield item
+        async for item in self._iterator:
+            yield item
+
+
+@dataclass
+class Batch:
+    """Everything received from the broker in one go, decoded while it is processed."""
+
+    messages: Received[S3IMessage] = field(default_factory=Received)
+    events: Received[S3IEvent] = field(default_factory=Received)
+    # Why receiving the messages or events failed. The other part is still valid.
+    errors: list[BaseException] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.messages) or bool(self.events)
+
+
+class Coordinator:
+    """Receive and process messages and events until asked to stop.
+
+    - While a batch is processed, the next one is already fetched if the last one wasn't empty.
+      Only the first message and event of it are received ahead, the rest is streamed while it is
+      processed, so at most one batch is held in memory.
+    - The polling interval adapts: it is reset to `min_interval` when something was received and
+      multiplied by `backoff_factor` up to `max_interval` while the queues are idle.
+    - SIGTERM and SIGINT stop the loop after the current cycle. A batch that was already fetched
+      is processed before returning, so no received message is lost. A second signal cancels
+      immediately.
+    """
+
+    def __init__(
+        self,
+        broker_client: S3IBrokerClient,
+        message_processor: MessageProcessor,
+        event_processor: EventProcessor,
+        *,
+        min_interval: float = 1,
+        max_interval: float = 60,
+        backoff_factor: float = 2,
+        exit_on_failure: bool = True,
+        profiler: CycleProfiler | None = None,
+    ) -> None:
+        if not 0 <= min_interval <= max_interval:
+            raise ValueError("The intervals must satisfy 0 <= min_interval <= max_interval")
+        if backoff_factor < 1:
+            raise ValueError(f"backoff_factor must be at least 1, not {backoff_factor}")
+
+        self.broker_client = broker_client
+        self.message_processor = message_processor
+        self.event_processor = event_processor
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.exit_on_failure = exit_on_failure
+        self.profiler = profiler
+
+        self.cycles = 0
+        self._stop = asyncio.Event()
+        self._main_task: asyncio.Task | None = None
+
+    def stop(self) -> None:
+        """Ask the loop to stop after the current cycle."""
+        if self._stop.is_set() and self._main_task is not None:
+            logger.warning("Stopping immediately")
+            self._main_task.cancel()
+            return
+        logger.info("Stopping after the current cycle...")
+        self._stop.set()
+
+    async def run(self) -> None:
+        """Run the loop until `stop` is called or a signal is received.
+
+        Raises:
+            Exception: If a cycle failed and `exit_on_failure` is set.
+        """
+        self._main_task = asyncio.current_task()
+        self._stop.clear()
+        installed_signals = self._install_signal_handlers()
+
+        interval = self.min_interval
+        prefetch: asyncio.Task[Batch] | None = asyncio.create_task(self._fetch())
+        try:
+            while True:
+                # Take the prefetched batch, and if it wasn't empty, expect more right away
+                fetching, prefetch = prefetch, None
+                batch = await fetching
+                if batch and not self._stop.is_set():
+                    prefetch = asyncio.create_task(self._fetch())
+
+                await self._run_cycle(batch)
+                if batch.errors and self.exit_on_failure:
+                    raise ExceptionGroup("Failed to receive from the broker", batch.errors)
+                interval = (
+                    self.min_interval
+                    if batch
+                    else min(max(interval, 0.001) * self.backoff_factor, self.max_interval)
+                )
+
+                if prefetch is None:
+                    if await self._wait_for_stop(interval):
+                        break
+                    prefetch = asyncio.create_task(self._fetch())
+                elif self._stop.is_set():
+                    break
+        finally:
+            if prefetch is not None:
+                await self._drain(prefetch)
+            for sig in installed_signals:
+                asyncio.get_running_loop().remove_signal_handler(sig)
+            self._main_task = None
+
+        logger.info(f"Stopped after {self.cycles} cycles")
+
+    async def _fetch(self) -> Batch:
+        """Start receiving everything from the broker.
+
+        Messages and events are received independently, so if one fails, the other isn't lost,
+        as the broker has already removed it from its queue. Failures are only logged here and
+        recorded in the batch, so the polling backs off while the broker is unavailable. Failures
+        while streaming the rest of the batch are raised by processing it.
+        """
+        messages, events = await asyncio.gather(
+            Received.open(self.broker_client.iter_all_messages()),
+            Received.open(self.broker_client.iter_all_events()),
+            return_exceptions=True,
+        )
+        batch = Batch()
+        if isinstance(messages, BaseException):
+            logger.error("Failed to receive messages from the broker.", exc_info=messages)
+            batch.errors.append(messages)
+        else:
+            batch.messages = messages
+        if isinstance(events, BaseException):
+            logger.error("Failed to receive events from the broker.", exc_info=events)
+            batch.errors.append(events)
+        else:
+            batch.events = events
+        return batch
+
+    async def _run_cycle(self, batch: Batch) -> None:
+        """Process a batch, only raising if `exit_on_failure` is set."""
+        self.cycles += 1
+        cycle_logger = logger.bind(cycle=self.cycles)
+        cycle_logger.info("Processing the received messages and events")
+        profiling = (
+            self.profiler.profile(self.cycles)
+            if self.profiler is not None and batch
+            else nullcontext()
+        )
+        try:
+            with profiling as profile, CYCLE_DURATION.time():
+                # Wait for both, so the other stream is still received to the end if one fails
+                messages, events = await asyncio.gather(
+                    self.message_processor.process_all(batch.messages),
+                    self.event_processor.process_all(batch.events),
+                    return_exceptions=True,
+                )
+                for result in (messages, events):
+                    if isinstance(result, BaseException):
+                        raise result
+                if profile is not None:
+                    # Only known once the batch was streamed
+                    profile.messages, profile.events = messages, events
+        except Exception:
+            cycle_logger.error(
+                "An error occurred during the current processing cycle.", exc_info=True
+            )
+            if self.exit_on_failure:
+                raise
+        else:
+            cycle_logger.info(
+                f"Finished a cycle with {messages} messages and {events} events without errors."
+            )
+
+    async def _wait_for_stop(self, timeout: float) -> bool:
+        """Sleep for `timeout` seconds, returning early with True if asked to stop."""
+        logger.debug(f"Sleeping for {timeout:.1f} seconds...")
+        with suppress(TimeoutError):
+            await asyncio.wait_for(self._stop.wait(), timeout)
+        return self._stop.is_set()
+
+    async def _drain(self, prefetch: asyncio.Task[Batch]) -> None:
+        """Process a batch that was fetched but not processed yet, as the broker already removed it."""
+        batch = await prefetch
+        if batch:
+            logger.info("Processing the last fetched batch before stopping")
+            with suppress(Exception):  # Already logged, and stopping anyways
+                await self._run_cycle(batch)
+
+    def _install_signal_handlers(self) -> list[signal.Signals]:
+        """Stop on SIGTERM and SIGINT, if the platform supports it."""
+        loop = asyncio.get_running_loop()
+        installed = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):  # pragma: no cover
+                logger.debug(f"Can't handle {sig.name} on this platform")
+            else:
+                installed.append(sig)
+        return installed
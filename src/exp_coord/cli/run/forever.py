@@ -1,15 +1,18 @@
 import asyncio
-from time import sleep
 
 import typer
 from structlog.stdlib import get_logger
 
+from exp_coord.core.metrics import start_metrics_server
 from exp_coord.services.s3i import (
     EventProcessor,
     MessageProcessor,
     S3IBrokerClient,
 )
 
+from .coordinator import Coordinator
+from .setup import override_max_concurrency
+
 logger = get_logger(__name__)
 
 forever_app = typer.Typer(
@@ -19,33 +22,53 @@ forever_app = typer.Typer(
 
 
 @forever_app.callback()
-def forever(ctx: typer.Context, interval: int = 60, exit_on_failure: bool = True) -> None:
-    """Start the experiment coordinator and run it forever, or until the messages run out."""
+def forever(
+    ctx: typer.Context,
+    interval: int = 60,
+    min_interval: int = 1,
+    exit_on_failure: bool = True,
+    max_concurrency: int | None = None,
+    metrics_port: int | None = None,
+    metrics_host: str = "127.0.0.1",
+) -> None:
+    """Start the experiment coordinator and run it until it receives SIGTERM or SIGINT.
+
+    The next batch is fetched while the current one is processed. While the queues are idle, the
+    time between polls doubles from --min-interval up to --interval seconds.
+
+    With --metrics-port, Prometheus metrics are served on http://--metrics-host:--metrics-port/metrics
+    while the coordinator runs.
+    """
     logger.info("Starting experiment coordinator...")
+    override_max_concurrency(ctx, max_concurrency)
+    if not 0 <= min_interval <= interval:
+        raise typer.BadParameter("must be between 0 and --interval", param_hint="'--min-interval'")
 
     broker_client: S3IBrokerClient = ctx.obj["broker_client"]
     event_processor: EventProcessor = ctx.obj["event_processor"]
     message_processor: MessageProcessor = ctx.obj["message_processor"]
     async_runner: asyncio.Runner = ctx.obj["async_runner"]
 
-    async def cycle():
-        logger.info("Receiving all messages and events...")
-        messages, events = await asyncio.gather(
-            broker_client.receive_all_messages(), broker_client.receive_all_events()
-        )
-
-        logger.info(f"Processing {len(messages)} messages and {len(events)} events")
-        await asyncio.gather(
-            message_processor.process_all(messages), event_processor.process_all(events)
-        )
-        logger.info("Finished a cycle without errors.")
-
-    while True:
-        try:
-            async_runner.run(cycle())
-        except:  # noqa: E722
-            logger.error("An error occurred during the current processing cycle.", exc_info=True)
-            if exit_on_failure:
-                raise
-        logger.debug(f"Sleeping for {interval} seconds...")
-        sleep(interval)
+    coordinator = Coordinator(
+        broker_client,
+        message_processor,
+        event_processor,
+        min_interval=min_interval,
+        max_interval=interval,
+        exit_on_failure=exit_on_failure,
+        profiler=ctx.obj.get("profiler"),
+    )
+    async_runner.run(_run(coordinator, metrics_host, metrics_port))
+
+
+async def _run(coordinator: Coordinator, metrics_host: str, metrics_port: int | None) -> None:
+    """Run the coordinator, serving the metrics meanwhile if a port is given."""
+    if metrics_port is None:
+        await coordinator.run()
+        return
+
+    server = start_metrics_server(metrics_host, metrics_port)
+    try:
+        await coordinator.run()
+    finally:
+        server.close()
@@ -0,0 +1,144 @@
+"""Profile the processing cycles of the `run` commands, behind `run --profile DIR`."""
+
+import cProfile
+import heapq
+import json
+import pstats
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from structlog.stdlib import get_logger
+
+from exp_coord.core.metrics import HANDLER_DURATION, histogram_totals
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CycleProfile:
+    """What is written next to the cProfile dump of a cycle."""
+
+    cycle: int
+    started_at: datetime
+    messages: int = 0
+    events: int = 0
+    duration: float = 0.0
+    # Calls and total seconds per Handler.name during the cycle
+    handlers: dict[str, dict[str, float]] = field(default_factory=dict)
+    # The functions with the highest cumulative time
+    top_functions: list[dict[str, Any]] = field(default_factory=list)
+
+
+class CycleProfiler:
+    """Run cycles under cProfile and dump every one, or only the slowest, to a directory.
+
+    Per cycle, `cycle-<id>.prof` can be opened with `pstats` or snakeviz, and `cycle-<id>.json`
+    holds a `CycleProfile` with the counts, the time per handler and the top functions. The
+    handler times are taken from `HANDLER_DURATION`, so they cover every handler that ran
+    while the cycle was profiled.
+
+    Example:
+        ```python
+        profiler = CycleProfiler(Path("profiles"), keep_slowest=10)
+        with profiler.profile(cycle=1, events=len(events)):
+            await event_processor.process_all(events)
+        ```
+    """
+
+    def __init__(
+        self, directory: Path, keep_slowest: int | None = None, top_functions: int = 25
+    ) -> None:
+        """Create the profiler.
+
+        Args:
+            directory: Where the dumps are written to, created if missing.
+            keep_slowest: Only keep the dumps of this many slowest cycles. All are kept if None.
+            top_functions: How many functions to list in the JSON summary.
+        """
+        if keep_slowest is not None and keep_slowest < 1:
+            raise ValueError(f"keep_slowest must be at least 1, not {keep_slowest}")
+        self.directory = directory
+        self.keep_slowest = keep_slowest
+        self.top_functions = top_functions
+        # (duration, cycle) of the dumps kept, the fastest first
+        self._kept: list[tuple[float, int]] = []
+
+    @contextmanager
+    def profile(self, cycle: int, *, messages: int = 0, events: int = 0) -> Iterator[CycleProfile]:
+        """Profile the block as the given cycle, also if it raises.
+
+        The counts can still be updated on the yielded `CycleProfile`, e.g. when they are only
+        known after processing.
+        """
+        record = CycleProfile(cycle, datetime.now(timezone.utc), messages, events)
+        handlers_before = histogram_totals(HANDLER_DURATION)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield record
+        finally:
+            profiler.disable()
+            record.duration = time.perf_counter() - start
+            record.handlers = _handler_breakdown(
+                handlers_before, histogram_totals(HANDLER_DURATION)
+            )
+            self._save(record, profiler)
+
+    def _save(self, record: CycleProfile, profiler: cProfile.Profile) -> None:
+        if self.keep_slowest is not None and len(self._kept) >= self.keep_slowest:
+            if record.duration <= self._kept[0][0]:
+                return
+            _, faster_cycle = heapq.heappop(self._kept)
+            for path in self._paths(faster_cycle):
+                path.unlink(missing_ok=True)
+        heapq.heappush(self._kept, (record.duration, record.cycle))
+
+        stats = pstats.Stats(profiler)
+        record.top_functions = _top_functions(stats, self.top_functions)
+        profile_path, summary_path = self._paths(record.cycle)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(profile_path)
+        summary_path.write_text(json.dumps(asdict(record), default=str, indent=2))
+        logger.info(
+            f"Wrote the profile of cycle {record.cycle}",
+            path=str(profile_path),
+            duration=record.duration,
+        )
+
+    def _paths(self, cycle: int) -> tuple[Path, Path]:
+        stem = self.directory / f"cycle-{cycle:06d}"
+        return stem.with_suffix(".prof"), stem.with_suffix(".json")
+
+
+def _handler_breakdown(
+    before: dict[tuple[str, ...], tuple[int, float]],
+    after: dict[tuple[str, ...], tuple[int, float]],
+) -> dict[str, dict[str, float]]:
+    breakdown = {}
+    for (handler,), (count, total) in sorted(after.items()):
+        count_before, total_before = before.get((handler,), (0, 0.0))
+        if count > count_before:
+            breakdown[handler] = {"calls": count - count_before, "seconds": total - total_before}
+    return breakdown
+
+
+def _top_functions(stats: pstats.Stats, limit: int) -> list[dict[str, Any]]:
+    entries = sorted(
+        stats.stats.items(),  # pyright: ignore[reportAttributeAccessIssue]
+        key=lambda item: item[1][3],
+        reverse=True,
+    )
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "own_seconds": own,
+            "cumulative_seconds": cumulative,
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in entries[:limit]
+    ]
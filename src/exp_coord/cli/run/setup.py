@@ -1,16 +1,19 @@
 import asyncio
-from contextlib import contextmanager
-from typing import Generator
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import ContextManager, Generator
 
 import click
 import typer
 from structlog.stdlib import get_logger
 
+from exp_coord.cli.run.profiling import CycleProfile, CycleProfiler
 from exp_coord.cli.utils import skip_execution_on_help_or_completion
 from exp_coord.core.config import get_settings
 from exp_coord.db.connection import close_db, get_client, init_db
+from exp_coord.db.device import device_registry
 from exp_coord.handlers import EVENT_HANDLERS, MESSAGE_HANDLERS
-from exp_coord.services.s3i import EventProcessor, MessageProcessor, S3IBrokerClient
+from exp_coord.services.s3i import EventProcessor, HTTPPool, MessageProcessor, S3IBrokerClient
 
 logger = get_logger(__name__)
 
@@ -40,6 +43,11 @@ def _close_broker_client(ctx: click.Context) -> None:
     logger.debug("Closing broker client...")
     async_runner.run(broker_client.aclose())
 
+    http_pool: HTTPPool | None = ctx.obj.get("http_pool", None)
+    if http_pool is not None:
+        logger.info("HTTP connection pool usage", stats=http_pool.stats())
+        async_runner.run(http_pool.aclose())
+
 
 def _close_db_connection(ctx: click.Context) -> None:
     try:
@@ -54,6 +62,7 @@ def _close_db_connection(ctx: click.Context) -> None:
     async_runner: asyncio.Runner | None = ctx.obj.get("async_runner", None)
     if async_runner is None:
         raise RuntimeError("Async runner not initialized, cannot close database connection")
+    async_runner.run(device_registry.stop_watching())
     async_runner.run(close_db())
 
 
@@ -89,10 +98,37 @@ def shutdown() -> None:
     logger.info("Shutdown complete")
 
 
+def profile_run(
+    ctx: typer.Context, *, messages: int = 0, events: int = 0
+) -> ContextManager[CycleProfile | None]:
+    """Profile the block as a single cycle if --profile is given, doing nothing otherwise."""
+    profiler: CycleProfiler | None = ctx.obj.get("profiler")
+    if profiler is None:
+        return nullcontext()
+    return profiler.profile(1, messages=messages, events=events)
+
+
+def override_max_concurrency(ctx: typer.Context, max_concurrency: int | None) -> None:
+    """Override the max concurrency from the settings for both processors, if given."""
+    if max_concurrency is None:
+        return
+    if max_concurrency < 1:
+        raise typer.BadParameter("Must be at least 1.", param_hint="--max-concurrency")
+
+    logger.debug(f"Processing at most {max_concurrency} messages at once")
+    ctx.obj["event_processor"].max_concurrency = max_concurrency
+    ctx.obj["message_processor"].max_concurrency = max_concurrency
+
+
 @skip_execution_on_help_or_completion
-def startup(ctx: typer.Context) -> None:
+def startup(
+    ctx: typer.Context, profile: Path | None = None, profile_slowest: int | None = None
+) -> None:
     """Set up the context with the necessary clients, set up the database and so on.
 
+    With --profile DIR, every processing cycle runs under cProfile and is dumped to DIR, or only
+    the --profile-slowest cycles.
+
     Use with `app.callback(startup)`
     """
     ctx.call_on_close(shutdown)
@@ -100,10 +136,29 @@ def startup(ctx: typer.Context) -> None:
     logger.debug(f"Using the following settings: {get_settings()}")
 
     ctx.ensure_object(dict)
-    ctx.obj["broker_client"] = S3IBrokerClient(get_settings().s3i)
-    ctx.obj["event_processor"] = EventProcessor(EVENT_HANDLERS)
-    ctx.obj["message_processor"] = MessageProcessor(MESSAGE_HANDLERS)
+    if profile is not None:
+        if profile_slowest is not None and profile_slowest < 1:
+            raise typer.BadParameter("Must be at least 1.", param_hint="--profile-slowest")
+        ctx.obj["profiler"] = CycleProfiler(profile, keep_slowest=profile_slowest)
+    ctx.obj["http_pool"] = HTTPPool.from_settings(get_settings().s3i.http_pool)
+    ctx.obj["broker_client"] = S3IBrokerClient(get_settings().s3i, pool=ctx.obj["http_pool"])
+    processing = get_settings().processing
+    ctx.obj["event_processor"] = EventProcessor(
+        EVENT_HANDLERS,
+        max_concurrency=processing.max_concurrency,
+        queue_size=processing.queue_size,
+        concurrent_handlers=processing.concurrent_handlers,
+    )
+    ctx.obj["message_processor"] = MessageProcessor(
+        MESSAGE_HANDLERS,
+        max_concurrency=processing.max_concurrency,
+        queue_size=processing.queue_size,
+        concurrent_handlers=processing.concurrent_handlers,
+    )
     # Can't use ctx.with_resource as it closes the runner before shutdown is called. We need to now close it manually
     ctx.obj["async_runner"] = asyncio.Runner()
 
     ctx.obj["async_runner"].run(init_db())
+    ctx.obj["async_runner"].run(device_registry.load())
+    if get_settings().mongodb.device_cache.watch_changes:
+        ctx.obj["async_runner"].run(device_registry.start_watching())
@@ -5,6 +5,8 @@ from structlog.stdlib import get_logger
 
 from exp_coord.services.s3i import EventProcessor, MessageProcessor, S3IBrokerClient
 
+from .setup import profile_run
+
 logger = get_logger(__name__)
 
 single_app = typer.Typer(
@@ -21,17 +23,25 @@ def message(ctx: typer.Context) -> None:
     message_processor: MessageProcessor = ctx.obj["message_processor"]
     async_runner: asyncio.Runner = ctx.obj["async_runner"]
 
-    async def process_message() -> None:
+    async def process_message() -> int:
         logger.debug("Fetching one message")
         message = await broker_client.receive_message()
         if message is not None:
             logger.debug("Processing message", content=message)
 
-            await message_processor.process(message)
+            try:
+                await message_processor.process(message)
+            finally:
+                await message_processor.flush()
+            return 1
         else:
             logger.info("No messages to process")
+            return 0
 
-    async_runner.run(process_message())
+    with profile_run(ctx) as profile:
+        count = async_runner.run(process_message())
+        if profile is not None:
+            profile.messages = count
 
 
 @single_app.command()
@@ -43,14 +53,22 @@ def event(ctx: typer.Context) -> None:
     event_processor: EventProcessor = ctx.obj["event_processor"]
     async_runner: asyncio.Runner = ctx.obj["async_runner"]
 
-    async def process_event() -> None:
+    async def process_event() -> int:
         logger.debug("Fetching one event")
         event = await broker_client.receive_event()
         if event is not None:
             logger.debug("Processing event", content=event)
 
-            await event_processor.process(event)
+            try:
+                await event_processor.process(event)
+            finally:
+                await event_processor.flush()
+            return 1
         else:
             logger.info("No events to process")
+            return 0
 
-    async_runner.run(process_event())
+    with profile_run(ctx) as profile:
+        count = async_runner.run(process_event())
+        if profile is not None:
+            profile.events = count
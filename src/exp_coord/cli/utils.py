@@ -5,6 +5,8 @@ from functools import wraps
 
 import click
 
+from exp_coord.db.connection import init_db
+
 
 def skip_execution_on_help_or_completion(func):
     """Decorator to prevent the command from running when the user asks for help or completion."""
@@ -30,3 +32,21 @@ def async_command(func):
         asyncio.run(_run())
 
     return wrapper
+
+
+def db_command(*, create_indexes: bool = True):
+    """Decorator to handle async commands that use the database, which is initialized first.
+
+    Args:
+        create_indexes: Passed to `init_db`.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def with_db(*args, **kwargs):
+            await init_db(create_indexes=create_indexes)
+            return await func(*args, **kwargs)
+
+        return async_command(with_db)
+
+    return decorator
@@ -2,7 +2,7 @@ from pathlib import Path
 from typing import Annotated, Any, Literal, cast
 
 import toml
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PositiveFloat, PositiveInt, field_validator
 from pydantic_settings import BaseSettings
 
 from exp_coord.core.annotations.s3i import (
@@ -36,6 +36,21 @@ class S3IEventTopics(BaseModel):
     status: str = "plant-growth-observation_status"
 
 
+class HTTPPoolSettings(BaseModel):
+    # Maximum number of connections, in use or idle
+    max_connections: PositiveInt = 100
+    # Maximum number of idle connections kept open
+    max_keepalive_connections: PositiveInt = 20
+    # Seconds an idle connection is kept open
+    keepalive_expiry: PositiveFloat = 30
+    # Negotiate HTTP/2 if the server supports it. Requires httpx[http2].
+    http2: bool = False
+    # Seconds to wait for connecting, reading and writing
+    timeout: PositiveFloat = 5
+    # Seconds to wait for a free connection if all max_connections are in use
+    pool_timeout: PositiveFloat = 10
+
+
 class S3ISettings(BaseModel):
     client_id: S3IIdType
     client_secret: str
@@ -51,6 +66,7 @@ class S3ISettings(BaseModel):
     config_url: str
 
     topics: S3IEventTopics = Field(default_factory=S3IEventTopics)
+    http_pool: HTTPPoolSettings = Field(default_factory=HTTPPoolSettings)
 
 
 class CollectionNames(BaseModel):
@@ -59,12 +75,61 @@ class CollectionNames(BaseModel):
     image: str = "images"
     image_gridfs: str = "image_files"
     status: str = "statuses"
+    message_rollup: str = "message_counts_hourly"
+    status_rollup: str = "status_counts_hourly"
+    # The progress of data migrations, one document per migration
+    migrations: str = "migrations"
+
+
+class WriteBatchSettings(BaseModel):
+    # A batch is written once it has this many documents...
+    max_size: PositiveInt = 100
+    # ...or this many seconds after its first document was added
+    max_delay: PositiveFloat = 0.5
+
+
+class DeviceCacheSettings(BaseModel):
+    # Seconds after which all devices are reloaded
+    ttl: PositiveFloat = 300
+    # Seconds an unknown S3I ID is remembered as unknown
+    negative_ttl: PositiveFloat = 60
+    # Invalidate the cache through a change stream. Requires a replica set.
+    watch_changes: bool = False
+
+
+class StatusTimeSeriesSettings(BaseModel):
+    # Store statuses in a time-series collection, bucketed by device (metaField) and sent_timestamp
+    # (timeField). Migrate existing statuses with `exp-coord data migrate-statuses`.
+    enabled: bool = False
+    # A separate collection, as existing collections can't be converted to time-series
+    collection: str = "statuses_timeseries"
+    granularity: Literal["seconds", "minutes", "hours"] = "minutes"
+    # Delete statuses this many seconds after they were sent, keep them forever if None
+    expire_after_seconds: PositiveInt | None = None
+
+
+class RetentionSettings(BaseModel):
+    # Raw messages and events added within this many days stay in all_messages_and_events
+    hot_days: PositiveInt = 30
+    # Older ones are archived to date-partitioned files in this directory by `data archive`
+    archive_dir: Path = Path("archive")
+    # zstd requires the zstandard package
+    compression: Literal["gzip", "zstd"] = "gzip"
+    # Documents per archive file and per delete
+    batch_size: PositiveInt = 1000
 
 
 class MongoDBSettingsBase(BaseModel):
     url: str
     db_name: str
     collection_names: CollectionNames = Field(default_factory=CollectionNames)
+    write_batch: WriteBatchSettings = Field(default_factory=WriteBatchSettings)
+    device_cache: DeviceCacheSettings = Field(default_factory=DeviceCacheSettings)
+    status_time_series: StatusTimeSeriesSettings = Field(default_factory=StatusTimeSeriesSettings)
+    retention: RetentionSettings = Field(default_factory=RetentionSettings)
+    # Keep the base64 image of new image events in all_messages_and_events. By default it is
+    # replaced by a reference to the GridFS file, once the new image handler stored the image.
+    inline_image_payloads: bool = False
 
 
 class MongoDBSettingsPassword(MongoDBSettingsBase):
@@ -80,9 +145,22 @@ class MongoDBSettingsX509(MongoDBSettingsBase):
         return find_file(v)
 
 
+class ProcessingSettings(BaseModel):
+    # Maximum number of messages processed at once by `Processor.process_all`. Unbounded if None.
+    max_concurrency: PositiveInt | None = None
+    # Number of received messages waiting for a free worker. Defaults to max_concurrency.
+    queue_size: PositiveInt | None = None
+    # Run all handlers of one message concurrently, respecting the order given by `Handler.after`
+    concurrent_handlers: bool = False
+    # Identifiers of processed messages and events each handler remembers, to skip redeliveries
+    # without querying MongoDB. Older duplicates are still rejected by unique indexes.
+    recent_ids: PositiveInt = 10_000
+
+
 class Settings(BaseSettings):
     s3i: S3ISettings
     mongodb: MongoDBSettingsPassword | MongoDBSettingsX509 = Field(discriminator="connection_type")
+    processing: ProcessingSettings = Field(default_factory=ProcessingSettings)
 
 
 def _deep_update(destination_dict: dict[str, Any], update_dict: dict[str, Any]) -> dict[str, Any]:
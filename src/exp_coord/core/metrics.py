@@ -0,0 +1,136 @@
+"""The Prometheus metrics of the coordinator, and serving them over HTTP.
+
+The metrics are always recorded, which only costs a dict lookup and an addition. They are defined
+once in this module and shared by everything that records them, in their own registry, so no
+metrics of other libraries are exposed. `start_metrics_server` serves them on `/metrics` for
+Prometheus to scrape, e.g. while `run forever` is running.
+
+Example:
+    ```python
+    HANDLER_DURATION.labels(handler="status").observe(0.012)
+    with CYCLE_DURATION.time():
+        ...
+    print(prometheus_client.generate_latest(registry).decode())
+    ```
+"""
+
+from threading import Thread
+from wsgiref.simple_server import WSGIServer
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, start_http_server
+from structlog.stdlib import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "BROKER_RECEIVED",
+    "CYCLE_DURATION",
+    "GRIDFS_OPERATION_DURATION",
+    "HANDLER_DURATION",
+    "HANDLER_FAILURES",
+    "HTTP_REQUEST_DURATION",
+    "MONGO_COMMAND_DURATION",
+    "TOKEN_REFRESHES",
+    "MetricsServer",
+    "histogram_totals",
+    "registry",
+    "start_metrics_server",
+]
+
+# From 1 ms to 1 minute, as handlers and requests range from in-memory work to large uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+registry = CollectorRegistry()
+
+BROKER_RECEIVED = Counter(
+    "exp_coord_broker_received_total",
+    "Messages and events received from the S3I broker.",
+    ["queue"],
+    registry=registry,
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "exp_coord_http_request_duration_seconds",
+    "Time until the response headers of requests to the S3I broker, config API and Keycloak.",
+    ["host", "method"],
+    registry=registry,
+    buckets=DEFAULT_BUCKETS,
+)
+TOKEN_REFRESHES = Counter(
+    "exp_coord_token_refreshes_total",
+    "Keycloak tokens obtained, by whether a refresh token was used or a new token was requested.",
+    ["grant"],
+    registry=registry,
+)
+HANDLER_DURATION = Histogram(
+    "exp_coord_handler_duration_seconds",
+    "Time a handler took per message or event, including failed calls.",
+    ["handler"],
+    registry=registry,
+    buckets=DEFAULT_BUCKETS,
+)
+HANDLER_FAILURES = Counter(
+    "exp_coord_handler_failures_total",
+    "Messages and events a handler failed to process.",
+    ["handler"],
+    registry=registry,
+)
+CYCLE_DURATION = Histogram(
+    "exp_coord_cycle_duration_seconds",
+    "Time to process one batch received from the broker, including flushing the handlers.",
+    registry=registry,
+    buckets=DEFAULT_BUCKETS,
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "exp_coord_mongo_command_duration_seconds",
+    "Duration of MongoDB commands as reported by the driver.",
+    ["command", "outcome"],
+    registry=registry,
+    buckets=DEFAULT_BUCKETS,
+)
+GRIDFS_OPERATION_DURATION = Histogram(
+    "exp_coord_gridfs_operation_duration_seconds",
+    "Duration of GridFS operations, covering all chunks of the file.",
+    ["operation"],
+    registry=registry,
+    buckets=DEFAULT_BUCKETS,
+)
+
+
+def histogram_totals(histogram: Histogram) -> dict[tuple[str, ...], tuple[int, float]]:
+    """Get the count and sum of the observations of every time series, by label values."""
+    totals: dict[tuple[str, ...], list[float]] = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.name.endswith(("_count", "_sum")):
+                # Ordered like the label names, and without `le`, which only buckets have
+                key = tuple(sample.labels.values())
+                index = 0 if sample.name.endswith("_count") else 1
+                totals.setdefault(key, [0, 0.0])[index] = sample.value
+    return {key: (int(count), total) for key, (count, total) in totals.items()}
+
+
+class MetricsServer:
+    """The HTTP server started by `start_metrics_server`, which runs in a daemon thread."""
+
+    def __init__(self, server: WSGIServer, thread: Thread) -> None:
+        self.server = server
+        self.thread = thread
+
+    @property
+    def port(self) -> int:
+        return self.server.server_port
+
+    def close(self) -> None:
+        """Stop serving and wait for the thread to exit."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def start_metrics_server(
+    host: str, port: int, metrics_registry: CollectorRegistry = registry
+) -> MetricsServer:
+    """Serve the metrics on `GET /metrics` in a thread, until the returned server is closed."""
+    server, thread = start_http_server(port, host, metrics_registry)
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return MetricsServer(server, thread)
@@ -1,5 +1,5 @@
-from functools import cache
-from typing import TypeVar
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, TypeVar
 
 from pydantic import TypeAdapter
 from structlog.stdlib import get_logger
@@ -9,9 +9,93 @@ logger = get_logger(__name__)
 T = TypeVar("T")
 
 
-@cache
-def _get_type_adapter(type_: T) -> TypeAdapter[T]:
-    """Create a cached TypeAdapter instance for a type. The caching is the only reason for this function to exist."""
-    # FIXME: If type_ is not hashable, the cache will raise a TypeError
-    logger.debug(f"Creating cached TypeAdapter for {type_}")
-    return TypeAdapter(type_)
+class TypeAdapterRegistry:
+    """Create a TypeAdapter once per type and reuse it.
+
+    Building a TypeAdapter compiles a validator and serializer, which is far more expensive than
+    using them. Types are looked up by hash. Unhashable types, e.g. `Annotated` with unhashable
+    metadata, are looked up by identity instead, so they have to be the same object to hit.
+
+    Example:
+        ```python
+        adapter = type_adapters.get(list[S3IEvent])
+        events = adapter.validate_json(content)
+        ```
+    """
+
+    def __init__(self) -> None:
+        self._by_hash: dict[Any, TypeAdapter] = {}
+        # Keeps a reference to the type, so its id can't be reused by another object
+        self._by_id: dict[int, tuple[Any, TypeAdapter]] = {}
+
+    def get(self, type_: type[T]) -> TypeAdapter[T]:
+        """Get the TypeAdapter for a type, creating it on first use."""
+        try:
+            adapter = self._by_hash.get(type_)
+        except TypeError:
+            return self._get_by_id(type_)
+        if adapter is None:
+            adapter = self._by_hash[type_] = self._create(type_)
+        return adapter
+
+    def __len__(self) -> int:
+        return len(self._by_hash) + len(self._by_id)
+
+    def _get_by_id(self, type_: type[T]) -> TypeAdapter[T]:
+        entry = self._by_id.get(id(type_))
+        if entry is None:
+            entry = self._by_id[id(type_)] = (type_, self._create(type_))
+        return entry[1]
+
+    @staticmethod
+    def _create(type_: type[T]) -> TypeAdapter[T]:
+        logger.debug(f"Creating cached TypeAdapter for {type_}")
+        return TypeAdapter(type_)
+
+
+type_adapters = TypeAdapterRegistry()
+
+
+class RecentIds:
+    """Remember the most recently seen IDs, forgetting the least recently seen ones first.
+
+    Used to skip messages and events that were already processed, e.g. when the broker
+    redelivers them, without asking the database. Only a bounded number of IDs is kept, so
+    anything older still has to be caught by a unique index.
+
+    Example:
+        ```python
+        recent = RecentIds(maxsize=10_000)
+        if event.identifier not in recent:
+            ...
+            recent.add(event.identifier)
+        ```
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, not {maxsize}")
+        self.maxsize = maxsize
+        self._ids: OrderedDict[Hashable, None] = OrderedDict()
+
+    def add(self, id_: Hashable) -> None:
+        """Remember an ID, evicting the least recently seen one if full."""
+        self._ids[id_] = None
+        self._ids.move_to_end(id_)
+        if len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def update(self, ids: Iterable[Hashable | None]) -> None:
+        """Remember several IDs, skipping None."""
+        for id_ in ids:
+            if id_ is not None:
+                self.add(id_)
+
+    def __contains__(self, id_: Hashable) -> bool:
+        if id_ not in self._ids:
+            return False
+        self._ids.move_to_end(id_)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._ids)
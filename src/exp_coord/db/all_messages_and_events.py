@@ -2,15 +2,30 @@ from datetime import datetime
 
 from beanie import Document
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 from exp_coord.core.config import get_settings
-from exp_coord.services.s3i.broker.models import S3IEvent, S3IMessage
+from exp_coord.services.s3i.broker.models import S3IMessageOrEvent
 
 
 class AllMessagesAndEvents(Document):
-    data: S3IMessage | S3IEvent
+    data: S3IMessageOrEvent
     added_at: datetime = Field(default_factory=datetime.utcnow)
+    # The identifier of the message or event, unique so redeliveries are only stored once. None
+    # for documents stored before, which the unique index ignores.
+    identifier: str | None = None
 
     class Settings:
         name = get_settings().mongodb.collection_names.all_messages_and_events
         validate_on_save = True
+        indexes = [  # noqa: RUF012
+            IndexModel([("added_at", DESCENDING)], name="added_at"),
+            IndexModel([("data.topic", ASCENDING)], name="data_topic"),
+            IndexModel([("data.messageType", ASCENDING)], name="data_message_type"),
+            IndexModel(
+                [("identifier", ASCENDING)],
+                name="identifier_unique",
+                unique=True,
+                partialFilterExpression={"identifier": {"$type": "string"}},
+            ),
+        ]
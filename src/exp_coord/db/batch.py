@@ -0,0 +1,193 @@
+"""Buffer inserts of Beanie documents and write them in batches."""
+
+import asyncio
+from typing import Any, Callable, Generic, Mapping, TypeVar
+
+from beanie import Document, PydanticObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from structlog.stdlib import get_logger
+
+from exp_coord.core.config import get_settings
+
+logger = get_logger(__name__)
+
+D = TypeVar("D", bound=Document)
+
+
+class BatchWriteError(Exception):
+    """The insertion of a single document of a batch failed."""
+
+    def __init__(self, document: Document, error: Exception) -> None:
+        super().__init__(f"Failed to insert document {document.id}: {error}")
+        self.document = document
+        self.error = error
+
+
+def _write_error_from_details(details: Mapping[str, Any]) -> WriteError:
+    """Create the exception pymongo would have raised for a single insert."""
+    error_class = DuplicateKeyError if details.get("code") == 11000 else WriteError
+    return error_class(details.get("errmsg", "Unknown write error"), details.get("code"), details)
+
+
+class BatchWriter(Generic[D]):
+    """Collect documents and insert them with a single unordered `insert_many`.
+
+    A batch is written as soon as `max_batch_size` documents are buffered, or `max_delay` seconds
+    after the first document was added. `flush` writes everything that is left, waits for all
+    batches still being written and raises the failures collected since the last flush.
+
+    With `ignore_duplicates`, documents rejected by a unique index are skipped instead of being
+    reported, which makes inserts keyed on a unique field idempotent. `on_written` is called with
+    the documents of every batch that are in the collection afterwards, including skipped ones,
+    and `on_inserted` only with the ones this writer inserted.
+
+    Example:
+        ```python
+        writer = BatchWriter(Status, max_batch_size=100, max_delay=0.5)
+        writer.add(Status(...))
+        writer.add(Status(...))
+        await writer.flush()  # Raises an ExceptionGroup of BatchWriteErrors if inserts failed
+        ```
+    """
+
+    def __init__(
+        self,
+        document_type: type[D],
+        max_batch_size: int = 100,
+        max_delay: float = 0.5,
+        *,
+        ignore_duplicates: bool = False,
+        on_written: Callable[[list[D]], None] | None = None,
+        on_inserted: Callable[[list[D]], None] | None = None,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, not {max_batch_size}")
+
+        self.document_type = document_type
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.ignore_duplicates = ignore_duplicates
+        self.on_written = on_written
+        self.on_inserted = on_inserted
+
+        self._buffer: list[D] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._writing: set[asyncio.Task[None]] = set()
+        self._errors: list[BatchWriteError] = []
+
+    @classmethod
+    def from_settings(cls, document_type: type[D], **kwargs: Any) -> "BatchWriter[D]":
+        """Create a writer using the batch size and delay configured in the settings.
+
+        The keyword arguments are passed on to the constructor.
+        """
+        settings = get_settings().mongodb.write_batch
+        return cls(
+            document_type,
+            max_batch_size=settings.max_size,
+            max_delay=settings.max_delay,
+            **kwargs,
+        )
+
+    def add(self, document: D) -> None:
+        """Add a document to the buffer.
+
+        The document gets its ID assigned right away, so it can be referenced before it is written.
+        Must be called from within a running event loop.
+        """
+        if document.id is None:
+            document.id = PydanticObjectId()
+        self._buffer.append(document)
+
+        if len(self._buffer) >= self.max_batch_size:
+            self._write_buffer()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._write_buffer)
+
+    async def flush(self) -> None:
+        """Write all buffered documents and wait for all pending batches.
+
+        Raises:
+            ExceptionGroup: With a BatchWriteError per document that failed to be inserted since
+                the last flush.
+        """
+        self._write_buffer()
+        while self._writing:
+            # Remove the batches here instead of relying on their done callbacks: gathering tasks
+            # that are all done already completes without yielding, so the callbacks never run.
+            writing = list(self._writing)
+            await asyncio.gather(*writing)
+            self._writing.difference_update(writing)
+
+        errors, self._errors = self._errors, []
+        if errors:
+            raise ExceptionGroup(
+                f"Failed to insert {len(errors)} {self.document_type.__name__} documents", errors
+            )
+
+    def _write_buffer(self) -> None:
+        """Start writing the current buffer in the background."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        task = asyncio.get_running_loop().create_task(self._write(batch))
+        self._writing.add(task)
+        task.add_done_callback(self._writing.discard)
+
+    async def _write(self, batch: list[D]) -> None:
+        """Insert the batch, recording an error for every document that failed."""
+        try:
+            await self.document_type.insert_many(batch, ordered=False)
+        except BulkWriteError as exc:
+            # Unordered, so every document without an error has been inserted
+            failed, duplicates = set(), set()
+            for details in exc.details.get("writeErrors", []):
+                document = batch[details["index"]]
+                error = _write_error_from_details(details)
+                if self.ignore_duplicates and isinstance(error, DuplicateKeyError):
+                    logger.debug(
+                        "Skipped duplicate document",
+                        collection=self.document_type.__name__,
+                        document_id=str(document.id),
+                    )
+                    duplicates.add(details["index"])
+                    continue
+                failed.add(details["index"])
+                logger.error(
+                    "Failed to insert document",
+                    collection=self.document_type.__name__,
+                    document_id=str(document.id),
+                    error=str(error),
+                )
+                self._errors.append(BatchWriteError(document, error))
+            self._written(
+                [document for i, document in enumerate(batch) if i not in failed],
+                [document for i, document in enumerate(batch) if i not in failed | duplicates],
+            )
+        except Exception as exc:
+            logger.exception(
+                f"Failed to insert a batch of {len(batch)} documents",
+                collection=self.document_type.__name__,
+            )
+            self._errors.extend(BatchWriteError(document, exc) for document in batch)
+        else:
+            logger.debug(
+                f"Inserted a batch of {len(batch)} documents",
+                collection=self.document_type.__name__,
+            )
+            self._written(batch, batch)
+
+    def _written(self, written: list[D], inserted: list[D]) -> None:
+        for callback, documents in ((self.on_written, written), (self.on_inserted, inserted)):
+            if callback is None or not documents:
+                continue
+            try:
+                callback(documents)
+            except Exception:
+                logger.exception(
+                    f"{callback} failed after writing", collection=self.document_type.__name__
+                )
@@ -6,12 +6,15 @@ from motor.motor_asyncio import (
     AsyncIOMotorDatabase,
     AsyncIOMotorGridFSBucket,
 )
+from pymongo import monitoring
 from structlog.stdlib import get_logger
 
 from exp_coord.core.config import get_settings
+from exp_coord.core.metrics import MONGO_COMMAND_DURATION
 from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
 from exp_coord.db.device import Device
 from exp_coord.db.image import Image
+from exp_coord.db.rollups import HourlyMessageCount, HourlyStatusCount
 from exp_coord.db.status import Status
 
 logger = get_logger(__name__)
@@ -19,6 +22,8 @@ logger = get_logger(__name__)
 __models__ = [
     AllMessagesAndEvents,
     Device,
+    HourlyMessageCount,
+    HourlyStatusCount,
     Image,
     Status,
 ]
@@ -51,18 +56,39 @@ def create_grid_fs_client(bucket_name: str = "fs") -> AsyncIOMotorGridFSBucket:
     return AsyncIOMotorGridFSBucket(get_db(), bucket_name=bucket_name)
 
 
+class CommandMetrics(monitoring.CommandListener):
+    """Records the duration of every MongoDB command in `MONGO_COMMAND_DURATION`.
+
+    The driver calls it from the threads motor runs pymongo in, so it must not block.
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        MONGO_COMMAND_DURATION.labels(command=event.command_name, outcome="succeeded").observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        MONGO_COMMAND_DURATION.labels(command=event.command_name, outcome="failed").observe(
+            event.duration_micros / 1_000_000
+        )
+
+
 def _create_client() -> AsyncIOMotorClient:
     """Create a new database client based on the connection type."""
     settings = get_settings()
     if settings.mongodb.connection_type == "password":
         logger.debug("Creating a new database client with password authentication")
-        client = AsyncIOMotorClient(settings.mongodb.url)
+        client = AsyncIOMotorClient(settings.mongodb.url, event_listeners=[CommandMetrics()])
     elif settings.mongodb.connection_type == "x509":
         logger.debug("Creating a new database client with X.509 certificate authentication")
         client = AsyncIOMotorClient(
             settings.mongodb.url,
             tls=True,
             tlsCertificateKeyFile=str(settings.mongodb.x509_cert_file),
+            event_listeners=[CommandMetrics()],
         )
     else:
         raise ValueError(f"Invalid connection type: {settings.mongodb.connection_type}")
@@ -72,8 +98,13 @@ def _create_client() -> AsyncIOMotorClient:
     return client
 
 
-async def init_db() -> None:
-    """Initialize the database, GridFS connection and beanie."""
+async def init_db(*, create_indexes: bool = True) -> None:
+    """Initialize the database, GridFS connection and beanie.
+
+    Args:
+        create_indexes: Let Beanie create the indexes declared by the documents. Pass False to
+            leave that to `exp_coord.db.indexes.sync_indexes`, e.g. to report which it created.
+    """
     global __client
     global __grid_fs_client
 
@@ -86,7 +117,7 @@ async def init_db() -> None:
     await get_client().admin.command("ping")
     logger.info("Database connection established")
 
-    await init_beanie(get_db(), document_models=__models__)
+    await init_beanie(get_db(), document_models=__models__, skip_indexes=not create_indexes)
     logger.info("Beanie initialized")
 
 
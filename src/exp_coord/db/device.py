@@ -1,7 +1,13 @@
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass
+from time import monotonic
 from typing import Literal
 
-from beanie import Document
-from pydantic import model_validator
+from beanie import Delete, Document, Insert, Replace, Save, SaveChanges, Update, after_event
+from pydantic import BaseModel, model_validator
+from pymongo import ASCENDING, IndexModel
+from structlog.stdlib import get_logger
 
 from exp_coord.core.annotations.s3i import (
     S3IEventQueueType,
@@ -10,6 +16,8 @@ from exp_coord.core.annotations.s3i import (
 )
 from exp_coord.core.config import get_settings
 
+logger = get_logger(__name__)
+
 
 class Device(Document):
     """A device participating in an experiment."""
@@ -28,14 +36,162 @@ class Device(Document):
             self.name = f"{self.type}_at_{self.rhizotron_num}-{self.s3i_id}"
         return self
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    def invalidate_registry(self):
+        """Keep the device registry up to date with changes made through this process."""
+        device_registry.invalidate(self.s3i_id)
+
     class Settings:
         name = get_settings().mongodb.collection_names.device
         validate_on_save = True
+        indexes = [  # noqa: RUF012
+            IndexModel([("s3i_id", ASCENDING)], name="s3i_id_unique", unique=True),
+        ]
+
+
+class DeviceSnapshot(BaseModel):
+    """The fields of a device that readers of statuses and images need, embedded next to the link.
+
+    Taken when the status or image is created, so reading them doesn't require fetching the
+    device. Later changes to the device are not reflected.
+    """
+
+    s3i_id: S3IIdType
+    name: str | None = None
+    rhizotron_num: int | None = None
+    type: Literal["camera", "water_supply", "coordinator"]
+
+    @classmethod
+    def from_device(cls, device: Device) -> "DeviceSnapshot":
+        return cls(
+            s3i_id=device.s3i_id,
+            name=device.name,
+            rhizotron_num=device.rhizotron_num,
+            type=device.type,
+        )
+
+
+@dataclass
+class DeviceRegistryStats:
+    """Counters of the device registry, to judge how well the cache works."""
+
+    hits: int = 0
+    misses: int = 0  # Lookups that had to query the database
+    negative_hits: int = 0  # Lookups of unknown devices answered from the cache
+    reloads: int = 0
+
+
+class DeviceRegistry:
+    """An in-process cache of all devices, keyed by their S3I ID.
+
+    All devices are loaded at once and served from memory until `ttl` seconds have passed, after
+    which they are reloaded on the next lookup. If a device is not known, it is queried once and
+    remembered as unknown for `negative_ttl` seconds, so unknown senders don't cause a query per
+    event. Optionally, a MongoDB change stream invalidates the cache as soon as a device changes.
+    """
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 60) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = DeviceRegistryStats()
+
+        self._devices: dict[str, Device] = {}
+        self._unknown: dict[str, float] = {}  # S3I ID -> time until which it is known unknown
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._watch_task: asyncio.Task[None] | None = None
+
+    async def load(self) -> None:
+        """(Re)load all devices from the database."""
+        devices = await Device.find_all().to_list()
+        self._devices = {device.s3i_id: device for device in devices}
+        self._unknown.clear()
+        self._loaded_at = monotonic()
+        self.stats.reloads += 1
+        logger.debug(f"Loaded {len(devices)} devices into the registry")
+
+    def invalidate(self, s3i_id: S3IIdType | None = None) -> None:
+        """Forget a single device, or everything if no S3I ID is given."""
+        if s3i_id is None:
+            self._loaded_at = None
+        else:
+            self._devices.pop(s3i_id, None)
+            self._unknown.pop(s3i_id, None)
+
+    async def get(self, s3i_id: S3IIdType) -> Device:
+        """Get a device by its S3I ID.
+
+        Raises:
+            ValueError: If there is no device with the given S3I ID.
+        """
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():  # Another task might have reloaded in the meantime
+                    await self.load()
+
+        device = self._devices.get(s3i_id)
+        if device is not None:
+            self.stats.hits += 1
+            return device
+
+        unknown_until = self._unknown.get(s3i_id)
+        if unknown_until is not None and monotonic() < unknown_until:
+            self.stats.negative_hits += 1
+            raise ValueError(f"No device found with S3I ID {s3i_id}")
+
+        # The device might have been added since the last load
+        self.stats.misses += 1
+        device = await Device.find_one({"s3i_id": s3i_id})
+        if device is None:
+            self._unknown[s3i_id] = monotonic() + self.negative_ttl
+            raise ValueError(f"No device found with S3I ID {s3i_id}")
+        self._devices[s3i_id] = device
+        return device
+
+    async def start_watching(self) -> None:
+        """Invalidate the registry whenever the devices collection changes.
+
+        Change streams are only available on replica sets. If watching fails, the registry falls
+        back to reloading after `ttl` seconds.
+        """
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop_watching(self) -> None:
+        """Stop watching the devices collection."""
+        if self._watch_task is None:
+            return
+        self._watch_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._watch_task
+        self._watch_task = None
+
+    async def _watch(self) -> None:
+        try:
+            async with Device.get_motor_collection().watch() as change_stream:
+                logger.info("Watching the devices collection for changes")
+                async for change in change_stream:
+                    logger.debug("Device changed, invalidating registry", change=change)
+                    self.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Stopped watching the devices collection, falling back to the TTL")
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or monotonic() - self._loaded_at > self.ttl
+
+
+device_registry = DeviceRegistry(
+    ttl=get_settings().mongodb.device_cache.ttl,
+    negative_ttl=get_settings().mongodb.device_cache.negative_ttl,
+)
 
 
 async def get_device_by_s3i_id(s3i_id: S3IIdType) -> Device:
-    """Get a device by its S3I ID."""
-    device = await Device.find_one({"s3i_id": s3i_id})
-    if device is None:
-        raise ValueError(f"No device found with S3I ID {s3i_id}")
-    return device
+    """Get a device by its S3I ID, served from the device registry.
+
+    Raises:
+        ValueError: If there is no device with the given S3I ID.
+    """
+    return await device_registry.get(s3i_id)
@@ -0,0 +1,74 @@
+"""Get the devices of statuses and images without fetching the link of every document.
+
+New statuses and images embed a `DeviceSnapshot`. `backfill_device_snapshots` adds it to the
+documents stored before, and `resolve_device_links` fetches the devices of many documents with a
+single query where the whole device is needed.
+"""
+
+from typing import Sequence
+
+from beanie import Link, PydanticObjectId
+from structlog.stdlib import get_logger
+
+from exp_coord.db.device import Device, DeviceSnapshot
+from exp_coord.db.image import Image
+from exp_coord.db.status import Status
+
+logger = get_logger(__name__)
+
+
+async def resolve_device_links(
+    documents: Sequence[Status | Image],
+) -> dict[PydanticObjectId, Device]:
+    """Replace the device links of the documents by the devices, loaded with one `$in` query.
+
+    Unlike `fetch_all_links` per document, the number of queries doesn't grow with the number of
+    documents. Links to devices that don't exist anymore are left as they are.
+
+    Returns:
+        The loaded devices by their ID.
+    """
+    ids = {document.device.ref.id for document in documents if isinstance(document.device, Link)}
+    if not ids:
+        return {}
+    devices = {
+        device.id: device
+        for device in await Device.find({"_id": {"$in": list(ids)}}).to_list()
+        if device.id is not None
+    }
+    for document in documents:
+        if isinstance(document.device, Link) and document.device.ref.id in devices:
+            document.device = devices[document.device.ref.id]  # pyright: ignore[reportAttributeAccessIssue]
+    return devices
+
+
+async def backfill_device_snapshots(
+    models: Sequence[type[Status] | type[Image]] = (Status, Image),
+) -> dict[str, int]:
+    """Embed the device snapshot in statuses and images that don't have one yet.
+
+    This covers documents stored before snapshots were introduced, as well as image records
+    restored by the orphan sweep. The snapshots show the devices as they are now. There is one
+    `update_many` per device and collection, so the run time doesn't depend on the number of
+    documents read by the client. Updating a time-series status collection requires MongoDB 7.
+
+    Returns:
+        The number of documents updated per collection.
+    """
+    devices = await Device.find_all().to_list()
+    updated = {}
+    for model in models:
+        collection = model.get_motor_collection()
+        count = 0
+        for device in devices:
+            # Links are stored as DBRefs, and None also matches documents without the field
+            result = await collection.update_many(
+                {"device.$id": device.id, "device_snapshot": None},
+                {"$set": {"device_snapshot": DeviceSnapshot.from_device(device).model_dump()}},
+            )
+            count += result.modified_count
+        updated[collection.name] = count
+        logger.info(
+            f"Backfilled the device snapshots of {count} documents", collection=collection.name
+        )
+    return updated
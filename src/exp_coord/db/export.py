@@ -0,0 +1,326 @@
+"""Export statuses, image records and raw message headers to partitioned Parquet files.
+
+The documents are streamed from a cursor in `_id` order and written as Arrow record batches, one
+directory per table and day, Hive style so pandas, polars and DuckDB read the day as a column:
+
+    <output_dir>/<table>/date=<YYYY-MM-DD>/part-<run>.parquet
+
+Only the fields listed per table are requested from the server, so image payloads and event
+contents are never transferred. An incremental export continues after the highest `_id` written
+by the previous one, which is kept in `<output_dir>/_watermarks.json`. The `_id`s are allocated
+when a document is ingested, so documents ingested late, like images taken while a camera was
+offline, are still exported.
+
+Requires pyarrow, which is imported on first use.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Literal, Sequence
+
+from beanie import Document
+from bson import ObjectId
+from pymongo import ASCENDING
+from structlog.stdlib import get_logger
+
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.image import Image
+from exp_coord.db.queries import TimeWindow
+from exp_coord.db.status import Status
+
+if TYPE_CHECKING:
+    import pyarrow
+    import pyarrow.parquet
+
+logger = get_logger(__name__)
+
+TableName = Literal["statuses", "images", "messages_and_events"]
+ColumnType = Literal["string", "timestamp", "int64"]
+
+WATERMARKS_FILE = "_watermarks.json"
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    """How the documents of a collection become the rows of a table."""
+
+    document_type: type[Document]
+    # Partitions the table by day and is filtered by the time window
+    time_field: str
+    columns: dict[str, ColumnType]
+    projection: dict[str, int]
+    to_row: Callable[[dict[str, Any]], dict[str, Any]]
+
+
+def _id_or_none(value: Any) -> str | None:
+    return str(value) if value is not None else None
+
+
+def _status_row(document: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": str(document["_id"]),
+        "device_id": str(document["device"].id),
+        "device_s3i_id": (document.get("device_snapshot") or {}).get("s3i_id"),
+        "status": document["status"],
+        "detail": document.get("detail", ""),
+        "status_error_text": document.get("status_error_text", ""),
+        "sent_timestamp": document["sent_timestamp"],
+        "received_timestamp": document["received_timestamp"],
+    }
+
+
+def _image_row(document: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": str(document["_id"]),
+        "device_id": str(document["device"].id),
+        "device_s3i_id": (document.get("device_snapshot") or {}).get("s3i_id"),
+        "taken_at": document["taken_at"],
+        "file_id": _id_or_none(document.get("file_id")),
+    }
+
+
+def _message_or_event_row(document: dict[str, Any]) -> dict[str, Any]:
+    data = document["data"]
+    content = data.get("content")
+    return {
+        "id": str(document["_id"]),
+        "added_at": document["added_at"],
+        "message_type": data["messageType"],
+        "identifier": data["identifier"],
+        "sender": data["sender"],
+        "topic": data.get("topic"),
+        "timestamp": data.get("timestamp"),
+        # Status events only, the rest of the content is not exported
+        "status": content.get("status") if isinstance(content, dict) else None,
+    }
+
+
+TABLES: dict[TableName, ExportTable] = {
+    "statuses": ExportTable(
+        Status,
+        "received_timestamp",
+        {
+            "id": "string",
+            "device_id": "string",
+            "device_s3i_id": "string",
+            "status": "string",
+            "detail": "string",
+            "status_error_text": "string",
+            "sent_timestamp": "timestamp",
+            "received_timestamp": "timestamp",
+        },
+        dict.fromkeys(
+            [
+                "device",
+                "device_snapshot.s3i_id",
+                "status",
+                "detail",
+                "status_error_text",
+                "sent_timestamp",
+                "received_timestamp",
+            ],
+            1,
+        ),
+        _status_row,
+    ),
+    "images": ExportTable(
+        Image,
+        "taken_at",
+        {
+            "id": "string",
+            "device_id": "string",
+            "device_s3i_id": "string",
+            "taken_at": "timestamp",
+            "file_id": "string",
+        },
+        dict.fromkeys(["device", "device_snapshot.s3i_id", "taken_at", "file_id"], 1),
+        _image_row,
+    ),
+    "messages_and_events": ExportTable(
+        AllMessagesAndEvents,
+        "added_at",
+        {
+            "id": "string",
+            "added_at": "timestamp",
+            "message_type": "string",
+            "identifier": "string",
+            "sender": "string",
+            "topic": "string",
+            "timestamp": "int64",
+            "status": "string",
+        },
+        dict.fromkeys(
+            [
+                "added_at",
+                "data.messageType",
+                "data.identifier",
+                "data.sender",
+                "data.topic",
+                "data.timestamp",
+                "data.content.status",
+            ],
+            1,
+        ),
+        _message_or_event_row,
+    ),
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError(
+            "Exporting to Parquet requires pyarrow, install it with `pip install exp-coord[export]`"
+        ) from exc
+    return pyarrow, pyarrow.parquet
+
+
+def load_watermarks(output_dir: Path) -> dict[str, str]:
+    """Get the highest `_id` exported per table, empty if nothing was exported incrementally."""
+    path = output_dir / WATERMARKS_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+class _PartitionedWriter:
+    """Write record batches to one Parquet file per day, opened on first use."""
+
+    def __init__(self, directory: Path, run: str, schema: "pyarrow.Schema", parquet: Any) -> None:
+        self.directory = directory
+        self.run = run
+        self.schema = schema
+        self.parquet = parquet
+        self._writers: dict[str, "pyarrow.parquet.ParquetWriter"] = {}
+        self.files: list[Path] = []
+
+    def _final(self, day: str) -> Path:
+        return self.directory / f"date={day}" / f"part-{self.run}.parquet"
+
+    def _partial(self, day: str) -> Path:
+        # Readers like pyarrow and Spark skip files starting with a dot, also if a killed export
+        # leaves one behind
+        final = self._final(day)
+        return final.with_name(f".{final.name}")
+
+    def write(self, day: str, batch: "pyarrow.RecordBatch") -> None:
+        writer = self._writers.get(day)
+        if writer is None:
+            path = self._partial(day)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer = self._writers[day] = self.parquet.ParquetWriter(
+                path, self.schema, compression="zstd"
+            )
+        writer.write_batch(batch)
+
+    def close(self) -> None:
+        """Close all files, and only then give them their final name."""
+        for day, writer in self._writers.items():
+            writer.close()
+            final = self._final(day)
+            os.replace(self._partial(day), final)
+            self.files.append(final)
+        self._writers.clear()
+
+    def abort(self) -> None:
+        """Close and delete all files, as the rows in them are exported again by the next run."""
+        for day, writer in self._writers.items():
+            writer.close()
+            self._partial(day).unlink(missing_ok=True)
+        self._writers.clear()
+
+
+async def export_table(
+    table: TableName,
+    output_dir: Path,
+    *,
+    window: TimeWindow | None = None,
+    incremental: bool = False,
+    batch_size: int = 10_000,
+) -> list[Path]:
+    """Export a table to partitioned Parquet files.
+
+    Args:
+        table: The table to export.
+        output_dir: The directory holding a subdirectory per table.
+        window: Only export documents whose time field is in the window.
+        incremental: Only export documents after the watermark of the previous incremental
+            export, and move the watermark to the last exported document.
+        batch_size: The number of rows per record batch, and of documents fetched per round trip.
+
+    Returns:
+        The written files, one per day with documents.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, not {batch_size}")
+    pyarrow, parquet = _import_pyarrow()
+    types = {
+        "string": pyarrow.string(),
+        "timestamp": pyarrow.timestamp("ms"),
+        "int64": pyarrow.int64(),
+    }
+    spec = TABLES[table]
+    schema = pyarrow.schema([(name, types[type_]) for name, type_ in spec.columns.items()])
+
+    query: dict[str, Any] = window.match(spec.time_field) if window is not None else {}
+    watermarks = load_watermarks(output_dir)
+    if incremental and table in watermarks:
+        query["_id"] = {"$gt": ObjectId(watermarks[table])}
+
+    run = str(ObjectId())
+    writer = _PartitionedWriter(output_dir / table, run, schema, parquet)
+    buffers: dict[str, list[dict[str, Any]]] = {}
+    last_id = None
+    rows = 0
+    cursor = (
+        spec.document_type.get_motor_collection()
+        .find(query, spec.projection)
+        .sort("_id", ASCENDING)
+        .batch_size(batch_size)
+    )
+    try:
+        async for document in cursor:
+            day = document[spec.time_field].date().isoformat()
+            buffer = buffers.setdefault(day, [])
+            buffer.append(spec.to_row(document))
+            if len(buffer) >= batch_size:
+                writer.write(day, pyarrow.RecordBatch.from_pylist(buffer, schema=schema))
+                buffers[day] = []
+            last_id = document["_id"]
+            rows += 1
+        for day, buffer in buffers.items():
+            if buffer:
+                writer.write(day, pyarrow.RecordBatch.from_pylist(buffer, schema=schema))
+    except BaseException:
+        # Also when cancelled, so readers of the partitions never see an incomplete export
+        writer.abort()
+        raise
+    writer.close()
+
+    # Only moved once all files are complete, so an interrupted export is repeated
+    if incremental and last_id is not None:
+        watermarks[table] = str(last_id)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / WATERMARKS_FILE).write_text(json.dumps(watermarks, indent=2))
+
+    logger.info(f"Exported {rows} rows to {len(writer.files)} files", table=table)
+    return writer.files
+
+
+async def export_tables(
+    tables: Sequence[TableName],
+    output_dir: Path,
+    *,
+    window: TimeWindow | None = None,
+    incremental: bool = False,
+    batch_size: int = 10_000,
+) -> dict[TableName, list[Path]]:
+    """Export several tables one after the other, see `export_table`."""
+    return {
+        table: await export_table(
+            table, output_dir, window=window, incremental=incremental, batch_size=batch_size
+        )
+        for table in tables
+    }
@@ -6,7 +6,9 @@ from beanie import PydanticObjectId
 from bson import ObjectId
 from pydantic import BaseModel, Field, model_validator
 
+from exp_coord.core.metrics import GRIDFS_OPERATION_DURATION
 from exp_coord.db.connection import create_grid_fs_client
+from exp_coord.db.device import DeviceSnapshot
 
 
 class GridFSFileMetadata(BaseModel):
@@ -42,6 +44,16 @@ class ImageFileMetadata(GridFSFileMetadata):
     # FIXME: This is not ideal, as it destroys the type annotations.
     from_id: PydanticObjectId | None = Field(default=None)
 
+    # Enough information to restore the image record, should it be missing
+    device_id: PydanticObjectId | None = None
+    taken_at: datetime.datetime | None = None
+    # The identifier of the new image event and the device at the time, so the restored record
+    # equals the one that wasn't inserted
+    identifier: str | None = None
+    device_snapshot: DeviceSnapshot | None = None
+    # Hex SHA-256 of the image, which raw new image events reference instead of the image
+    sha256: str | None = None
+
     @model_validator(mode="after")
     def ensure_values_are_set(self):
         if self.from_collection != "images":
@@ -62,4 +74,12 @@ async def upload_to_gridfs(
 ) -> ObjectId:
     """Upload a file to GridFS. file_data should be a stream supported by Motor."""
     fs = create_grid_fs_client(bucket_name=bucket_name)
-    return await fs.upload_from_stream(filename, file_data, metadata=metadata.dict())
+    with GRIDFS_OPERATION_DURATION.labels(operation="upload").time():
+        return await fs.upload_from_stream(filename, file_data, metadata=metadata.dict())
+
+
+async def delete_from_gridfs(file_id: ObjectId, bucket_name: str = "fs") -> None:
+    """Delete a file and its chunks from GridFS."""
+    fs = create_grid_fs_client(bucket_name=bucket_name)
+    with GRIDFS_OPERATION_DURATION.labels(operation="delete").time():
+        await fs.delete(file_id)
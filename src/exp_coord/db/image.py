@@ -1,43 +1,74 @@
 from datetime import datetime
 
 from beanie import Document, Link, PydanticObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 from exp_coord.core.config import get_settings
-from exp_coord.db.device import Device
+from exp_coord.db.device import Device, DeviceSnapshot
 
 
 class Image(Document):
     """An image taken by a camera device. The images themselves should be stored in GridFS using the method below.
 
-    Storage in GridFS has to be done manually. Consider the following example:
+    Storage in GridFS has to be done manually. To only write the image record once, its ID is
+    allocated up front. Consider the following example:
     ```python
+    from beanie import PydanticObjectId
+
     from exp_coord.db.image import Image
     from exp_coord.db.gridfs import ImageFileMetadata, upload_to_gridfs
 
-    filename = await image.get_filename()
-    image = Image(device=..., taken_at=..., filename=filename)
-    metadata = ImageFileMetadata(from_id=image.id)
+    image_id = PydanticObjectId()
+    filename = Image.build_filename(device.s3i_id, taken_at)
+    metadata = ImageFileMetadata(from_id=image_id, device_id=device.id, taken_at=taken_at)
     with aiofiles.open("path/to/image.jpg", "rb") as f:
-        file_id = upload_to_gridfs(filename, f, metadata, bucket_name=get_settings().mongodb.collection_names.image_gridfs)
-        image.file_id = file_id
-        await image.insert()
+        file_id = await upload_to_gridfs(filename, f, metadata, bucket_name=get_settings().mongodb.collection_names.image_gridfs)
+    await Image(id=image_id, device=device, taken_at=taken_at, file_id=file_id).insert()
     ```
+
+    If the process crashes between the upload and the insert, the file is left without a record.
+    `exp_coord.db.orphans.sweep_orphaned_image_files` restores the record from the file metadata.
     """
 
     device: Link[Device]
+    # None for images stored before snapshots were introduced, until they are backfilled
+    device_snapshot: DeviceSnapshot | None = None
     taken_at: datetime
 
     file_id: PydanticObjectId | None = None
+    # The identifier of the new image event, unique so redeliveries are only stored once
+    identifier: str | None = None
+
+    @staticmethod
+    def build_filename(s3i_id: str, taken_at: datetime) -> str:
+        """Compute the filename of an image taken by the device with the given S3I ID."""
+        return f"{s3i_id}-{taken_at.isoformat()}.jpg"
 
     async def get_filename(self) -> str:
-        """Compute the filename of the image. This method has to be async because it fetches the device link."""
+        """Compute the filename of the image. This method has to be async because it fetches the device link.
+
+        Use `build_filename` instead if the device is already at hand.
+        """
         await self.fetch_link("device")
         # self.device is getting cast to a Device object by the fetch_link method
         assert isinstance(self.device, Device), (
             "Device link should be fetched. This should never happen."
         )
-        return f"{self.device.s3i_id}-{self.taken_at.isoformat()}.jpg"
+        return self.build_filename(self.device.s3i_id, self.taken_at)
 
     class Settings:
         name = get_settings().mongodb.collection_names.image
         validate_on_save = True
+        # Links are stored as DBRefs, so the device is indexed by the $id of the reference
+        indexes = [  # noqa: RUF012
+            IndexModel(
+                [("device.$id", ASCENDING), ("taken_at", DESCENDING)], name="device_taken_at"
+            ),
+            IndexModel([("taken_at", DESCENDING)], name="taken_at"),
+            IndexModel(
+                [("identifier", ASCENDING)],
+                name="identifier_unique",
+                unique=True,
+                partialFilterExpression={"identifier": {"$type": "string"}},
+            ),
+        ]
@@ -0,0 +1,201 @@
+"""Download the image files from GridFS to a directory, in parallel and incrementally.
+
+A bounded number of workers download files concurrently. The files are written to disk in a
+thread, so the event loop keeps feeding the other downloads. Files already present with the
+stored length, and optionally the stored hash, are skipped, so an interrupted or repeated sync
+only downloads what is missing. Each file is written under a `.partial` name first and renamed
+once complete, so a partially written file is never mistaken for a downloaded one.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pydantic import TypeAdapter, ValidationError
+from structlog.stdlib import get_logger
+
+from exp_coord.core.config import get_settings
+from exp_coord.db.connection import create_grid_fs_client, get_db
+from exp_coord.db.gridfs import ImageFileMetadata
+from exp_coord.db.queries import TimeWindow
+
+logger = get_logger(__name__)
+
+METADATA_FILE = "metadata.json"
+
+_metadata_adapter = TypeAdapter(dict[str, ImageFileMetadata])
+
+
+@dataclass
+class ImageDownloadResult:
+    """What a download did, and how fast."""
+
+    total: int = 0  # Files matching the filters
+    downloaded: int = 0
+    skipped: int = 0  # Files already present
+    failed: int = 0
+    bytes_downloaded: int = 0
+    seconds: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return self.downloaded + self.skipped + self.failed
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_downloaded / self.seconds if self.seconds > 0 else 0.0
+
+
+def local_filename(filename: str) -> str:
+    """Get the name an image file is saved as, which mustn't contain colons on Windows."""
+    return filename.replace(":", "_")
+
+
+def _is_present(path: Path, file: dict[str, Any], verify: bool) -> bool:
+    """Check whether the file was downloaded before. Blocking, run it in a thread."""
+    try:
+        if path.stat().st_size != file["length"]:
+            return False
+    except FileNotFoundError:
+        return False
+    if not verify:
+        return True
+    # The SHA-256 is stored with new images, older files may still have the MD5 GridFS computed
+    metadata = file.get("metadata") or {}
+    if metadata.get("sha256"):
+        return hashlib.sha256(path.read_bytes()).hexdigest() == metadata["sha256"]
+    if file.get("md5"):
+        return hashlib.md5(path.read_bytes()).hexdigest() == file["md5"]
+    return True
+
+
+def _write(path: Path, data: bytes) -> None:
+    """Write the file under a temporary name and rename it. Blocking, run it in a thread."""
+    partial = path.with_name(path.name + ".partial")
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+
+def _query(device_s3i_id: str | None, window: TimeWindow | None) -> dict[str, Any]:
+    query: dict[str, Any] = {}
+    if device_s3i_id is not None:
+        # The filename starts with the S3I ID, also for files uploaded without the device in
+        # their metadata, see `Image.build_filename`
+        query["filename"] = {"$regex": f"^{re.escape(device_s3i_id)}-"}
+    if window is not None:
+        query.update(window.match("metadata.taken_at"))
+    return query
+
+
+async def download_images(
+    output_dir: Path,
+    *,
+    device_s3i_id: str | None = None,
+    window: TimeWindow | None = None,
+    concurrency: int = 8,
+    verify: bool = False,
+    progress_interval: float = 5.0,
+) -> ImageDownloadResult:
+    """Download the image files from GridFS to `output_dir` and save their metadata.
+
+    The metadata of the files is saved in `metadata.json`, by filename, merged with the metadata
+    saved by previous downloads.
+
+    Args:
+        output_dir: The directory to save the files in.
+        device_s3i_id: Only download the images of the device with this S3I ID.
+        window: Only download images taken in the window. Files uploaded without the time the
+            image was taken in their metadata are left out.
+        concurrency: The number of files downloaded at once.
+        verify: Also compare the hash of files already present to the stored one, instead of just
+            their length.
+        progress_interval: Seconds between progress logs.
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, not {concurrency}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    bucket_name = get_settings().mongodb.collection_names.image_gridfs
+    bucket = create_grid_fs_client(bucket_name)
+    files = get_db()[f"{bucket_name}.files"]
+    query = _query(device_s3i_id, window)
+
+    metadata_path = output_dir / METADATA_FILE
+    metadata: dict[str, ImageFileMetadata] = (
+        _metadata_adapter.validate_json(metadata_path.read_bytes())
+        if metadata_path.exists()
+        else {}
+    )
+    result = ImageDownloadResult(total=await files.count_documents(query))
+    started = time.monotonic()
+    last_logged = started
+
+    def log_progress() -> None:
+        result.seconds = time.monotonic() - started
+        logger.info(
+            f"Handled {result.done}/{result.total} image files",
+            downloaded=result.downloaded,
+            skipped=result.skipped,
+            failed=result.failed,
+            mib_per_second=round(result.bytes_per_second / 2**20, 2),
+        )
+
+    queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue(concurrency * 2)
+
+    async def worker() -> None:
+        nonlocal last_logged
+        while (file := await queue.get()) is not None:
+            try:
+                await _download(bucket, file, output_dir, verify, result)
+            except Exception:
+                logger.exception("Failed to download image file", filename=file.get("filename"))
+                result.failed += 1
+            if time.monotonic() - last_logged >= progress_interval:
+                last_logged = time.monotonic()
+                log_progress()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        cursor = files.find(query, batch_size=1000)
+        async for file in cursor:
+            await queue.put(file)
+            filename = file.get("filename") or str(file["_id"])
+            try:
+                metadata[filename] = ImageFileMetadata.model_validate(file.get("metadata"))
+            except ValidationError:
+                logger.warning("Image file without valid metadata", filename=filename)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        raise
+    # One stop signal per worker, they exit after all files before it are downloaded
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+
+    await asyncio.to_thread(_write, metadata_path, _metadata_adapter.dump_json(metadata))
+    log_progress()
+    return result
+
+
+async def _download(
+    bucket: AsyncIOMotorGridFSBucket,
+    file: dict[str, Any],
+    output_dir: Path,
+    verify: bool,
+    result: ImageDownloadResult,
+) -> None:
+    path = output_dir / local_filename(file.get("filename") or str(file["_id"]))
+    if await asyncio.to_thread(_is_present, path, file, verify):
+        result.skipped += 1
+        return
+    stream = await bucket.open_download_stream(file["_id"])
+    data = await stream.read()
+    await asyncio.to_thread(_write, path, data)
+    result.downloaded += 1
+    result.bytes_downloaded += len(data)
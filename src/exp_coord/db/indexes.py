@@ -0,0 +1,106 @@
+"""Bring the indexes of the collections in line with the ones declared by the documents."""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Sequence
+
+from beanie import Document
+from structlog.stdlib import get_logger
+
+from exp_coord.db.connection import __models__
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class IndexReport:
+    """An index of a collection after syncing, with how much it is used."""
+
+    collection: str
+    name: str
+    keys: dict[str, Any]
+    # Whether a document declares it, the _id index counts as declared
+    declared: bool
+    # Whether the sync created or dropped it
+    created: bool = False
+    dropped: bool = False
+    size_bytes: int | None = None
+    # Operations that used the index since the server started or the index was created
+    accesses: int | None = None
+    accesses_since: datetime | None = None
+
+    @property
+    def state(self) -> str:
+        if self.dropped:
+            return "dropped"
+        if self.created:
+            return "created"
+        return "declared" if self.declared else "undeclared"
+
+
+async def sync_indexes(
+    models: Sequence[type[Document]] = __models__, *, drop_undeclared: bool = False
+) -> list[IndexReport]:
+    """Create the indexes declared in the `Settings` of every document, and report all indexes.
+
+    Indexes that exist but are not declared are only dropped with `drop_undeclared`. Creating an
+    index with the same name but different keys or options fails, drop it first in that case.
+
+    Requires Beanie to be initialized with the models.
+    """
+    reports = []
+    for model in models:
+        reports.extend(await _sync_collection(model, drop_undeclared))
+    return reports
+
+
+async def _sync_collection(model: type[Document], drop_undeclared: bool) -> list[IndexReport]:
+    collection = model.get_motor_collection()
+    declared = model.get_settings().indexes or []
+    declared_names = {index.document["name"] for index in declared}
+
+    existing_before = await collection.index_information()
+    if declared:
+        await collection.create_indexes(declared)
+
+    dropped = []
+    for name in existing_before:
+        if name != "_id_" and name not in declared_names and drop_undeclared:
+            logger.info("Dropping undeclared index", collection=collection.name, index=name)
+            await collection.drop_index(name)
+            dropped.append(name)
+
+    usage = {
+        stats["name"]: stats["accesses"]
+        async for stats in collection.aggregate([{"$indexStats": {}}])
+    }
+    sizes = {}
+    async for stats in collection.aggregate([{"$collStats": {"storageStats": {}}}]):
+        sizes.update(stats["storageStats"].get("indexSizes", {}))
+
+    reports = []
+    for name, info in (await collection.index_information()).items():
+        accesses = usage.get(name, {})
+        reports.append(
+            IndexReport(
+                collection=collection.name,
+                name=name,
+                keys=dict(info["key"]),
+                declared=name == "_id_" or name in declared_names,
+                created=name not in existing_before,
+                size_bytes=sizes.get(name),
+                accesses=accesses.get("ops"),
+                accesses_since=accesses.get("since"),
+            )
+        )
+    reports.extend(
+        IndexReport(
+            collection=collection.name,
+            name=name,
+            keys=dict(existing_before[name]["key"]),
+            declared=False,
+            dropped=True,
+        )
+        for name in dropped
+    )
+    return reports
@@ -0,0 +1,153 @@
+"""Repair images left inconsistent by a crash during ingestion.
+
+Images are ingested by first uploading the file to GridFS and then inserting the image record.
+A crash in between leaves a file without a record, which is found and repaired here. The record
+is restored with the event identifier, so a redelivery of the event is still recognized as stored.
+If the event was stored again before the sweep, the file is a duplicate and deleted. Records
+created by the old ingestion path (insert, upload, then save) may also lack their `file_id`.
+"""
+
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from itertools import batched
+from typing import Any
+
+from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+from structlog.stdlib import get_logger
+
+from exp_coord.core.config import get_settings
+from exp_coord.db.connection import create_grid_fs_client, get_db
+from exp_coord.db.device import Device, DeviceSnapshot
+from exp_coord.db.image import Image
+
+logger = get_logger(__name__)
+
+_BATCH_SIZE = 500
+
+
+@dataclass
+class OrphanSweepResult:
+    """What the sweep found and did."""
+
+    restored: int = 0  # Image records recreated from the metadata of their file
+    relinked: int = 0  # Image records whose missing file_id was set
+    unrecoverable: int = 0  # Files whose metadata is not sufficient to restore the record
+    deleted: int = 0  # Unrecoverable files that were deleted
+    duplicates: int = 0  # Files of images whose event was stored again, which were deleted
+
+
+async def sweep_orphaned_image_files(
+    grace_period: timedelta = timedelta(minutes=10), delete_unrecoverable: bool = False
+) -> OrphanSweepResult:
+    """Find image files without an image record and restore the record from the file metadata.
+
+    Args:
+        grace_period: Only files uploaded at least this long ago are considered, so ingestions
+            still in progress are not interfered with.
+        delete_unrecoverable: Delete files whose metadata doesn't contain the device and time the
+            image was taken at. Otherwise they are only reported.
+    """
+    bucket_name = get_settings().mongodb.collection_names.image_gridfs
+    files = get_db()[f"{bucket_name}.files"]
+    bucket = create_grid_fs_client(bucket_name)
+    result = OrphanSweepResult()
+
+    cursor = files.find(
+        {"uploadDate": {"$lt": datetime.now(UTC) - grace_period}},
+        projection={"metadata": 1},
+        batch_size=_BATCH_SIZE,
+    )
+    batch: list[dict[str, Any]] = []
+    async for file in cursor:
+        batch.append(file)
+        if len(batch) == _BATCH_SIZE:
+            await _sweep_batch(batch, bucket, delete_unrecoverable, result)
+            batch = []
+    if batch:
+        await _sweep_batch(batch, bucket, delete_unrecoverable, result)
+
+    result.relinked = await _relink_images_without_file(files)
+    logger.info("Swept orphaned image files", result=result)
+    return result
+
+
+async def _sweep_batch(
+    files: list[dict[str, Any]],
+    bucket: AsyncIOMotorGridFSBucket,
+    delete_unrecoverable: bool,
+    result: OrphanSweepResult,
+) -> None:
+    """Check a batch of files for missing image records with a single query."""
+    image_ids = [from_id for file in files if (from_id := _from_id(file)) is not None]
+    existing = {
+        image["_id"]
+        for image in await Image.get_motor_collection()
+        .find({"_id": {"$in": image_ids}}, projection={"_id": 1})
+        .to_list(None)
+    }
+
+    for file in files:
+        metadata = file.get("metadata") or {}
+        from_id = _from_id(file)
+        if from_id is not None and from_id in existing:
+            continue
+
+        if from_id is None or metadata.get("device_id") is None or metadata.get("taken_at") is None:
+            result.unrecoverable += 1
+            if delete_unrecoverable:
+                logger.warning("Deleting unrecoverable orphaned image file", file_id=file["_id"])
+                await bucket.delete(file["_id"])
+                result.deleted += 1
+            else:
+                logger.warning("Found unrecoverable orphaned image file", file_id=file["_id"])
+            continue
+
+        logger.info("Restoring the record of an orphaned image file", file_id=file["_id"])
+        snapshot = metadata.get("device_snapshot")
+        try:
+            await Image(
+                id=PydanticObjectId(from_id),
+                device=Device.link_from_id(metadata["device_id"]),
+                device_snapshot=DeviceSnapshot.model_validate(snapshot) if snapshot else None,
+                taken_at=metadata["taken_at"],
+                file_id=PydanticObjectId(file["_id"]),
+                identifier=metadata.get("identifier"),
+            ).insert()
+        except DuplicateKeyError:
+            logger.warning(
+                "Deleting orphaned image file of an event stored again",
+                file_id=file["_id"],
+                identifier=metadata.get("identifier"),
+            )
+            await bucket.delete(file["_id"])
+            result.duplicates += 1
+            continue
+        result.restored += 1
+
+
+async def _relink_images_without_file(files: AsyncIOMotorCollection) -> int:
+    """Set the file_id of image records that were inserted before their file was uploaded."""
+    relinked = 0
+    image_ids = [
+        image["_id"]
+        async for image in Image.get_motor_collection().find(
+            {"file_id": None}, projection={"_id": 1}
+        )
+    ]
+    for ids in batched(image_ids, _BATCH_SIZE):
+        async for file in files.find(
+            {"metadata.from_id": {"$in": list(ids)}}, projection={"metadata.from_id": 1}
+        ):
+            update = await Image.get_motor_collection().update_one(
+                {"_id": file["metadata"]["from_id"], "file_id": None},
+                {"$set": {"file_id": file["_id"]}},
+            )
+            # Zero if another file of the same image, or a concurrent sweep, linked it first
+            relinked += update.modified_count
+    return relinked
+
+
+def _from_id(file: dict[str, Any]) -> Any:
+    return (file.get("metadata") or {}).get("from_id")
@@ -0,0 +1,335 @@
+"""Query statuses, images and raw messages and events in a time window, in bounded memory.
+
+Instead of loading whole documents with `.to_list()`, the functions here
+
+- stream rows from a cursor, fetching `batch_size` documents per round trip,
+- only request the fields of the row from the server, so e.g. image payloads never leave it,
+- count and bin documents in an aggregation, so only the results are transferred.
+
+Example:
+    ```python
+    window = TimeWindow(datetime(2025, 4, 6), datetime(2025, 4, 12))
+    async for row in stream_statuses(window, status="error"):
+        print(row.device_s3i_id, row.sent_timestamp, row.detail)
+
+    by_topic = await count_by(AllMessagesAndEvents, window, "data.topic")
+    per_hour = await time_histogram(Image, window, unit="hour")
+    ```
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Literal, Mapping, Sequence, TypeVar
+
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel
+from pydantic.types import JsonValue
+from pymongo import ASCENDING
+
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.image import Image
+from exp_coord.db.status import Status
+
+R = TypeVar("R")
+
+DEFAULT_BATCH_SIZE = 1000
+
+# The field a time window applies to, if not given. They are all indexed.
+DEFAULT_TIME_FIELDS: dict[type[Document], str] = {
+    Status: "received_timestamp",
+    Image: "taken_at",
+    AllMessagesAndEvents: "added_at",
+}
+
+TimeUnit = Literal["second", "minute", "hour", "day", "week", "month", "year"]
+StatusTimeField = Literal["received_timestamp", "sent_timestamp"]
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """The time span from `start`, inclusive, to `end`, exclusive."""
+
+    start: datetime
+    end: datetime
+
+    def __post_init__(self) -> None:
+        if self.end < self.start:
+            raise ValueError(f"The window ends at {self.end}, before it starts at {self.start}")
+
+    def match(self, field: str) -> dict[str, Any]:
+        """Get the filter for documents with `field` in the window."""
+        return {field: {"$gte": self.start, "$lt": self.end}}
+
+
+class StatusRow(BaseModel):
+    id: PydanticObjectId
+    device_id: PydanticObjectId
+    # From the embedded device snapshot, None if it wasn't backfilled yet
+    device_s3i_id: str | None
+    status: str
+    detail: str
+    sent_timestamp: datetime
+    received_timestamp: datetime
+
+
+class ImageRow(BaseModel):
+    id: PydanticObjectId
+    device_id: PydanticObjectId
+    device_s3i_id: str | None
+    taken_at: datetime
+    file_id: PydanticObjectId | None
+
+
+class MessageOrEventRow(BaseModel):
+    id: PydanticObjectId
+    added_at: datetime
+    message_type: str
+    identifier: str
+    sender: str
+    # Only set for events
+    topic: str | None = None
+    timestamp: int | None = None
+    # The requested fields of the event content
+    content: JsonValue = None
+
+
+class HistogramBin(BaseModel):
+    start: datetime
+    # The value of the field the bins are split by, if any
+    key: Any = None
+    count: int
+
+
+def stream_statuses(
+    window: TimeWindow,
+    *,
+    device_id: PydanticObjectId | None = None,
+    status: str | None = None,
+    time_field: StatusTimeField = "received_timestamp",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> AsyncIterator[StatusRow]:
+    """Stream the statuses in the window, ordered by `time_field`."""
+    query = window.match(time_field)
+    if device_id is not None:
+        query["device.$id"] = device_id
+    if status is not None:
+        query["status"] = status
+    projection = {
+        "device": 1,
+        "device_snapshot.s3i_id": 1,
+        "status": 1,
+        "detail": 1,
+        "sent_timestamp": 1,
+        "received_timestamp": 1,
+    }
+
+    def to_row(document: dict[str, Any]) -> StatusRow:
+        return StatusRow(
+            id=document["_id"],
+            device_id=document["device"].id,
+            device_s3i_id=(document.get("device_snapshot") or {}).get("s3i_id"),
+            status=document["status"],
+            detail=document.get("detail", ""),
+            sent_timestamp=document["sent_timestamp"],
+            received_timestamp=document["received_timestamp"],
+        )
+
+    return _stream(Status, query, projection, time_field, batch_size, to_row)
+
+
+def stream_images(
+    window: TimeWindow,
+    *,
+    device_id: PydanticObjectId | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> AsyncIterator[ImageRow]:
+    """Stream the image records of images taken in the window, ordered by when they were taken."""
+    query = window.match("taken_at")
+    if device_id is not None:
+        query["device.$id"] = device_id
+    projection = {"device": 1, "device_snapshot.s3i_id": 1, "taken_at": 1, "file_id": 1}
+
+    def to_row(document: dict[str, Any]) -> ImageRow:
+        return ImageRow(
+            id=document["_id"],
+            device_id=document["device"].id,
+            device_s3i_id=(document.get("device_snapshot") or {}).get("s3i_id"),
+            taken_at=document["taken_at"],
+            file_id=document.get("file_id"),
+        )
+
+    return _stream(Image, query, projection, "taken_at", batch_size, to_row)
+
+
+def stream_messages_and_events(
+    window: TimeWindow,
+    *,
+    message_type: str | None = None,
+    topic: str | None = None,
+    match: Mapping[str, Any] | None = None,
+    content_fields: Sequence[str] | None = (),
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> AsyncIterator[MessageOrEventRow]:
+    """Stream the raw messages and events added in the window, ordered by when they were added.
+
+    Args:
+        window: The window `added_at` has to be in.
+        message_type: Only get messages of this type, e.g. "eventMessage".
+        topic: Only get events of this topic.
+        match: Further conditions on the raw documents, e.g. `{"data.content.status": "error"}`.
+        content_fields: The fields of the event content to get. The whole content is requested
+            if None, which may contain large values. By default, no content is requested.
+        batch_size: The number of documents fetched per round trip.
+    """
+    query = {**window.match("added_at"), **(match or {})}
+    if message_type is not None:
+        query["data.messageType"] = message_type
+    if topic is not None:
+        query["data.topic"] = topic
+    projection = {
+        "added_at": 1,
+        "data.messageType": 1,
+        "data.identifier": 1,
+        "data.sender": 1,
+        "data.topic": 1,
+        "data.timestamp": 1,
+    }
+    if content_fields is None:
+        projection["data.content"] = 1
+    else:
+        projection.update({f"data.content.{field}": 1 for field in content_fields})
+
+    def to_row(document: dict[str, Any]) -> MessageOrEventRow:
+        data = document["data"]
+        return MessageOrEventRow(
+            id=document["_id"],
+            added_at=document["added_at"],
+            message_type=data["messageType"],
+            identifier=data["identifier"],
+            sender=data["sender"],
+            topic=data.get("topic"),
+            timestamp=data.get("timestamp"),
+            content=data.get("content"),
+        )
+
+    return _stream(AllMessagesAndEvents, query, projection, "added_at", batch_size, to_row)
+
+
+async def count_in_window(
+    document_type: type[Document],
+    window: TimeWindow,
+    *,
+    match: Mapping[str, Any] | None = None,
+    time_field: str | None = None,
+) -> int:
+    """Count the documents in the window, see `count_by` for the arguments."""
+    return await document_type.get_motor_collection().count_documents(
+        _window_match(document_type, window, match, time_field)
+    )
+
+
+async def count_by(
+    document_type: type[Document],
+    window: TimeWindow,
+    key: str,
+    *,
+    match: Mapping[str, Any] | None = None,
+    time_field: str | None = None,
+) -> dict[Any, int]:
+    """Count the documents in the window per value of the field `key`, e.g. "data.topic".
+
+    Args:
+        document_type: The document whose collection is queried.
+        window: The window the documents' time field has to be in.
+        key: The dotted path of the field to count by. Documents without it are counted as None.
+        match: Further conditions on the documents.
+        time_field: The field the window applies to. Defaults to the one in
+            `DEFAULT_TIME_FIELDS`.
+    """
+    pipeline = [
+        {"$match": _window_match(document_type, window, match, time_field)},
+        {"$group": {"_id": f"${key}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+    ]
+    return {
+        result["_id"]: result["count"]
+        async for result in document_type.get_motor_collection().aggregate(pipeline)
+    }
+
+
+async def time_histogram(
+    document_type: type[Document],
+    window: TimeWindow,
+    *,
+    unit: TimeUnit = "hour",
+    bin_size: int = 1,
+    key: str | None = None,
+    match: Mapping[str, Any] | None = None,
+    time_field: str | None = None,
+) -> list[HistogramBin]:
+    """Count the documents in the window per time bin, and optionally per value of `key`.
+
+    The bins are computed by the server with `$dateTrunc`, which requires MongoDB 5. Bins without
+    documents are left out.
+
+    Args:
+        document_type: The document whose collection is queried.
+        window: The window the documents' time field has to be in.
+        unit: The unit of the bin size.
+        bin_size: The number of units per bin, e.g. 15 with "minute" for quarter hours.
+        key: The dotted path of a field to split the bins by, e.g. "status".
+        match: Further conditions on the documents.
+        time_field: The field the window applies to and that is binned. Defaults to the one in
+            `DEFAULT_TIME_FIELDS`.
+
+    Returns:
+        The bins, ordered by their start and key.
+    """
+    if bin_size < 1:
+        raise ValueError(f"bin_size must be at least 1, not {bin_size}")
+    time_field = time_field or DEFAULT_TIME_FIELDS[document_type]
+    group_id: dict[str, Any] = {
+        "start": {"$dateTrunc": {"date": f"${time_field}", "unit": unit, "binSize": bin_size}}
+    }
+    if key is not None:
+        group_id["key"] = f"${key}"
+    pipeline = [
+        {"$match": _window_match(document_type, window, match, time_field)},
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}},
+        {"$sort": {"_id.start": 1, "_id.key": 1}},
+    ]
+    return [
+        HistogramBin(
+            start=result["_id"]["start"], key=result["_id"].get("key"), count=result["count"]
+        )
+        async for result in document_type.get_motor_collection().aggregate(pipeline)
+    ]
+
+
+def _window_match(
+    document_type: type[Document],
+    window: TimeWindow,
+    match: Mapping[str, Any] | None,
+    time_field: str | None,
+) -> dict[str, Any]:
+    return {**window.match(time_field or DEFAULT_TIME_FIELDS[document_type]), **(match or {})}
+
+
+async def _stream(
+    document_type: type[Document],
+    query: dict[str, Any],
+    projection: dict[str, Any],
+    sort_field: str,
+    batch_size: int,
+    to_row: Callable[[dict[str, Any]], R],
+) -> AsyncIterator[R]:
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, not {batch_size}")
+    cursor = (
+        document_type.get_motor_collection()
+        .find(query, projection)
+        .sort(sort_field, ASCENDING)
+        .batch_size(batch_size)
+    )
+    async for document in cursor:
+        yield to_row(document)
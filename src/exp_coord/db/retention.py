@@ -0,0 +1,210 @@
+"""Archive old raw messages and events to compressed files, and restore them.
+
+`AllMessagesAndEvents` keeps every raw message and event, including the base64 payloads of images
+that are stored in GridFS anyway. Only the last `mongodb.retention.hot_days` are kept in MongoDB,
+older documents are moved to the archive directory:
+
+    <archive_dir>/<collection>/<YYYY-MM-DD of added_at>/part-<first _id>.jsonl.gz
+
+Every file holds one batch in MongoDB Extended JSON, so ObjectIds and dates survive the round
+trip. The documents are streamed from the cursor into the file, keeping only their `_id`s, as the
+image payloads make a batch far too large to hold in memory. A batch is only deleted once its file
+is completely written, so an interrupted run leaves documents at most in both places. Restoring
+skips documents that are already in the collection.
+"""
+
+import asyncio
+import gzip
+import os
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from pathlib import Path
+from typing import IO, Any
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+from structlog.stdlib import get_logger
+
+from exp_coord.core.config import get_settings
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+
+logger = get_logger(__name__)
+
+_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+_DUPLICATE_KEY = 11000
+
+
+@dataclass
+class ArchiveResult:
+    """What an archive run moved out of the collection."""
+
+    archived: int = 0
+    files: list[Path] = field(default_factory=list)
+
+
+class _ArchiveFile:
+    """An archive file being written, holding the `_id`s of the documents written to it.
+
+    The documents are written as they are received, so only one of them is held in memory. The
+    serialization, compression and writes run in a thread, to keep the event loop responsive.
+    """
+
+    def __init__(self, directory: Path, day: date, first_id: Any, compression: str) -> None:
+        self.day = day
+        self.compression = compression
+        self.path = directory / day.isoformat() / f"part-{first_id}{_SUFFIXES[compression]}"
+        # Written under a temporary name first, so a file in the archive is always complete
+        self.partial = self.path.with_name(self.path.name + ".partial")
+        self.ids: list[Any] = []
+        self._file: IO[str] | None = None
+
+    async def write(self, document: dict[str, Any]) -> None:
+        if self._file is None:
+            self._file = await asyncio.to_thread(self._open)
+        await asyncio.to_thread(self._file.write, json_util.dumps(document) + "\n")
+        self.ids.append(document["_id"])
+
+    async def close(self) -> None:
+        """Close the file and give it its final name."""
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            await asyncio.to_thread(os.replace, self.partial, self.path)
+
+    async def abort(self) -> None:
+        """Close and delete the incomplete file. Its documents are still in the collection."""
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self.partial.unlink(missing_ok=True)
+
+    def _open(self) -> IO[str]:
+        self.partial.parent.mkdir(parents=True, exist_ok=True)
+        return _open(self.partial, "w", self.compression)
+
+
+async def archive_messages_and_events(before: datetime | None = None) -> ArchiveResult:
+    """Move the raw messages and events added before a time to the archive, in batches.
+
+    Args:
+        before: Archive documents with an earlier `added_at`. Defaults to
+            `mongodb.retention.hot_days` ago.
+    """
+    settings = get_settings().mongodb.retention
+    if before is None:
+        before = datetime.now(UTC) - timedelta(days=settings.hot_days)
+    collection = AllMessagesAndEvents.get_motor_collection()
+    directory = settings.archive_dir / collection.name
+    result = ArchiveResult()
+
+    cursor = (
+        collection.find({"added_at": {"$lt": before}})
+        .sort("added_at", ASCENDING)
+        .batch_size(settings.batch_size)
+    )
+    archive: _ArchiveFile | None = None
+    try:
+        async for document in cursor:
+            day = document["added_at"].date()
+            # A file only holds the documents of a single day
+            if archive is not None and (
+                len(archive.ids) >= settings.batch_size or day != archive.day
+            ):
+                await _finish(archive, collection, result)
+                archive = None
+            if archive is None:
+                archive = _ArchiveFile(directory, day, document["_id"], settings.compression)
+            await archive.write(document)
+    except BaseException:
+        if archive is not None:
+            await archive.abort()
+        raise
+    if archive is not None:
+        await _finish(archive, collection, result)
+
+    logger.info(
+        f"Archived {result.archived} messages and events to {len(result.files)} files",
+        before=before,
+    )
+    return result
+
+
+async def _finish(
+    archive: _ArchiveFile, collection: AsyncIOMotorCollection, result: ArchiveResult
+) -> None:
+    """Complete the file, and only then delete its documents from the collection."""
+    await archive.close()
+    await collection.delete_many({"_id": {"$in": archive.ids}})
+    result.archived += len(archive.ids)
+    result.files.append(archive.path)
+    logger.debug(f"Archived {len(archive.ids)} messages and events", path=str(archive.path))
+
+
+async def restore_messages_and_events(start: date, end: date) -> int:
+    """Insert the archived raw messages and events added from `start` to `end`, both inclusive.
+
+    The archive files are kept. Documents that are already in the collection are skipped, so a
+    range can be restored more than once. The files are read in chunks of
+    `mongodb.retention.batch_size` documents.
+
+    Returns:
+        The number of documents inserted.
+    """
+    settings = get_settings().mongodb.retention
+    collection = AllMessagesAndEvents.get_motor_collection()
+    directory = settings.archive_dir / collection.name
+    restored = 0
+
+    for day_directory in sorted(directory.glob("????-??-??")):
+        if not start <= date.fromisoformat(day_directory.name) <= end:
+            continue
+        for path in sorted(day_directory.glob("part-*.jsonl.*")):
+            compression = next(c for c, suffix in _SUFFIXES.items() if path.name.endswith(suffix))
+            f = await asyncio.to_thread(_open, path, "r", compression)
+            try:
+                while documents := await asyncio.to_thread(_read, f, settings.batch_size):
+                    restored += await _insert_missing(collection, documents)
+            finally:
+                await asyncio.to_thread(f.close)
+            logger.debug(f"Restored {path}")
+
+    logger.info(f"Restored {restored} messages and events", start=start, end=end)
+    return restored
+
+
+def _read(f: IO[str], limit: int) -> list[dict[str, Any]]:
+    """Decode up to `limit` documents from the next lines. Blocking, run it in a thread."""
+    documents = []
+    for line in f:
+        if line.strip():
+            documents.append(json_util.loads(line))
+            if len(documents) >= limit:
+                break
+    return documents
+
+
+async def _insert_missing(
+    collection: AsyncIOMotorCollection, documents: list[dict[str, Any]]
+) -> int:
+    if not documents:
+        return 0
+    try:
+        result = await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        if any(error["code"] != _DUPLICATE_KEY for error in exc.details["writeErrors"]):
+            raise
+        return exc.details["nInserted"]
+    return len(result.inserted_ids)
+
+
+def _open(path: Path, mode: str, compression: str) -> IO[str]:
+    if compression == "gzip":
+        return gzip.open(path, f"{mode}t", encoding="utf-8")
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImportError(
+            "zstd compression requires the zstandard package, install it with "
+            "`pip install zstandard`"
+        ) from exc
+    return zstandard.open(path, f"{mode}t", encoding="utf-8")
@@ -0,0 +1,271 @@
+"""Hourly counts of the raw messages and events, kept up to date while they are ingested.
+
+Counting over `all_messages_and_events` gets slower the more it holds, and archived documents
+can't be counted at all. The rollups hold one document per hour and combination of message
+type, topic and sender, and per hour, device and status, so reading them takes about the same
+time however large the raw log is.
+
+The save-all handler adds every inserted message and event to a `RollupCounter`, which writes
+the counts with `$inc` upserts when the handler is flushed. `rebuild_rollups` recomputes them
+from the raw log, e.g. after they were introduced or if an ingestion failed between inserting the
+raw documents and updating the rollups.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Any, Iterable, Literal, Mapping
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from structlog.stdlib import get_logger
+
+from exp_coord.core.config import get_settings
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.queries import TimeWindow
+from exp_coord.services.s3i.broker.models import S3IEvent
+
+logger = get_logger(__name__)
+
+MessageCountKey = Literal["message_type", "topic", "sender"]
+StatusCountKey = Literal["device_s3i_id", "status"]
+
+
+class HourlyMessageCount(Document):
+    """The number of raw messages and events added in an hour, per type, topic and sender."""
+
+    hour: datetime
+    message_type: str
+    # Empty for messages, which have no topic
+    topic: str = ""
+    sender: str
+    total: int = 0
+
+    class Settings:
+        name = get_settings().mongodb.collection_names.message_rollup
+        indexes = [  # noqa: RUF012
+            IndexModel(
+                [
+                    ("hour", ASCENDING),
+                    ("message_type", ASCENDING),
+                    ("topic", ASCENDING),
+                    ("sender", ASCENDING),
+                ],
+                name="hour_key_unique",
+                unique=True,
+            ),
+        ]
+
+
+class HourlyStatusCount(Document):
+    """The number of status events of a device added in an hour, per status."""
+
+    hour: datetime
+    device_s3i_id: str
+    status: str
+    total: int = 0
+
+    class Settings:
+        name = get_settings().mongodb.collection_names.status_rollup
+        indexes = [  # noqa: RUF012
+            IndexModel(
+                [("hour", ASCENDING), ("device_s3i_id", ASCENDING), ("status", ASCENDING)],
+                name="hour_key_unique",
+                unique=True,
+            ),
+        ]
+
+
+def _hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _status_of(document: AllMessagesAndEvents) -> str | None:
+    """Get the status of a status event, None for anything else."""
+    event = document.data
+    if not isinstance(event, S3IEvent) or event.topic != get_settings().s3i.topics.status:
+        return None
+    status = event.content.get("status") if isinstance(event.content, dict) else None
+    return status if isinstance(status, str) else None
+
+
+class RollupCounter:
+    """Count raw messages and events in memory and add the counts to the rollups on flush.
+
+    Example:
+        ```python
+        counter = RollupCounter()
+        counter.add(documents)  # After they were inserted
+        await counter.flush()
+        ```
+    """
+
+    def __init__(self) -> None:
+        self._messages: Counter[tuple[datetime, str, str, str]] = Counter()
+        self._statuses: Counter[tuple[datetime, str, str]] = Counter()
+
+    def add(self, documents: Iterable[AllMessagesAndEvents]) -> None:
+        """Count the documents. Only pass documents that were inserted, to count each once."""
+        for document in documents:
+            data, hour = document.data, _hour(document.added_at)
+            topic = data.topic if isinstance(data, S3IEvent) else ""
+            self._messages[hour, data.messageType, topic, data.sender] += 1
+            status = _status_of(document)
+            if status is not None:
+                self._statuses[hour, data.sender, status] += 1
+
+    async def flush(self) -> None:
+        """Add the counts to the rollups with one unordered bulk write per collection.
+
+        The counts are reset before writing, so they are lost if the write fails. Rebuild the
+        rollups in that case.
+        """
+        messages, self._messages = self._messages, Counter()
+        statuses, self._statuses = self._statuses, Counter()
+        if messages:
+            await HourlyMessageCount.get_motor_collection().bulk_write(
+                [
+                    _increment(
+                        {"hour": hour, "message_type": type_, "topic": topic, "sender": sender},
+                        total,
+                    )
+                    for (hour, type_, topic, sender), total in messages.items()
+                ],
+                ordered=False,
+            )
+        if statuses:
+            await HourlyStatusCount.get_motor_collection().bulk_write(
+                [
+                    _increment({"hour": hour, "device_s3i_id": sender, "status": status}, total)
+                    for (hour, sender, status), total in statuses.items()
+                ],
+                ordered=False,
+            )
+
+
+def _increment(key: dict[str, Any], total: int) -> UpdateOne:
+    return UpdateOne(key, {"$inc": {"total": total}}, upsert=True)
+
+
+async def rebuild_rollups(since: datetime | None = None) -> dict[str, int]:
+    """Recompute the rollups from the raw messages and events added since an hour.
+
+    Rollups of earlier hours are kept, so counts of archived messages and events are not lost.
+    Increments by a running ingestion while rebuilding can be lost, so stop it for exact counts.
+
+    Args:
+        since: The first hour to recompute, truncated to the hour. Defaults to the hour of the
+            oldest raw message or event.
+
+    Returns:
+        The number of rollup documents written per collection.
+    """
+    raw = AllMessagesAndEvents.get_motor_collection()
+    if since is None:
+        oldest = await raw.find({}, {"added_at": 1}).sort("added_at", ASCENDING).to_list(1)
+        if not oldest:
+            return {}
+        since = oldest[0]["added_at"]
+    since = _hour(since)
+    hour = {"$dateTrunc": {"date": "$added_at", "unit": "hour"}}
+
+    message_counts = raw.aggregate(
+        [
+            {"$match": {"added_at": {"$gte": since}}},
+            {
+                "$group": {
+                    "_id": {
+                        "hour": hour,
+                        "message_type": "$data.messageType",
+                        "topic": {"$ifNull": ["$data.topic", ""]},
+                        "sender": "$data.sender",
+                    },
+                    "total": {"$sum": 1},
+                }
+            },
+        ],
+        allowDiskUse=True,
+    )
+    status_counts = raw.aggregate(
+        [
+            {
+                "$match": {
+                    "added_at": {"$gte": since},
+                    "data.topic": get_settings().s3i.topics.status,
+                    "data.content.status": {"$type": "string"},
+                }
+            },
+            {
+                "$group": {
+                    "_id": {
+                        "hour": hour,
+                        "device_s3i_id": "$data.sender",
+                        "status": "$data.content.status",
+                    },
+                    "total": {"$sum": 1},
+                }
+            },
+        ],
+        allowDiskUse=True,
+    )
+
+    written = {}
+    for document_type, counts in (
+        (HourlyMessageCount, message_counts),
+        (HourlyStatusCount, status_counts),
+    ):
+        collection = document_type.get_motor_collection()
+        await collection.delete_many({"hour": {"$gte": since}})
+        # Set instead of inserted, as a running ingestion may have created the documents again
+        updates = [
+            UpdateOne(result["_id"], {"$set": {"total": result["total"]}}, upsert=True)
+            async for result in counts
+        ]
+        if updates:
+            await collection.bulk_write(updates, ordered=False)
+        written[collection.name] = len(updates)
+        logger.info(f"Rebuilt {len(updates)} rollups", collection=collection.name, since=since)
+    return written
+
+
+async def count_messages_by(
+    key: MessageCountKey,
+    window: TimeWindow | None = None,
+    *,
+    match: Mapping[str, Any] | None = None,
+) -> dict[str, int]:
+    """Count the raw messages and events per message type, topic or sender from the rollups.
+
+    Args:
+        key: What to count by.
+        window: Only count hours starting in the window. All hours if None.
+        match: Further conditions on the rollup fields, e.g. `{"message_type": "eventMessage"}`.
+    """
+    return await _total_by(HourlyMessageCount, key, window, match)
+
+
+async def count_statuses_by(
+    key: StatusCountKey,
+    window: TimeWindow | None = None,
+    *,
+    match: Mapping[str, Any] | None = None,
+) -> dict[str, int]:
+    """Count the status events per device or status from the rollups, see `count_messages_by`."""
+    return await _total_by(HourlyStatusCount, key, window, match)
+
+
+async def _total_by(
+    document_type: type[Document],
+    key: str,
+    window: TimeWindow | None,
+    match: Mapping[str, Any] | None,
+) -> dict[str, int]:
+    query = {**(window.match("hour") if window is not None else {}), **(match or {})}
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": f"${key}", "total": {"$sum": "$total"}}},
+        {"$sort": {"total": -1}},
+    ]
+    return {
+        result["_id"]: result["total"]
+        async for result in document_type.get_motor_collection().aggregate(pipeline)
+    }
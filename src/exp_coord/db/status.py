@@ -1,16 +1,32 @@
 from datetime import datetime
+from typing import Any
 
-from beanie import Document, Link
-from pydantic import Field
+from beanie import Document, Granularity, Link, PydanticObjectId, TimeSeriesConfig
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from structlog.stdlib import get_logger
 
 from exp_coord.core.config import get_settings
-from exp_coord.db.device import Device
+from exp_coord.db.device import Device, DeviceSnapshot
+
+logger = get_logger(__name__)
+
+_time_series = get_settings().mongodb.status_time_series
 
 
 class Status(Document):
-    """A status of a device at a certain time."""
+    """A status of a device at a certain time.
+
+    If `mongodb.status_time_series.enabled` is set, statuses are stored in a time-series
+    collection with the device as metaField and `sent_timestamp` as timeField. MongoDB then
+    stores the statuses of a device in buckets per time span, which takes less space and lets
+    queries by device and time range skip whole buckets. Beanie creates the collection on
+    startup, `migrate_statuses_to_time_series` copies existing statuses over.
+    """
 
     device: Link[Device]
+    # None for statuses stored before snapshots were introduced, until they are backfilled
+    device_snapshot: DeviceSnapshot | None = None
 
     status: str
     detail: str = Field(default="")
@@ -20,7 +36,153 @@ class Status(Document):
 
     sent_timestamp: datetime
     received_timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # The identifier of the status event, unique so redeliveries are only stored once. Time-series
+    # collections don't support unique indexes, there only the handler's recent IDs are checked.
+    identifier: str | None = None
 
     class Settings:
-        name = get_settings().mongodb.collection_names.status
+        name = (
+            _time_series.collection
+            if _time_series.enabled
+            else get_settings().mongodb.collection_names.status
+        )
         validate_on_save = True
+        timeseries = (
+            TimeSeriesConfig(
+                time_field="sent_timestamp",
+                meta_field="device",
+                granularity=Granularity(_time_series.granularity),
+                expire_after_seconds=_time_series.expire_after_seconds,
+            )
+            if _time_series.enabled
+            else None
+        )
+        # Links are stored as DBRefs, so the device is indexed by the $id of the reference
+        indexes = (
+            [
+                IndexModel(
+                    [("device.$id", ASCENDING), ("sent_timestamp", DESCENDING)],
+                    name="device_sent_timestamp",
+                ),
+            ]
+            if _time_series.enabled
+            else [
+                IndexModel(
+                    [("device.$id", ASCENDING), ("received_timestamp", DESCENDING)],
+                    name="device_received_timestamp",
+                ),
+                IndexModel([("received_timestamp", DESCENDING)], name="received_timestamp"),
+                IndexModel(
+                    [("identifier", ASCENDING)],
+                    name="identifier_unique",
+                    unique=True,
+                    partialFilterExpression={"identifier": {"$type": "string"}},
+                ),
+            ]
+        )
+
+
+class StatusTimelineEntry(BaseModel):
+    """A status of a device, without the fields a timeline doesn't need."""
+
+    status: str
+    detail: str = ""
+    sent_timestamp: datetime
+
+
+async def get_status_timeline(
+    device_id: PydanticObjectId, start: datetime, end: datetime, status: str | None = None
+) -> list[StatusTimelineEntry]:
+    """Get the statuses a device sent in [start, end), ordered by the time they were sent.
+
+    The filter only uses the device and sent_timestamp, the metaField and timeField of the
+    time-series collection, so MongoDB selects the buckets by their device and time bounds
+    before unpacking any status. It works on a regular collection as well.
+
+    Args:
+        device_id: The ID of the device document.
+        start: The earliest sent_timestamp, inclusive.
+        end: The latest sent_timestamp, exclusive.
+        status: Only get statuses with this value, e.g. "fetch".
+    """
+    query: dict[str, Any] = {"device.$id": device_id, "sent_timestamp": {"$gte": start, "$lt": end}}
+    if status is not None:
+        query["status"] = status
+    return (
+        await Status.find(query)
+        .sort(("sent_timestamp", ASCENDING))
+        .project(StatusTimelineEntry)
+        .to_list()
+    )
+
+
+_MIGRATION_ID = "statuses_to_time_series"
+
+
+async def migrate_statuses_to_time_series(batch_size: int = 1000) -> int:
+    """Copy the statuses of the regular collection into the time-series collection.
+
+    The statuses are streamed in batches of `batch_size` in the order of their IDs, without
+    validating them. After every batch, the highest copied ID is saved in the migrations
+    collection, and an interrupted migration resumes after it. Statuses stored in the time-series
+    collection by a running ingestion don't affect where it resumes. The regular collection is
+    left as it is.
+
+    Returns:
+        The number of statuses copied.
+
+    Raises:
+        RuntimeError: If the time-series collection is not enabled in the settings.
+    """
+    if Status.Settings.timeseries is None:
+        raise RuntimeError("Enable mongodb.status_time_series to migrate the statuses")
+
+    collection_names = get_settings().mongodb.collection_names
+    target = Status.get_motor_collection()
+    source = target.database[collection_names.status]
+    migrations = target.database[collection_names.migrations]
+
+    progress = await migrations.find_one({"_id": _MIGRATION_ID})
+    last_id = progress["last_id"] if progress is not None else None
+    query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+    if last_id is not None:
+        logger.info("Resuming the migration", after_id=str(last_id))
+
+    copied = 0
+    # A batch may have been inserted before the migration was interrupted, without saving its
+    # last ID. Time-series collections don't reject duplicate IDs, so the first batch is checked.
+    check_existing = last_id is not None
+
+    async def copy(batch: list[dict[str, Any]]) -> None:
+        nonlocal copied, check_existing
+        if check_existing:
+            existing = {
+                document["_id"]
+                async for document in target.find(
+                    {"_id": {"$in": [document["_id"] for document in batch]}}, {"_id": 1}
+                )
+            }
+            check_existing = False
+            new = [document for document in batch if document["_id"] not in existing]
+        else:
+            new = batch
+        if new:
+            # Ordered, so the saved ID is only moved past completely copied batches
+            await target.insert_many(new, ordered=True)
+        await migrations.update_one(
+            {"_id": _MIGRATION_ID}, {"$set": {"last_id": batch[-1]["_id"]}}, upsert=True
+        )
+        copied += len(new)
+
+    batch = []
+    async for document in source.find(query).sort("_id", ASCENDING).batch_size(batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            await copy(batch)
+            batch = []
+            logger.info(f"Copied {copied} statuses")
+    if batch:
+        await copy(batch)
+
+    logger.info(f"Migrated {copied} statuses to {target.name}")
+    return copied
@@ -1,21 +1,52 @@
 """Implements the handler for a new image event."""
 
+import base64
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Literal
 
 from beanie import PydanticObjectId
 from pydantic import Base64UrlBytes, BaseModel, Field, computed_field
+from pymongo.errors import DuplicateKeyError
+from structlog.stdlib import get_logger
 
 from exp_coord.core.config import get_settings
-from exp_coord.db.device import get_device_by_s3i_id
-from exp_coord.db.gridfs import ImageFileMetadata, upload_to_gridfs
+from exp_coord.core.utils import RecentIds
+from exp_coord.db.device import DeviceSnapshot, get_device_by_s3i_id
+from exp_coord.db.gridfs import ImageFileMetadata, delete_from_gridfs, upload_to_gridfs
 from exp_coord.db.image import Image
 from exp_coord.services.s3i import EventHandler, S3IEvent
 
+logger = get_logger(__name__)
 
-def is_new_image_event(event: S3IEvent) -> bool:
-    """Check if the event is a new image event."""
-    return event.topic == get_settings().s3i.topics.new_image
+_recent = RecentIds(get_settings().processing.recent_ids)
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    """An image uploaded to GridFS by this handler, which the raw event log can reference."""
+
+    file_id: PydanticObjectId
+    sha256: str
+    size: int
+
+
+# The images stored for recently handled events, by identifier. The save-all handler, which runs
+# after this one, takes them to replace the payload by a reference.
+_stored_images: OrderedDict[str, StoredImage] = OrderedDict()
+
+
+def pop_stored_image(identifier: str) -> StoredImage | None:
+    """Take the image stored for the event, None if this handler didn't confirm storing it."""
+    return _stored_images.pop(identifier, None)
+
+
+def _remember_stored_image(event: S3IEvent, stored: StoredImage) -> None:
+    _stored_images[event.identifier] = stored
+    while len(_stored_images) > get_settings().processing.recent_ids:
+        _stored_images.popitem(last=False)
 
 
 class NewImageEventContent(BaseModel):
@@ -36,34 +67,74 @@ async def handle_new_image_event(event: S3IEvent) -> None:
     """Handle a new image event.
 
     For that, we need to:
+    - Skip the event if its image was stored before, first by the recently handled identifiers and
+      then by querying the image records, before uploading anything. The query also covers
+      redeliveries after a restart, when the recent identifiers are empty.
     - Validate the event content.
-    - Save the image data to GridFS.
     - Get the device that sent the event to later include it in the image record.
-    - Create a new image record in the database.
+    - Save the image data to GridFS, referencing the pre-allocated ID of the image record.
+    - Create the image record in the database with a single insert. If a record for the event was
+      inserted concurrently, the unique identifier index rejects it and the file is deleted again.
+    - Remember the stored file, so the save-all handler can reference it instead of the payload.
+      Only images whose payload can be restored byte for byte are remembered.
     """
+    if event.identifier in _recent or await Image.find_one(Image.identifier == event.identifier):
+        logger.debug("Skipping new image event stored before", identifier=event.identifier)
+        _recent.add(event.identifier)
+        return
+
     content = NewImageEventContent.model_validate(event.content)
     device = await get_device_by_s3i_id(event.sender)
-    image = Image(
-        device=device,  # pyright: ignore[reportArgumentType]
-        taken_at=datetime.fromtimestamp(content.taken_at),
-        file_id=None,
+    taken_at = datetime.fromtimestamp(content.taken_at)
+
+    image_id = PydanticObjectId()
+    sha256 = hashlib.sha256(content.image).hexdigest()
+    snapshot = DeviceSnapshot.from_device(device)
+    metadata = ImageFileMetadata(
+        from_id=image_id,
+        device_id=device.id,
+        taken_at=taken_at,
+        sha256=sha256,
+        identifier=event.identifier,
+        device_snapshot=snapshot,
     )
-    await image.insert()
-    assert image.id is not None, "Image ID is set after insertion."
-    filename = await image.get_filename()
-    metadata = ImageFileMetadata(from_id=image.id)
     file_id = await upload_to_gridfs(
-        filename,
+        Image.build_filename(device.s3i_id, taken_at),
         content.image,
         metadata,
         bucket_name=get_settings().mongodb.collection_names.image_gridfs,
     )
-    image.file_id = PydanticObjectId(file_id)
-    await image.save()
+    image = Image(
+        id=image_id,
+        device=device,  # pyright: ignore[reportArgumentType]
+        device_snapshot=snapshot,
+        taken_at=taken_at,
+        file_id=PydanticObjectId(file_id),
+        identifier=event.identifier,
+    )
+    try:
+        await image.insert()
+    except DuplicateKeyError:
+        logger.info("New image event was stored concurrently", identifier=event.identifier)
+        await delete_from_gridfs(
+            file_id, bucket_name=get_settings().mongodb.collection_names.image_gridfs
+        )
+        _recent.add(event.identifier)
+        return
+    _recent.add(event.identifier)
+
+    # Payloads the decoder accepts but that aren't encoded canonically, e.g. with the standard
+    # alphabet, couldn't be restored from the file, so they stay inline
+    payload = event.content.get("image") if isinstance(event.content, dict) else None
+    if payload == base64.urlsafe_b64encode(content.image).decode():
+        _remember_stored_image(
+            event, StoredImage(PydanticObjectId(file_id), sha256, len(content.image))
+        )
 
 
 NewImageHandler = EventHandler(
     name="new_image",
-    predicate=is_new_image_event,
+    predicate=None,
     handle=handle_new_image_event,
+    topic=get_settings().s3i.topics.new_image,
 )
@@ -1,22 +1,137 @@
 """A handler to just save every message and event to MongoDB."""
 
+import base64
+import hashlib
+from typing import Literal
+
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+from exp_coord.core.config import get_settings
+from exp_coord.core.utils import RecentIds
 from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.batch import BatchWriter
+from exp_coord.db.connection import create_grid_fs_client
+from exp_coord.db.rollups import RollupCounter
+from exp_coord.handlers.new_image import NewImageHandler, StoredImage, pop_stored_image
 from exp_coord.services.s3i import EventHandler, MessageHandler, S3IEvent, S3IMessage
 
+# Shared by events and messages, as they end up in the same collection
+_recent = RecentIds(get_settings().processing.recent_ids)
+
+
+class ImagePayloadReference(BaseModel):
+    """Stored instead of the base64 image of a new image event, which is kept in GridFS anyway.
+
+    Only written once the new image handler confirmed storing the file. The hash tells whether the
+    file still holds the same image.
+    """
+
+    ref: Literal["gridfs"] = "gridfs"
+    bucket: str
+    file_id: PydanticObjectId
+    sha256: str
+    size: int
+
+    async def download(self) -> bytes:
+        """Get the referenced image from GridFS.
+
+        Raises:
+            gridfs.errors.NoFile: If the file doesn't exist.
+            ValueError: If the file doesn't hold the referenced image.
+        """
+        stream = await create_grid_fs_client(self.bucket).open_download_stream(self.file_id)
+        data = await stream.read()
+        if hashlib.sha256(data).hexdigest() != self.sha256:
+            raise ValueError(f"{self.file_id} in {self.bucket} doesn't hold the referenced image")
+        return data
+
+    async def resolve(self) -> str:
+        """Get the referenced image, encoded exactly like in the original event."""
+        return base64.urlsafe_b64encode(await self.download()).decode()
+
+
+def reference_image_payload(
+    event: S3IEvent | S3IMessage, stored: StoredImage | None
+) -> S3IEvent | S3IMessage:
+    """Replace the image of a new image event by a reference to the GridFS file holding it.
+
+    `stored` is the image the new image handler stored for the event. Without it, e.g. because the
+    sender is unknown, the upload failed or the image was stored before, the event is returned as
+    it is, so the raw event log keeps the only copy of the image. The event itself is not changed,
+    as other handlers still process it.
+    """
+    settings = get_settings()
+    if (
+        stored is None
+        or settings.mongodb.inline_image_payloads
+        or not isinstance(event, S3IEvent)
+        or not isinstance(event.content, dict)
+    ):
+        return event
+
+    reference = ImagePayloadReference(
+        bucket=settings.mongodb.collection_names.image_gridfs,
+        file_id=stored.file_id,
+        sha256=stored.sha256,
+        size=stored.size,
+    )
+    return event.model_copy(update={"content": {**event.content, "image": reference.model_dump()}})
+
+
+class _Saver:
+    """Buffers the messages or the events, so each handler only flushes and reports its own."""
+
+    def __init__(self) -> None:
+        # Only counts inserted documents, so skipped redeliveries are not counted twice
+        self.rollups = RollupCounter()
+        self.writer = BatchWriter.from_settings(
+            AllMessagesAndEvents,
+            ignore_duplicates=True,
+            on_written=lambda documents: _recent.update(doc.identifier for doc in documents),
+            on_inserted=self.rollups.add,
+        )
+
+    async def save(self, event: S3IEvent | S3IMessage) -> None:
+        """Save the event to MongoDB. The insert is batched and reported when flushing the handler.
+
+        Events stored before are skipped, by their identifier. Runs after the new image handler, to
+        reference the images it stored.
+        """
+        # Taken first, so it isn't left behind for events that are skipped
+        stored = pop_stored_image(event.identifier)
+        if event.identifier in _recent:
+            return
+        self.writer.add(
+            AllMessagesAndEvents(
+                data=reference_image_payload(event, stored), identifier=event.identifier
+            )
+        )
+
+    async def flush(self) -> None:
+        """Write the buffered messages or events, then add the inserted ones to the rollups."""
+        try:
+            await self.writer.flush()
+        finally:
+            # Also after failed inserts, the others were inserted
+            await self.rollups.flush()
 
-async def save_event_or_message(event: S3IEvent | S3IMessage) -> None:
-    """Save the event to MongoDB."""
-    await AllMessagesAndEvents(data=event).insert()
 
+_event_saver = _Saver()
+_message_saver = _Saver()
 
+# Without a topic, message type or predicate, the handlers are selected for everything
 SaveAllEventsHandler = EventHandler(
     name="save_all",
-    predicate=lambda event: True,
-    handle=save_event_or_message,
+    predicate=None,
+    handle=_event_saver.save,
+    after=[NewImageHandler.name],
+    flush=_event_saver.flush,
 )
 
 SaveAllMessagesHandler = MessageHandler(
     name="save_all",
-    predicate=lambda message: True,
-    handle=save_event_or_message,
+    predicate=None,
+    handle=_message_saver.save,
+    flush=_message_saver.flush,
 )
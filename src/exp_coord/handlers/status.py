@@ -7,16 +7,20 @@ from pydantic import BaseModel
 from structlog.stdlib import get_logger
 
 from exp_coord.core.config import get_settings
-from exp_coord.db.device import get_device_by_s3i_id
+from exp_coord.core.utils import RecentIds
+from exp_coord.db.batch import BatchWriter
+from exp_coord.db.device import DeviceSnapshot, get_device_by_s3i_id
 from exp_coord.db.status import Status
 from exp_coord.services.s3i import EventHandler, S3IEvent
 
 logger = get_logger(__name__)
 
-
-def is_status_event(event: S3IEvent) -> bool:
-    """Check if the event is a status event."""
-    return event.topic == get_settings().s3i.topics.status
+_recent = RecentIds(get_settings().processing.recent_ids)
+_writer = BatchWriter.from_settings(
+    Status,
+    ignore_duplicates=True,
+    on_written=lambda statuses: _recent.update(status.identifier for status in statuses),
+)
 
 
 class StatusEventContent(BaseModel):
@@ -31,23 +35,30 @@ class StatusEventContent(BaseModel):
 
 
 async def handle_status_event(event: S3IEvent) -> None:
-    """Handle a status event."""
+    """Handle a status event, skipping it if it was stored before."""
+    if event.identifier in _recent:
+        logger.debug("Skipping status event stored before", identifier=event.identifier)
+        return
     content = StatusEventContent.model_validate(event.content)
     device = await get_device_by_s3i_id(event.sender)
     status = Status(
         device=device,  # pyright: ignore[reportArgumentType]
+        device_snapshot=DeviceSnapshot.from_device(device),
         status=content.status,
         status_error_detail=content.status_error_detail,
         status_error_source=content.status_error_source,
         status_error_text=content.status_error_text,
         sent_timestamp=datetime.fromtimestamp(event.timestamp),
+        identifier=event.identifier,
     )
-    await status.insert()
-    logger.info("Status event saved", content=status)
+    _writer.add(status)
+    logger.info("Status event queued for saving", content=status)
 
 
 StatusHandler = EventHandler(
     name="status",
-    predicate=is_status_event,
+    predicate=None,
     handle=handle_status_event,
+    topic=get_settings().s3i.topics.status,
+    flush=_writer.flush,
 )
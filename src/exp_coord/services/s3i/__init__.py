@@ -1,11 +1,13 @@
 from typing import TypeAlias
 
 from .base import Handler as Handler
+from .base import HTTPPool as HTTPPool
 from .base import Processor as Processor
 from .base import S3IError as S3IError
 from .broker import S3IBrokerClient as S3IBrokerClient
 from .broker import S3IEvent as S3IEvent
 from .broker import S3IMessage as S3IMessage
+from .broker import S3IMessageOrEvent as S3IMessageOrEvent
 
 EventHandler: TypeAlias = Handler[S3IEvent]
 EventProcessor: TypeAlias = Processor[S3IEvent]
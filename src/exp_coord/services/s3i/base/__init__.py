@@ -1,3 +1,5 @@
 from .error import S3IError as S3IError
 from .processor import Handler as Handler
 from .processor import Processor as Processor
+from .transport import HTTPPool as HTTPPool
+from .transport import HTTPPoolStats as HTTPPoolStats
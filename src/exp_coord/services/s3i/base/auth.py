@@ -1,4 +1,5 @@
 import asyncio
+import contextlib
 import typing
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
@@ -6,6 +7,8 @@ from datetime import datetime, timedelta, timezone
 import httpx
 from structlog.stdlib import get_logger
 
+from exp_coord.core.metrics import TOKEN_REFRESHES
+
 logger = get_logger(__name__)
 
 
@@ -27,6 +30,8 @@ class KeycloakAuth(httpx.Auth):
         username: str | None = None,
         password: str | None = None,
         token_refresh_margin: timedelta = timedelta(minutes=1),
+        background_refresh: bool = True,
+        refresh_retry_delay: timedelta = timedelta(seconds=5),
     ) -> None:
         self._token_url = f"{keycloak_url.rstrip('/')}/realms/{realm}/protocol/openid-connect/token"
         self._client_id = client_id
@@ -37,6 +42,10 @@ class KeycloakAuth(httpx.Auth):
         self._token_refresh_margin = token_refresh_margin
         self._token_data: TokenData | None = None
         self._lock = asyncio.Lock()
+        self._background_refresh = background_refresh
+        self._refresh_retry_delay = refresh_retry_delay
+        self._refresh_task: asyncio.Task[None] | None = None
+        self.refresh_count = 0
 
     @property
     def is_person(self):
@@ -97,24 +106,72 @@ class KeycloakAuth(httpx.Auth):
         return datetime.now(timezone.utc) + self._token_refresh_margin < token.expires_at
 
     async def get_valid_token(self) -> str:
-        """Get a valid access token, refreshing if necessary."""
+        """Get a valid access token, refreshing if necessary.
+
+        A still valid token is returned without taking the lock, so concurrent requests don't
+        serialize here. Only when the token has to be replaced, the callers wait for the single
+        refresh in progress.
+        """
+        token_data = self._token_data
+        if token_data is not None and self._is_token_valid(token_data):
+            return token_data.access_token
+
         async with self._lock:
+            # Another caller may have refreshed the token while we were waiting for the lock
             if not self._token_data or not self._is_token_valid(self._token_data):
                 logger.debug("Current token is invalid or expired.")
-                try:
-                    if self._token_data and self._token_data.refresh_token:
-                        self._token_data = await self._refresh_auth_token(
-                            self._token_data.refresh_token
-                        )
-                    else:
-                        self._token_data = await self._get_new_token()
-                except httpx.HTTPError:
-                    # If refresh fails, try getting a new token
-                    self._token_data = await self._get_new_token()
-
-            logger.info("Got a valid token.")
+                await self._replace_token()
+            self._ensure_background_refresh()
             return self._token_data.access_token
 
+    async def _replace_token(self) -> None:
+        """Refresh the token, or get a new one if that's not possible. Must hold the lock."""
+        grant = "new"
+        try:
+            if self._token_data and self._token_data.refresh_token:
+                self._token_data = await self._refresh_auth_token(self._token_data.refresh_token)
+                grant = "refresh_token"
+            else:
+                self._token_data = await self._get_new_token()
+        except httpx.HTTPError:
+            # If refresh fails, try getting a new token
+            self._token_data = await self._get_new_token()
+        self.refresh_count += 1
+        TOKEN_REFRESHES.labels(grant=grant).inc()
+
+    def _ensure_background_refresh(self) -> None:
+        if self._background_refresh and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(
+                self._refresh_in_background(), name="keycloak-token-refresh"
+            )
+
+    async def _refresh_in_background(self) -> None:
+        """Replace the token a refresh margin before requests would have to do it themselves."""
+        while True:
+            token_data = self._token_data
+            if token_data is None:  # pragma: no cover
+                return
+            refresh_at = token_data.expires_at - 2 * self._token_refresh_margin
+            delay = (refresh_at - datetime.now(timezone.utc)).total_seconds()
+            # Tokens living shorter than the margins, and failed refreshes, don't make this spin
+            await asyncio.sleep(max(delay, self._refresh_retry_delay.total_seconds()))
+
+            try:
+                async with self._lock:
+                    if self._token_data is token_data:  # Not replaced by a request in the meantime
+                        await self._replace_token()
+            except httpx.HTTPError:
+                # Requests fall back to refreshing themselves once the token is no longer valid
+                logger.warning("Failed to refresh the token in the background", exc_info=True)
+
+    async def aclose(self) -> None:
+        """Stop refreshing the token in the background."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+
     async def async_auth_flow(
         self, request: httpx.Request
     ) -> typing.AsyncGenerator[httpx.Request, httpx.Response]:
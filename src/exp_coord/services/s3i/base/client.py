@@ -1,4 +1,5 @@
-from typing import Any, AsyncIterable, Iterable
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Iterable
 
 import httpx
 from structlog.stdlib import get_logger
@@ -6,6 +7,7 @@ from structlog.stdlib import get_logger
 from exp_coord.core.config import S3ISettings
 from exp_coord.services.s3i.base.auth import KeycloakAuth
 from exp_coord.services.s3i.base.error import raise_on_error
+from exp_coord.services.s3i.base.transport import HTTPPool
 
 logger = get_logger(__name__)
 
@@ -25,10 +27,22 @@ def _create_auth_from_settings(client: httpx.AsyncClient, settings: S3ISettings)
 class BaseS3IClient:
     """The base client, providing the boilerplate for the other clients further down the road."""
 
-    def __init__(self, settings: S3ISettings, base_url: str) -> None:
+    def __init__(self, settings: S3ISettings, base_url: str, pool: HTTPPool | None = None) -> None:
+        """Create the client.
+
+        Args:
+            settings: The S3I settings.
+            base_url: The URL of the API.
+            pool: The connection pool to send requests through, both to the API and Keycloak.
+                If None, the client creates its own pool from the settings and closes it with
+                the client.
+        """
         self.settings = settings
-        self.auth = _create_auth_from_settings(httpx.AsyncClient(), settings)
-        self.client = httpx.AsyncClient(base_url=base_url, auth=self.auth)
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else HTTPPool.from_settings(settings.http_pool)
+        self._auth_client = self.pool.create_client()
+        self.auth = _create_auth_from_settings(self._auth_client, settings)
+        self.client = self.pool.create_client(base_url=base_url, auth=self.auth)
 
     async def __aenter__(self):
         return self
@@ -37,7 +51,11 @@ class BaseS3IClient:
         await self.aclose()
 
     async def aclose(self) -> None:
+        await self.auth.aclose()
         await self.client.aclose()
+        await self._auth_client.aclose()
+        if self._owns_pool:
+            await self.pool.aclose()
 
     async def _send_request(
         self,
@@ -72,3 +90,31 @@ class BaseS3IClient:
         if log_response:
             logger.debug("Received response", content=response.content)
         return response
+
+    @asynccontextmanager
+    async def _stream_request(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        extend_allowed_response_codes: list[int] | None = None,
+        **extra_request_kwargs: Any,
+    ) -> AsyncIterator[httpx.Response]:
+        """Send a request to the specified endpoint without reading the response body up front.
+
+        The body can be consumed incrementally with e.g. `response.aiter_bytes()` while inside the
+        context. If the response is an error, the body is read completely to raise an S3IError.
+
+        Args:
+            method (str): The HTTP method to use.
+            endpoint (str): The endpoint to send the request to.
+            **extra_request_kwargs: Extra kwargs passed to httpx.AsyncClient.stream()
+
+        Yields:
+            The raw, not yet consumed httpx.Response object.
+        """
+        async with self.client.stream(method, endpoint, **extra_request_kwargs) as response:
+            if response.is_error:
+                await response.aread()
+                await raise_on_error(response, extend_allowed_response_codes)
+            yield response
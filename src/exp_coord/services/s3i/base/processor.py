@@ -1,36 +1,116 @@
 import asyncio
+import time
 from dataclasses import dataclass
-from typing import Awaitable, Callable, Generic, Sequence, TypeVar
+from itertools import product
+from typing import AsyncIterable, Awaitable, Callable, Generic, Iterable, Sequence, TypeVar
 
-from structlog.stdlib import get_logger
+from structlog.stdlib import BoundLogger, get_logger
+
+from exp_coord.core.metrics import HANDLER_DURATION, HANDLER_FAILURES
 
 logger = get_logger(__name__)
 T = TypeVar("T")
 
+# (topic, messageType) of a message, used to look up the handlers in the dispatch table
+DispatchKey = tuple[str | None, str | None]
+
 
 @dataclass
 class Handler(Generic[T]):
-    """Generic handler that can process any type of message."""
+    """Generic handler that can process any type of message.
+
+    A handler is selected for a message if all of the set criteria match:
+    - `topic` and `message_type` are compared to the `topic` and `messageType` attributes of the
+      message. They are resolved through a dispatch table, so prefer them over a predicate.
+    - `predicate` is called with the message, as a fallback for everything else.
+
+    A handler without any criteria is selected for every message.
+
+    When the processor runs the handlers of a message concurrently, `after` lists the names of
+    handlers that have to finish before this one starts, if they were selected for the message too.
+
+    Handlers that defer work, e.g. by buffering database writes, can provide `flush`. It is called
+    by `Processor.flush` and should raise an ExceptionGroup of the deferred failures.
+    """
 
     name: str
-    predicate: Callable[[T], bool]
+    predicate: Callable[[T], bool] | None
     handle: Callable[[T], Awaitable[None]]
+    topic: str | None = None
+    message_type: str | None = None
+    after: Sequence[str] = ()
+    flush: Callable[[], Awaitable[None]] | None = None
 
     def __str__(self) -> str:
         return self.name
 
+    def matches_key(self, key: DispatchKey) -> bool:
+        """Check whether the topic and message type of the handler match the dispatch key."""
+        topic, message_type = key
+        return (self.topic is None or self.topic == topic) and (
+            self.message_type is None or self.message_type == message_type
+        )
+
 
 class Processor(Generic[T]):
     """Generic message processor that can handle any type of message."""
 
-    def __init__(self, handlers: Sequence[Handler[T]]):
-        """Initialize with handlers and optional custom logger."""
+    def __init__(
+        self,
+        handlers: Sequence[Handler[T]],
+        *,
+        max_concurrency: int | None = None,
+        queue_size: int | None = None,
+        concurrent_handlers: bool = False,
+    ):
+        """Initialize with handlers.
+
+        Args:
+            handlers: The handlers to dispatch the messages to.
+            max_concurrency: If set, `process_all` uses a pool of this many workers instead of
+                processing all messages at once.
+            queue_size: The number of messages buffered for the workers before receiving more
+                messages is paused. Defaults to `max_concurrency`.
+            concurrent_handlers: If True, the handlers of one message run concurrently, only
+                respecting the order declared with `Handler.after`.
+
+        Raises:
+            ValueError: If the `after` declarations of the handlers contain a cycle.
+        """
+        _ensure_no_dependency_cycle(handlers)
         self._handlers = handlers
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.concurrent_handlers = concurrent_handlers
+
+        # The dispatch table maps every combination of declared topics and message types to the
+        # candidate handlers, in the order they were given. Topics and message types no handler
+        # declared are looked up as None.
+        self._topics = {h.topic for h in handlers if h.topic is not None}
+        self._message_types = {h.message_type for h in handlers if h.message_type is not None}
+        self._dispatch: dict[DispatchKey, list[Handler[T]]] = {
+            key: [h for h in handlers if h.matches_key(key)]
+            for key in product([*self._topics, None], [*self._message_types, None])
+        }
+
+    def _dispatch_key(self, message: T) -> DispatchKey:
+        """Get the key of the message in the dispatch table."""
+        topic = getattr(message, "topic", None)
+        message_type = getattr(message, "messageType", None)
+        return (
+            topic if topic in self._topics else None,
+            message_type if message_type in self._message_types else None,
+        )
 
-    def find_handlers(self, message: T) -> list[Handler[T]]:
+    def find_handlers(
+        self, message: T, message_logger: BoundLogger | None = None
+    ) -> list[Handler[T]]:
         """Find handlers that can process the message."""
-        message_logger = logger.bind(content=message)
-        matching = [h for h in self._handlers if h.predicate(message)]
+        if message_logger is None:
+            message_logger = logger.bind(content=message)
+
+        candidates = self._dispatch[self._dispatch_key(message)]
+        matching = [h for h in candidates if h.predicate is None or h.predicate(message)]
 
         if not matching:
             message_logger.warning("No handlers found")
@@ -48,26 +128,99 @@ class Processor(Generic[T]):
             ExceptionGroup: If any error occurred during processing from one of the handlers.
         """
         message_logger = logger.bind(content=message)
-        handlers = self.find_handlers(message)
+        handlers = self.find_handlers(message, message_logger)
 
-        exceptions: list[Exception] = []
-        for handler in handlers:
-            message_logger.debug("Handler started processing", handler=handler.name)
+        if self.concurrent_handlers and len(handlers) > 1:
+            exceptions = await self._run_handlers_concurrently(handlers, message, message_logger)
+        else:
+            exceptions = []
+            for handler in handlers:
+                if exc := await self._run_handler(handler, message, message_logger):
+                    exceptions.append(exc)
 
-            try:
-                await handler.handle(message)
-                message_logger.info("Handler finished successfully", handler=handler.name)
-            except Exception as exc:
-                exceptions.append(exc)
-                message_logger.exception("Handler failed to process message", handler=handler.name)
         if exceptions:
             raise ExceptionGroup("The message (partially) failed to process", exceptions)
 
-    async def process_all(self, messages: Sequence[T]) -> None:
-        """Process all messages concurrently. This also merges all the ExceptionGroups into one."""
-        tasks = (self.process(message) for message in messages)
+    async def _run_handler(
+        self, handler: Handler[T], message: T, message_logger: BoundLogger
+    ) -> Exception | None:
+        """Run a single handler, returning the exception instead of raising it."""
+        message_logger.debug("Handler started processing", handler=handler.name)
+
+        start = time.perf_counter()
+        try:
+            await handler.handle(message)
+            message_logger.info("Handler finished successfully", handler=handler.name)
+        except Exception as exc:
+            message_logger.exception("Handler failed to process message", handler=handler.name)
+            HANDLER_FAILURES.labels(handler=handler.name).inc()
+            return exc
+        finally:
+            HANDLER_DURATION.labels(handler=handler.name).observe(time.perf_counter() - start)
+        return None
+
+    async def _run_handlers_concurrently(
+        self, handlers: Sequence[Handler[T]], message: T, message_logger: BoundLogger
+    ) -> list[Exception]:
+        """Run all handlers at once, except for those waiting for the ones in `Handler.after`.
+
+        A handler waits for its dependencies to finish, no matter whether they succeeded. The
+        exceptions are returned in the order of the handlers.
+        """
+        finished = {handler.name: asyncio.Event() for handler in handlers}
+
+        async def run(handler: Handler[T]) -> Exception | None:
+            try:
+                for dependency in handler.after:
+                    if dependency in finished:
+                        await finished[dependency].wait()
+                return await self._run_handler(handler, message, message_logger)
+            finally:
+                finished[handler.name].set()
+
+        results = await asyncio.gather(*(run(handler) for handler in handlers))
+        return [exc for exc in results if exc is not None]
+
+    async def process_all(self, messages: Iterable[T] | AsyncIterable[T]) -> int:
+        """Process all messages concurrently. This also merges all the ExceptionGroups into one.
+
+        `messages` may also be an async iterable, e.g. `S3IBrokerClient.iter_all_events()`. In that
+        case, every message starts processing as soon as it is received. If the iterable itself
+        fails, the messages received until then are still processed and the error is merged into
+        the ExceptionGroup.
+
+        If `max_concurrency` is set, at most that many messages are processed at once, see
+        `_process_all_pooled`. Otherwise, all messages are processed at the same time.
+
+        Afterwards, the handlers are flushed and their deferred failures are merged as well.
+
+        Returns:
+            int: The number of messages processed.
+        """
+        if self.max_concurrency is not None:
+            count, exceptions = await self._process_all_pooled(messages, self.max_concurrency)
+        else:
+            count, exceptions = await self._process_all_at_once(messages)
+
+        try:
+            await self.flush()
+        except ExceptionGroup as exc_group:
+            exceptions.extend(exc_group.exceptions)
+
+        if exceptions:
+            raise ExceptionGroup("Merged exceptions from process_all", exceptions)
+        return count
+
+    async def flush(self) -> None:
+        """Flush all handlers providing `Handler.flush`.
+
+        Raises:
+            ExceptionGroup: If any of the flushes failed.
+        """
+        # Handlers may share the same flush, e.g. when writing to the same buffer
+        flushes = list(dict.fromkeys(h.flush for h in self._handlers if h.flush is not None))
         results: Sequence[None | BaseException] = await asyncio.gather(
-            *tasks, return_exceptions=True
+            *(flush() for flush in flushes), return_exceptions=True
         )
 
         exceptions = []
@@ -78,4 +231,106 @@ class Processor(Generic[T]):
                 exceptions.append(result)
 
         if exceptions:
-            raise ExceptionGroup("Merged exceptions from process_all", exceptions)
+            raise ExceptionGroup("Failed to flush the handlers", exceptions)
+
+    async def _process_all_at_once(
+        self, messages: Iterable[T] | AsyncIterable[T]
+    ) -> tuple[int, list[Exception]]:
+        """Process all messages at the same time, returning the count and all exceptions."""
+        exceptions = []
+        tasks: list[asyncio.Task[None]] = []
+        if isinstance(messages, AsyncIterable):
+            try:
+                async for message in messages:
+                    tasks.append(asyncio.create_task(self.process(message)))
+            except Exception as exc:
+                logger.exception("Failed to receive all messages")
+                exceptions.append(exc)
+        else:
+            tasks = [asyncio.create_task(self.process(message)) for message in messages]
+
+        results: Sequence[None | BaseException] = await asyncio.gather(
+            *tasks, return_exceptions=True
+        )
+
+        for result in results:
+            if isinstance(result, ExceptionGroup):
+                exceptions.extend(result.exceptions)  # Unpack nested exceptions
+            elif isinstance(result, BaseException):
+                exceptions.append(result)
+
+        return len(tasks), exceptions
+
+    async def _process_all_pooled(
+        self, messages: Iterable[T] | AsyncIterable[T], max_concurrency: int
+    ) -> tuple[int, list[Exception]]:
+        """Process all messages using a fixed number of workers fed by a bounded queue.
+
+        Receiving messages is paused while the queue is full, so a large backlog never results in
+        more than `max_concurrency` messages being processed at once. Every worker collects its
+        own exceptions, they are merged and returned together with the count.
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, not {max_concurrency}")
+
+        queue: asyncio.Queue[tuple[T] | None] = asyncio.Queue(
+            maxsize=self.queue_size or max_concurrency
+        )
+
+        async def worker(exceptions: list[Exception]) -> None:
+            while (item := await queue.get()) is not None:
+                try:
+                    await self.process(item[0])
+                except ExceptionGroup as exc_group:
+                    exceptions.extend(exc_group.exceptions)  # Unpack nested exceptions
+                except Exception as exc:
+                    logger.exception("Failed to process message", content=item[0])
+                    exceptions.append(exc)
+
+        worker_exceptions: list[list[Exception]] = [[] for _ in range(max_concurrency)]
+        workers = [asyncio.create_task(worker(exceptions)) for exceptions in worker_exceptions]
+
+        feed_exceptions: list[Exception] = []
+        count = 0
+        try:
+            if isinstance(messages, AsyncIterable):
+                async for message in messages:
+                    await queue.put((message,))
+                    count += 1
+            else:
+                for message in messages:
+                    await queue.put((message,))
+                    count += 1
+        except Exception as exc:
+            logger.exception("Failed to receive all messages")
+            feed_exceptions.append(exc)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+
+        # One stop signal per worker, they exit after all messages before it are processed
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+        return count, feed_exceptions + [exc for excs in worker_exceptions for exc in excs]
+
+
+def _ensure_no_dependency_cycle(handlers: Sequence[Handler[T]]) -> None:
+    """Raise a ValueError if handlers (indirectly) have to run after themselves."""
+    dependencies = {handler.name: handler.after for handler in handlers}
+    done: set[str] = set()
+
+    def visit(name: str, path: tuple[str, ...]) -> None:
+        if name in path:
+            cycle = " -> ".join((*path[path.index(name) :], name))
+            raise ValueError(f"The handler dependencies contain a cycle: {cycle}")
+        if name in done:
+            return
+        for dependency in dependencies.get(name, ()):
+            visit(dependency, (*path, name))
+        done.add(name)
+
+    for name in dependencies:
+        visit(name, ())
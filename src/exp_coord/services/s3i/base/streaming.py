@@ -0,0 +1,164 @@
+"""Incremental decoding of JSON arrays received in chunks, e.g. from a streamed HTTP response."""
+
+import re
+from typing import AsyncIterable, AsyncIterator
+
+# Characters that change the parser state outside of strings
+_STRUCTURAL = re.compile(rb'[\[\]{}",]')
+_WHITESPACE = b" \t\r\n"
+
+
+class JSONArrayDecodeError(ValueError):
+    """Raised when the streamed content is not a well-formed JSON array."""
+
+
+class JSONArrayStreamSplitter:
+    """Split a JSON array into the raw bytes of its top-level items, chunk by chunk.
+
+    Only the structure of the document is tracked (nesting depth and whether we are inside a
+    string), the items themselves are not parsed. Each item is returned as soon as it is complete,
+    so only the item currently being received has to be kept in memory.
+
+    Example:
+        ```python
+        splitter = JSONArrayStreamSplitter()
+        splitter.feed(b'[{"a": 1}, {"b"')  # -> [b'{"a": 1}']
+        splitter.feed(b": 2}]")  # -> [b'{"b": 2}']
+        splitter.close()
+        ```
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._pos = 0  # Position up to which the buffer has been scanned
+        self._item_start: int | None = None
+        self._depth = 0  # Nesting depth, the outer array is at depth 1
+        self._in_string = False
+        self._started = False
+        self._finished = False
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Add a chunk of data and return all items that were completed by it."""
+        if self._finished:
+            if chunk.strip(_WHITESPACE):
+                raise JSONArrayDecodeError("Unexpected data after the end of the array")
+            return []
+
+        self._buffer += chunk
+        items: list[bytes] = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer) and not self._finished:
+            if self._in_string:
+                if not self._skip_string():
+                    break
+                continue
+
+            if not self._started:
+                self._consume_array_start()
+                continue
+
+            match = _STRUCTURAL.search(buffer, self._pos)
+            if match is None:
+                self._mark_item_start(len(buffer))
+                self._pos = len(buffer)
+                break
+
+            index = match.start()
+            char = buffer[index : index + 1]
+            if char in (b",", b"]") and self._depth == 1:
+                # A top-level separator or the end of the array completes the current item
+                self._mark_item_start(index)
+                if self._item_start is not None:
+                    items.append(bytes(buffer[self._item_start : index]).rstrip(_WHITESPACE))
+                elif char == b",":
+                    raise JSONArrayDecodeError("Empty item in array")
+                self._item_start = None
+                if char == b"]":
+                    self._depth = 0
+                    self._finished = True
+            else:
+                self._mark_item_start(index + 1)
+                if char == b'"':
+                    self._in_string = True
+                elif char in (b"{", b"["):
+                    self._depth += 1
+                elif char in (b"}", b"]"):
+                    self._depth -= 1
+            self._pos = index + 1
+
+        self._compact()
+        return items
+
+    def close(self) -> None:
+        """Ensure the complete array has been received.
+
+        An entirely empty stream is treated like an empty array.
+        """
+        if not self._started and not self._buffer.strip(_WHITESPACE):
+            return
+        if not self._finished:
+            raise JSONArrayDecodeError("The stream ended before the array was closed")
+
+    def _consume_array_start(self) -> None:
+        """Skip leading whitespace and consume the opening bracket of the array."""
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        if self._pos == len(self._buffer):
+            return
+        if self._buffer[self._pos : self._pos + 1] != b"[":
+            raise JSONArrayDecodeError("Expected the stream to start with a JSON array")
+        self._started = True
+        self._depth = 1
+        self._pos += 1
+
+    def _skip_string(self) -> bool:
+        """Move behind the closing quote of the current string. Returns False if it isn't there yet."""
+        buffer = self._buffer
+        while True:
+            index = buffer.find(b'"', self._pos)
+            if index == -1:
+                # Backslashes stay in the buffer, so an escaped quote in the next chunk is detected
+                self._pos = len(buffer)
+                return False
+
+            # The quote is escaped if it is preceded by an odd number of backslashes
+            backslashes = 0
+            while index - backslashes - 1 >= 0 and buffer[index - backslashes - 1] == 0x5C:
+                backslashes += 1
+            self._pos = index + 1
+            if backslashes % 2 == 0:
+                self._in_string = False
+                return True
+
+    def _mark_item_start(self, end: int) -> None:
+        """Remember where the current top-level item starts, looking at the buffer up to `end`."""
+        if self._item_start is not None or self._depth != 1:
+            return
+        for index in range(self._pos, end):
+            if self._buffer[index] not in _WHITESPACE:
+                self._item_start = index
+                return
+
+    def _compact(self) -> None:
+        """Drop everything from the buffer that is not part of the current item."""
+        keep_from = self._item_start if self._item_start is not None else self._pos
+        if keep_from == 0:
+            return
+        del self._buffer[:keep_from]
+        self._pos -= keep_from
+        if self._item_start is not None:
+            self._item_start = 0
+
+
+async def aiter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Yield the raw bytes of each top-level item of a JSON array as soon as it is complete.
+
+    Raises:
+        JSONArrayDecodeError: If the content is not a well-formed JSON array.
+    """
+    splitter = JSONArrayStreamSplitter()
+    async for chunk in chunks:
+        for item in splitter.feed(chunk):
+            yield item
+    splitter.close()
@@ -0,0 +1,170 @@
+"""A connection pool shared by the S3I clients and their authentication."""
+
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from exp_coord.core.config import HTTPPoolSettings
+from exp_coord.core.metrics import HTTP_REQUEST_DURATION
+
+
+@dataclass(frozen=True)
+class HTTPPoolStats:
+    """A snapshot of the usage of an HTTPPool."""
+
+    requests: int  # Requests sent since the pool was created
+    in_flight: int  # Requests waiting for their response
+    peak_in_flight: int  # Most requests waiting for their response at the same time
+    queued: int  # Requests waiting for a free connection
+    connections_opened: int  # Connections opened since the pool was created
+
+
+class _PoolTransport(httpx.AsyncBaseTransport):
+    """Sends the requests of all clients of a pool and counts them, but leaves closing to the pool.
+
+    If `traced`, the requests are followed with httpcore's `trace` extension: a request is queued
+    until its first trace event, which is only sent once it got a connection.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, *, traced: bool) -> None:
+        self.transport = transport
+        self.traced = traced
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.queued = 0
+        self.connections_opened = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        queued = self.traced
+        if queued:
+            self.queued += 1
+            outer_trace = request.extensions.get("trace")
+
+            async def trace(event_name: str, info: dict[str, Any]) -> None:
+                nonlocal queued
+                if queued:
+                    queued = False
+                    self.queued -= 1
+                if event_name == "connection.connect_tcp.complete":
+                    self.connections_opened += 1
+                if outer_trace is not None:
+                    await outer_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+        try:
+            with HTTP_REQUEST_DURATION.labels(host=request.url.host, method=request.method).time():
+                return await self.transport.handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+            if queued:  # Failed while waiting for a connection, e.g. with a pool timeout
+                self.queued -= 1
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HTTPPool:
+    """A connection pool for any number of `httpx.AsyncClient`s.
+
+    Clients created with `create_client` send their requests through the same connections, and
+    can be closed independently of each other. The connections are closed with the pool.
+
+    Example:
+        ```python
+        pool = HTTPPool.from_settings(get_settings().s3i.http_pool)
+        async with S3IBrokerClient(settings, pool=pool) as broker, S3IConfigClient(settings, pool=pool) as config:
+            ...
+        print(pool.stats())
+        await pool.aclose()
+        ```
+    """
+
+    def __init__(
+        self,
+        limits: httpx.Limits | None = None,
+        *,
+        http2: bool = False,
+        timeout: httpx.Timeout | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        """Create the pool.
+
+        Args:
+            limits: The connection limits, httpx's defaults if None.
+            http2: Negotiate HTTP/2 if the server supports it.
+            timeout: The default timeout of the created clients, 5 seconds if None.
+            transport: Send the requests through this transport instead of opening connections,
+                e.g. an `httpx.ASGITransport` to test against an in-process server. The limits
+                don't apply then, and the transport is closed with the pool.
+        """
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError as exc:
+                raise ImportError(
+                    "HTTP/2 requires the h2 package, install it with `pip install httpx[http2]`"
+                ) from exc
+
+        self.limits = limits if limits is not None else httpx.Limits()
+        self.timeout = timeout if timeout is not None else httpx.Timeout(5)
+        self._transport = _PoolTransport(
+            transport
+            if transport is not None
+            else httpx.AsyncHTTPTransport(limits=self.limits, http2=http2),
+            traced=transport is None,
+        )
+        self._closed = False
+
+    @classmethod
+    def from_settings(cls, settings: HTTPPoolSettings) -> "HTTPPool":
+        return cls(
+            httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            ),
+            http2=settings.http2,
+            timeout=httpx.Timeout(settings.timeout, pool=settings.pool_timeout),
+        )
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def create_client(self, **client_kwargs: Any) -> httpx.AsyncClient:
+        """Create a client using the connections of this pool.
+
+        Args:
+            **client_kwargs: Passed to httpx.AsyncClient(), except for the transport.
+        """
+        if self._closed:
+            raise RuntimeError("The HTTP pool is already closed")
+        client_kwargs.setdefault("timeout", self.timeout)
+        return httpx.AsyncClient(transport=self._transport, **client_kwargs)
+
+    def stats(self) -> HTTPPoolStats:
+        """Get the current usage of the pool, e.g. to size its limits."""
+        return HTTPPoolStats(
+            requests=self._transport.requests,
+            in_flight=self._transport.in_flight,
+            peak_in_flight=self._transport.peak_in_flight,
+            queued=self._transport.queued,
+            connections_opened=self._transport.connections_opened,
+        )
+
+    async def aclose(self) -> None:
+        """Close all connections. Clients created by the pool can't be used afterwards."""
+        if not self._closed:
+            self._closed = True
+            await self._transport.transport.aclose()
+
+    async def __aenter__(self) -> "HTTPPool":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
@@ -1,3 +1,4 @@
 from .client import S3IBrokerClient as S3IBrokerClient
 from .models import S3IEvent as S3IEvent
 from .models import S3IMessage as S3IMessage
+from .models import S3IMessageOrEvent as S3IMessageOrEvent
@@ -1,14 +1,25 @@
+from typing import AsyncIterator
+
 from pydantic import validate_call
 
 from exp_coord.core.annotations.s3i import S3IMessageQueueType
 from exp_coord.core.config import S3ISettings
-from exp_coord.core.utils import _get_type_adapter
+from exp_coord.core.metrics import BROKER_RECEIVED
+from exp_coord.core.utils import type_adapters
 from exp_coord.services.s3i.base.client import BaseS3IClient
+from exp_coord.services.s3i.base.streaming import aiter_json_array
+from exp_coord.services.s3i.base.transport import HTTPPool
 from exp_coord.services.s3i.broker.models import (
     S3IEvent,
     S3IMessage,
 )
 
+# Built at import instead of on the first received message
+_MESSAGE_ADAPTER = type_adapters.get(S3IMessage)
+_MESSAGE_LIST_ADAPTER = type_adapters.get(list[S3IMessage])
+_EVENT_ADAPTER = type_adapters.get(S3IEvent)
+_EVENT_LIST_ADAPTER = type_adapters.get(list[S3IEvent])
+
 
 class S3IBrokerClient(BaseS3IClient):
     """An asynchronous implementation of the S³I api specification.
@@ -16,8 +27,8 @@ class S3IBrokerClient(BaseS3IClient):
     The API is defined at https://broker.s3i.vswf.dev/apidoc/
     """
 
-    def __init__(self, settings: S3ISettings) -> None:
-        super().__init__(settings, settings.broker_url)
+    def __init__(self, settings: S3ISettings, pool: HTTPPool | None = None) -> None:
+        super().__init__(settings, settings.broker_url, pool)
 
     async def receive_message(self) -> S3IMessage | None:
         """Receive a message from the S³I Broker.
@@ -31,7 +42,9 @@ class S3IBrokerClient(BaseS3IClient):
         response = await self._send_request("GET", f"/{self.settings.message_queue}")
         if len(response.content) == 0:
             return None
-        _get_type_adapter(S3IMessage).validate_json(response.content)
+        message = _MESSAGE_ADAPTER.validate_json(response.content)
+        BROKER_RECEIVED.labels(queue=self.settings.message_queue).inc()
+        return message
 
     async def receive_all_messages(self) -> list[S3IMessage]:
         """Receive all messages from the S³I Broker.
@@ -43,7 +56,29 @@ class S3IBrokerClient(BaseS3IClient):
             list[S3IMessage]: The received messages.
         """
         response = await self._send_request("GET", f"/{self.settings.message_queue}/all")
-        return _get_type_adapter(list[S3IMessage]).validate_json(response.content)
+        messages = _MESSAGE_LIST_ADAPTER.validate_json(response.content)
+        BROKER_RECEIVED.labels(queue=self.settings.message_queue).inc(len(messages))
+        return messages
+
+    async def iter_all_messages(self) -> AsyncIterator[S3IMessage]:
+        """Receive all messages from the S³I Broker, yielding each one as soon as it is received.
+
+        In contrast to `receive_all_messages`, the response is decoded incrementally, so only one
+        message has to be held in memory at a time.
+
+        Raises:
+            S3IBrokerError: If the broker responds with an error.
+            JSONArrayDecodeError: If the response is not a JSON array.
+
+        Yields:
+            S3IMessage: The received messages.
+        """
+        received = BROKER_RECEIVED.labels(queue=self.settings.message_queue)
+        async with self._stream_request("GET", f"/{self.settings.message_queue}/all") as response:
+            async for raw_message in aiter_json_array(response.aiter_bytes()):
+                message = _MESSAGE_ADAPTER.validate_json(raw_message)
+                received.inc()
+                yield message
 
     async def receive_event(self) -> S3IEvent | None:
         """Receive an event from the S³I Broker.
@@ -57,7 +92,9 @@ class S3IBrokerClient(BaseS3IClient):
         response = await self._send_request("GET", f"/{self.settings.event_queue}")
         if len(response.content) == 0:
             return None
-        _get_type_adapter(S3IEvent).validate_json(response.content)
+        event = _EVENT_ADAPTER.validate_json(response.content)
+        BROKER_RECEIVED.labels(queue=self.settings.event_queue).inc()
+        return event
 
     async def receive_all_events(self) -> list[S3IEvent]:
         """Receive all events from the S³I Broker.
@@ -69,7 +106,29 @@ class S3IBrokerClient(BaseS3IClient):
             list[S3IEvent]: The received events.
         """
         response = await self._send_request("GET", f"/{self.settings.event_queue}/all")
-        return _get_type_adapter(list[S3IEvent]).validate_json(response.content)
+        events = _EVENT_LIST_ADAPTER.validate_json(response.content)
+        BROKER_RECEIVED.labels(queue=self.settings.event_queue).inc(len(events))
+        return events
+
+    async def iter_all_events(self) -> AsyncIterator[S3IEvent]:
+        """Receive all events from the S³I Broker, yielding each one as soon as it is received.
+
+        In contrast to `receive_all_events`, the response is decoded incrementally, so only one
+        event has to be held in memory at a time.
+
+        Raises:
+            S3IBrokerError: If the broker responds with an error.
+            JSONArrayDecodeError: If the response is not a JSON array.
+
+        Yields:
+            S3IEvent: The received events.
+        """
+        received = BROKER_RECEIVED.labels(queue=self.settings.event_queue)
+        async with self._stream_request("GET", f"/{self.settings.event_queue}/all") as response:
+            async for raw_event in aiter_json_array(response.aiter_bytes()):
+                event = _EVENT_ADAPTER.validate_json(raw_event)
+                received.inc()
+                yield event
 
     @validate_call
     async def send_message(
@@ -1,6 +1,6 @@
-from typing import Literal, Union
+from typing import Annotated, Literal, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic.types import JsonValue
 
 
@@ -246,18 +246,22 @@ class S3IDeleteAttributeReply(BaseModel):
     ok: bool
 
 
-S3IMessage = Union[
-    S3IUserMessage,
-    S3IServiceRequest,
-    S3IServiceReply,
-    S3IGetValueRequest,
-    S3IGetValueReply,
-    S3ISetValueRequest,
-    S3ISetValueReply,
-    S3ICreateAttributeRequest,
-    S3ICreateAttributeReply,
-    S3IDeleteAttributeRequest,
-    S3IDeleteAttributeReply,
+# Tagged by messageType, so pydantic validates only the matching model instead of trying each
+S3IMessage = Annotated[
+    Union[
+        S3IUserMessage,
+        S3IServiceRequest,
+        S3IServiceReply,
+        S3IGetValueRequest,
+        S3IGetValueReply,
+        S3ISetValueRequest,
+        S3ISetValueReply,
+        S3ICreateAttributeRequest,
+        S3ICreateAttributeReply,
+        S3IDeleteAttributeRequest,
+        S3IDeleteAttributeReply,
+    ],
+    Field(discriminator="messageType"),
 ]
 
 
@@ -279,3 +283,9 @@ class S3IEvent(BaseModel):
     topic: str
     messageType: Literal["eventMessage"] = "eventMessage"
     content: JsonValue
+
+
+S3IMessageOrEvent = Annotated[
+    Union[S3IMessage, S3IEvent],
+    Field(discriminator="messageType"),
+]
@@ -4,6 +4,7 @@ from structlog.stdlib import get_logger
 from exp_coord.core.annotations.s3i import S3IIdType
 from exp_coord.core.config import S3ISettings
 from exp_coord.services.s3i.base.client import BaseS3IClient
+from exp_coord.services.s3i.base.transport import HTTPPool
 from exp_coord.services.s3i.config.models import FullIdentity
 
 logger = get_logger(__name__)
@@ -12,8 +13,8 @@ logger = get_logger(__name__)
 class S3IConfigClient(BaseS3IClient):
     """A client for interfacing with the S3I config API, specified under https://config.s3i.vswf.dev/apidoc/"""
 
-    def __init__(self, settings: S3ISettings) -> None:
-        super().__init__(settings, settings.config_url)
+    def __init__(self, settings: S3ISettings, pool: HTTPPool | None = None) -> None:
+        super().__init__(settings, settings.config_url, pool)
 
         # Rudimentary check for permission => check that person who is authing is not a thing, but a person
         if not self.auth.is_person:
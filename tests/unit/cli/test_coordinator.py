@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import signal
+from typing import AsyncIterator
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from exp_coord.cli.run.coordinator import Coordinator
+from exp_coord.cli.run.profiling import CycleProfiler
+from exp_coord.services.s3i import Handler, Processor
+
+
+class FakeBrokerClient:
+    """Streams the given batches of messages, then nothing."""
+
+    def __init__(self, batches: list[list[str]]) -> None:
+        self.batches = batches
+        self.polls = 0
+        self.decoded: list[str] = []
+
+    async def iter_all_messages(self) -> AsyncIterator[str]:
+        self.polls += 1
+        await asyncio.sleep(0)
+        for message in self.batches.pop(0) if self.batches else []:
+            self.decoded.append(message)
+            yield message
+
+    async def iter_all_events(self) -> AsyncIterator[str]:
+        for event in []:
+            yield event
+
+
+async def _iterate(items) -> AsyncIterator[str]:
+    for item in items:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def _coordinator(broker_client, handle, **kwargs) -> Coordinator:
+    return Coordinator(
+        broker_client,
+        Processor[str]([Handler("test", None, handle)]),
+        Processor[str]([]),
+        **kwargs,
+    )
+
+
+async def test_processes_all_batches_until_stopped():
+    handle = AsyncMock()
+    broker_client = FakeBrokerClient([["a", "b"], ["c"], ["d"]])
+    coordinator = _coordinator(broker_client, handle, min_interval=0, max_interval=0.01)
+
+    task = asyncio.create_task(coordinator.run())
+    while broker_client.batches or handle.await_count < 4:
+        await asyncio.sleep(0.001)
+    coordinator.stop()
+    await asyncio.wait_for(task, 1)
+
+    assert [call.args[0] for call in handle.await_args_list] == ["a", "b", "c", "d"]
+
+
+async def test_profiles_cycles(tmp_path):
+    handle = AsyncMock()
+    broker_client = FakeBrokerClient([["a", "b"], ["c"]])
+    coordinator = _coordinator(
+        broker_client,
+        handle,
+        min_interval=0,
+        max_interval=0.01,
+        profiler=CycleProfiler(tmp_path, keep_slowest=5),
+    )
+
+    task = asyncio.create_task(coordinator.run())
+    while broker_client.batches or handle.await_count < 3:
+        await asyncio.sleep(0.001)
+    coordinator.stop()
+    await asyncio.wait_for(task, 1)
+
+    summaries = [json.loads(path.read_text()) for path in sorted(tmp_path.glob("*.json"))]
+    assert [s["messages"] for s in summaries] == [2, 1]  # Idle cycles are not profiled
+    assert summaries[0]["handlers"]["test"]["calls"] == 2
+
+
+async def test_prefetches_while_processing():
+    broker_client = FakeBrokerClient([["a"], ["b"]])
+    polls_while_processing = []
+
+    async def handle(message):
+        await asyncio.sleep(0.01)
+        polls_while_processing.append(broker_client.polls)
+
+    coordinator = _coordinator(broker_client, handle, min_interval=0, max_interval=0.01)
+    task = asyncio.create_task(coordinator.run())
+    while len(polls_while_processing) < 2:
+        await asyncio.sleep(0.001)
+    coordinator.stop()
+    await asyncio.wait_for(task, 1)
+
+    # The second batch was already being fetched while the first one was processed
+    assert polls_while_processing[0] == 2
+
+
+async def test_prefetch_only_receives_the_first_message():
+    broker_client = FakeBrokerClient([["a"], ["b", "c", "d"]])
+    decoded_while_processing = []
+
+    async def handle(message):
+        await asyncio.sleep(0.01)
+        decoded_while_processing.append(list(broker_client.decoded))
+
+    coordinator = _coordinator(broker_client, handle, min_interval=0, max_interval=0.01)
+    task = asyncio.create_task(coordinator.run())
+    while len(decoded_while_processing) < 4:
+        await asyncio.sleep(0.001)
+    coordinator.stop()
+    await asyncio.wait_for(task, 1)
+
+    # Only "b" of the prefetched batch was received while "a" was processed
+    assert decoded_while_processing[0] == ["a", "b"]
+
+
+async def test_backs_off_while_idle(mocker):
+    coordinator = _coordinator(
+        FakeBrokerClient([["a"]]), AsyncMock(), min_interval=1, max_interval=5
+    )
+    waits = []
+
+    async def wait_for_stop(timeout):
+        waits.append(timeout)
+        if len(waits) == 5:
+            coordinator.stop()
+        return len(waits) == 5
+
+    mocker.patch.object(coordinator, "_wait_for_stop", wait_for_stop)
+    await asyncio.wait_for(coordinator.run(), 1)
+
+    assert waits == [2, 4, 5, 5, 5]
+
+
+async def test_processes_prefetched_batch_on_stop():
+    handle = AsyncMock()
+    broker_client = FakeBrokerClient([["a"], ["b"]])
+    coordinator = _coordinator(broker_client, handle, min_interval=0, max_interval=1)
+
+    async def stop_during_first_message(message):
+        if message == "a":
+            coordinator.stop()
+        await handle(message)
+
+    coordinator.message_processor = Processor[str](
+        [Handler("test", None, stop_during_first_message)]
+    )
+    await asyncio.wait_for(coordinator.run(), 1)
+
+    assert [call.args[0] for call in handle.await_args_list] == ["a", "b"]
+
+
+async def test_stops_on_sigterm():
+    coordinator = _coordinator(FakeBrokerClient([]), AsyncMock(), min_interval=0, max_interval=10)
+
+    task = asyncio.create_task(coordinator.run())
+    await asyncio.sleep(0.01)
+    os.kill(os.getpid(), signal.SIGTERM)
+    await asyncio.wait_for(task, 1)
+
+    assert coordinator.cycles >= 1
+
+
+async def test_exit_on_failure():
+    broker_client = FakeBrokerClient([["a"]])
+    coordinator = _coordinator(
+        broker_client, AsyncMock(side_effect=RuntimeError("boom")), min_interval=0, max_interval=0
+    )
+
+    with pytest.raises(ExceptionGroup):
+        await asyncio.wait_for(coordinator.run(), 1)
+
+
+async def test_continues_after_failure():
+    handle = AsyncMock(side_effect=[RuntimeError("boom"), None])
+    broker_client = FakeBrokerClient([["a"], ["b"]])
+    coordinator = _coordinator(
+        broker_client, handle, min_interval=0, max_interval=0.01, exit_on_failure=False
+    )
+
+    task = asyncio.create_task(coordinator.run())
+    while handle.await_count < 2:
+        await asyncio.sleep(0.001)
+    coordinator.stop()
+    await asyncio.wait_for(task, 1)
+
+
+async def test_keeps_events_if_receiving_messages_fails():
+    handle = AsyncMock()
+    broker_client = FakeBrokerClient([])
+    broker_client.iter_all_messages = Mock(return_value=_iterate([RuntimeError("boom")]))
+    broker_client.iter_all_events = Mock(side_effect=[_iterate(["event"]), _iterate([])])
+    coordinator = Coordinator(
+        broker_client,
+        Processor[str]([]),
+        Processor[str]([Handler("test", None, handle)]),
+        min_interval=0,
+        max_interval=0,
+    )
+
+    # The events received alongside the failure are processed before raising
+    with pytest.raises(ExceptionGroup, match="Failed to receive"):
+        await asyncio.wait_for(coordinator.run(), 1)
+    handle.assert_awaited_once_with("event")
+
+
+async def test_fails_if_the_stream_breaks_off():
+    handle = AsyncMock()
+    broker_client = FakeBrokerClient([])
+    broker_client.iter_all_messages = Mock(return_value=_iterate(["a", RuntimeError("boom")]))
+    coordinator = _coordinator(broker_client, handle, min_interval=0, max_interval=0)
+
+    with pytest.raises(ExceptionGroup):
+        await asyncio.wait_for(coordinator.run(), 1)
+    handle.assert_awaited_once_with("a")
@@ -0,0 +1,46 @@
+import json
+import time
+
+import pytest
+
+from exp_coord.cli.run.profiling import CycleProfiler
+from exp_coord.core.metrics import HANDLER_DURATION
+
+
+def test_profile_writes_dump_and_summary(tmp_path):
+    profiler = CycleProfiler(tmp_path / "profiles")
+
+    with profiler.profile(7, messages=1) as record:
+        HANDLER_DURATION.labels(handler="profiled").observe(0.5)
+        HANDLER_DURATION.labels(handler="profiled").observe(0.25)
+        record.events = 2
+
+    summary = json.loads((tmp_path / "profiles" / "cycle-000007.json").read_text())
+    assert (tmp_path / "profiles" / "cycle-000007.prof").exists()
+    assert summary["cycle"] == 7
+    assert (summary["messages"], summary["events"]) == (1, 2)
+    assert summary["handlers"] == {"profiled": {"calls": 2, "seconds": 0.75}}
+    assert summary["top_functions"]
+
+
+def test_profile_writes_on_failure(tmp_path):
+    profiler = CycleProfiler(tmp_path)
+
+    with pytest.raises(RuntimeError), profiler.profile(1):
+        raise RuntimeError("Failed cycle")
+
+    assert (tmp_path / "cycle-000001.json").exists()
+
+
+def test_keep_slowest(tmp_path):
+    profiler = CycleProfiler(tmp_path, keep_slowest=2)
+
+    for cycle, duration in enumerate([0.02, 0, 0.04, 0.01], start=1):
+        with profiler.profile(cycle):
+            time.sleep(duration)
+
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+        "cycle-000001.json",
+        "cycle-000003.json",
+    ]
+    assert len(list(tmp_path.glob("*.prof"))) == 2
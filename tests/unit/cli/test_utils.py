@@ -2,7 +2,8 @@ import pytest
 import typer
 from typer.testing import CliRunner
 
-from exp_coord.cli.utils import skip_execution_on_help_or_completion
+from exp_coord.cli import utils
+from exp_coord.cli.utils import db_command, skip_execution_on_help_or_completion
 
 
 @pytest.fixture(scope="module")
@@ -38,3 +39,18 @@ def test_run_help(runner, typer_app):
     assert result.exit_code == 0
     assert "Callback ran" not in result.stdout
     assert "Hello John" not in result.stdout
+
+
+def test_db_command_initializes_db_first(runner, mocker):
+    init_db = mocker.patch.object(utils, "init_db", mocker.AsyncMock())
+    app = typer.Typer()
+
+    @app.command()
+    @db_command(create_indexes=False)
+    async def count(collection: str):
+        init_db.assert_awaited_once_with(create_indexes=False)
+        typer.echo(f"Counted {collection}")
+
+    result = runner.invoke(app, ["statuses"])
+    assert result.exit_code == 0, result.output
+    assert "Counted statuses" in result.stdout
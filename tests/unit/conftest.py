@@ -1,4 +1,11 @@
+import re
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Callable
+
 import pytest
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import BulkWriteError
 
 import exp_coord.db.connection
 
@@ -17,3 +24,205 @@ def disallow_network_calls(monkeypatch):
         "get_client",
         _raises_func(RuntimeError("Getting a client should not be allowed as this is a unit test")),
     )
+
+
+_MISSING = object()
+
+
+def _get(document: dict[str, Any], path: str) -> Any:
+    """Get a field by its dotted path, `_MISSING` if it doesn't exist."""
+    value: Any = document
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": lambda value, operand: value is not _MISSING and value > operand,
+    "$gte": lambda value, operand: value is not _MISSING and value >= operand,
+    "$lt": lambda value, operand: value is not _MISSING and value < operand,
+    "$lte": lambda value, operand: value is not _MISSING and value <= operand,
+    "$in": lambda value, operand: (None if value is _MISSING else value) in operand,
+    "$regex": lambda value, operand: isinstance(value, str) and bool(re.search(operand, value)),
+}
+
+
+def _matches(document: dict[str, Any], query: dict[str, Any] | None) -> bool:
+    """Check a document against a query with equality and the operators in `_OPERATORS`."""
+    for path, condition in (query or {}).items():
+        value = _get(document, path)
+        if isinstance(condition, dict) and all(key.startswith("$") for key in condition):
+            if not all(_OPERATORS[op](value, operand) for op, operand in condition.items()):
+                return False
+        elif (None if value is _MISSING else value) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    """Stands in for a motor cursor, honouring the sort and limit."""
+
+    def __init__(self, collection: "FakeCollection", documents: list[dict[str, Any]]) -> None:
+        self.collection = collection
+        self.documents = documents
+
+    def sort(self, key: str, direction: int) -> "FakeCursor":
+        self.collection.calls["sort"].append((key, direction))
+        self.documents = sorted(self.documents, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def limit(self, limit: int) -> "FakeCursor":
+        self.collection.calls["limit"].append(limit)
+        self.documents = self.documents[:limit]
+        return self
+
+    def batch_size(self, size: int) -> "FakeCursor":
+        self.collection.calls["batch_size"].append(size)
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[dict[str, Any]]:
+        return self.documents[:length]
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """Stands in for a motor collection, keeping the documents in memory.
+
+    Queries support equality, dotted paths and the operators in `_OPERATORS`, projections are
+    ignored. The arguments of every call are recorded in `calls`, by method, e.g. `(query,
+    projection)` for `find` and the pipeline for `aggregate`. Aggregations aren't evaluated, they
+    yield `aggregate_results`, or what it returns for the pipeline if it is callable.
+    """
+
+    def __init__(
+        self,
+        documents: list[dict[str, Any]] | None = None,
+        *,
+        name: str = "collection",
+        database: Any = None,
+        aggregate_results: (
+            list[dict[str, Any]] | Callable[[list[dict[str, Any]]], list[dict[str, Any]]]
+        ) = (),
+        indexes: dict[str, list[tuple[str, int]]] | None = None,
+    ) -> None:
+        self.documents = documents if documents is not None else []
+        self.name = name
+        self.database = database
+        self.aggregate_results = aggregate_results
+        self.indexes = {"_id_": [("_id", ASCENDING)], **(indexes or {})}
+        self.calls: defaultdict[str, list[Any]] = defaultdict(list)
+
+    def find(
+        self, query: dict[str, Any] | None = None, projection: Any = None, **_: Any
+    ) -> FakeCursor:
+        self.calls["find"].append((query, projection))
+        return FakeCursor(self, [d for d in self.documents if _matches(d, query)])
+
+    async def find_one(self, query: dict[str, Any] | None = None) -> dict[str, Any] | None:
+        return next((d for d in self.documents if _matches(d, query)), None)
+
+    async def count_documents(self, query: dict[str, Any]) -> int:
+        self.calls["count_documents"].append(query)
+        return sum(_matches(d, query) for d in self.documents)
+
+    async def insert_many(self, documents: list[dict[str, Any]], ordered: bool = True) -> Any:
+        """Insert the documents, rejecting duplicate `_id`s like a unique index."""
+        self.calls["insert_many"].append(documents)
+        existing = {d["_id"] for d in self.documents}
+        errors = []
+        for index, document in enumerate(documents):
+            if document["_id"] in existing:
+                errors.append({"index": index, "code": 11000})
+                if ordered:
+                    break
+            else:
+                existing.add(document["_id"])
+                self.documents.append(document)
+        if errors:
+            inserted = errors[0]["index"] if ordered else len(documents) - len(errors)
+            raise BulkWriteError({"writeErrors": errors, "nInserted": inserted})
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in documents])
+
+    async def update_one(
+        self, query: dict[str, Any], update: dict[str, Any], upsert: bool = False
+    ) -> Any:
+        """Apply a `$set` to the first matching document."""
+        self.calls["update_one"].append((query, update))
+        document = await self.find_one(query)
+        if document is None:
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0)
+            document = {key: value for key, value in query.items() if key == "_id"}
+            self.documents.append(document)
+        changed = any(document.get(key, _MISSING) != value for key, value in update["$set"].items())
+        document.update(update["$set"])
+        return SimpleNamespace(matched_count=1, modified_count=int(changed))
+
+    async def update_many(self, query: dict[str, Any], update: dict[str, Any]) -> Any:
+        """Apply a `$set` to all matching documents."""
+        self.calls["update_many"].append((query, update))
+        matched = modified = 0
+        for document in self.documents:
+            if _matches(document, query):
+                matched += 1
+                modified += any(
+                    document.get(key, _MISSING) != value for key, value in update["$set"].items()
+                )
+                document.update(update["$set"])
+        return SimpleNamespace(matched_count=matched, modified_count=modified)
+
+    async def delete_many(self, query: dict[str, Any]) -> Any:
+        self.calls["delete_many"].append(query)
+        kept = [d for d in self.documents if not _matches(d, query)]
+        deleted, self.documents[:] = len(self.documents) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def bulk_write(self, requests: list[Any], ordered: bool = True) -> None:
+        """Only record the requests."""
+        self.calls["bulk_write"].append(requests)
+
+    async def aggregate(self, pipeline: list[dict[str, Any]]):
+        self.calls["aggregate"].append(pipeline)
+        results = self.aggregate_results
+        for result in results(pipeline) if callable(results) else results:
+            yield result
+
+    async def index_information(self) -> dict[str, Any]:
+        return {name: {"key": keys, "v": 2} for name, keys in self.indexes.items()}
+
+    async def create_indexes(self, indexes: list[IndexModel]) -> list[str]:
+        for index in indexes:
+            self.indexes.setdefault(index.document["name"], list(index.document["key"].items()))
+        return [index.document["name"] for index in indexes]
+
+    async def drop_index(self, name: str) -> None:
+        del self.indexes[name]
+
+
+@pytest.fixture
+def fake_collection(mocker):
+    """Create a `FakeCollection`, returned by `get_motor_collection` of a document type if given.
+
+    Example:
+        ```python
+        statuses = fake_collection([{"_id": 1, "status": "idle"}], document_type=Status)
+        ```
+    """
+
+    def create(
+        documents: list[dict[str, Any]] | None = None,
+        *,
+        document_type: Any = None,
+        **kwargs: Any,
+    ) -> FakeCollection:
+        collection = FakeCollection(documents, **kwargs)
+        if document_type is not None:
+            mocker.patch.object(document_type, "get_motor_collection", return_value=collection)
+        return collection
+
+    return create
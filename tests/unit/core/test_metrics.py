@@ -0,0 +1,43 @@
+import math
+import urllib.error
+import urllib.request
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+from exp_coord.core.metrics import histogram_totals, start_metrics_server
+
+
+def test_histogram_totals():
+    registry = CollectorRegistry()
+    histogram = Histogram("duration_seconds", "Durations.", ["handler"], registry=registry)
+    histogram.labels(handler="status").observe(0.5)
+    histogram.labels(handler="status").observe(0.25)
+    histogram.labels(handler="image").observe(2)
+
+    assert histogram_totals(histogram) == {("status",): (2, 0.75), ("image",): (1, 2)}
+
+
+def test_histogram_observes_values_above_all_buckets():
+    registry = CollectorRegistry()
+    histogram = Histogram("duration_seconds", "Durations.", buckets=[0.1, 1], registry=registry)
+    histogram.observe(5)
+    histogram.observe(math.nan)  # Mustn't raise, e.g. for a clock that jumped
+
+    assert registry.get_sample_value("duration_seconds_bucket", {"le": "+Inf"}) == 1
+
+
+def test_metrics_server():
+    registry = CollectorRegistry()
+    Counter("received_total", "Received items.", registry=registry).inc()
+
+    server = start_metrics_server("127.0.0.1", 0, registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.status == 200
+            assert "received_total 1.0" in response.read().decode()
+    finally:
+        server.close()
+
+    with pytest.raises(urllib.error.URLError):
+        urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=1)
@@ -1,26 +1,54 @@
+from typing import Annotated
+
 from pydantic import TypeAdapter
 
-from exp_coord.core.utils import _get_type_adapter
+from exp_coord.core.utils import RecentIds, TypeAdapterRegistry
 
 
 def test_type_adapter_creation():
-    adapter = _get_type_adapter(int)
+    adapter = TypeAdapterRegistry().get(int)
     assert isinstance(adapter, TypeAdapter)
     assert adapter.validate_python(42) == 42
     assert adapter.dump_python(42) == 42
 
 
 def test_type_adapter_caching():
-    adapter1 = _get_type_adapter(int)
-    adapter2 = _get_type_adapter(int)
-    adapter3 = _get_type_adapter(str)
+    registry = TypeAdapterRegistry()
+    adapter1 = registry.get(int)
+    adapter2 = registry.get(int)
+    adapter3 = registry.get(str)
 
     assert adapter1 is adapter2  # Cached instance should be the same
     assert adapter1 is not adapter3  # Different types should have different instances
+    assert registry.get(list[int]) is registry.get(list[int])  # Equal, but not the same object
+    assert len(registry) == 3
+
+
+def test_unhashable_type():
+    registry = TypeAdapterRegistry()
+    unhashable = Annotated[int, {"unhashable": "metadata"}]
+
+    adapter = registry.get(unhashable)
+    assert adapter.validate_python(42) == 42
+    assert registry.get(unhashable) is adapter
 
 
 def test_print_logging(log_output):
-    _get_type_adapter(float)  # First call should log
-    _get_type_adapter(float)  # Cached call should not log again as it is cached
+    registry = TypeAdapterRegistry()
+    registry.get(float)  # First call should log
+    registry.get(float)  # Cached call should not log again as it is cached
 
     assert len(log_output.entries) == 1
+
+
+def test_recent_ids_forget_least_recently_seen():
+    recent = RecentIds(maxsize=2)
+    recent.update(["a", None, "b"])
+
+    assert "a" in recent  # Now seen more recently than "b"
+    recent.add("c")
+
+    assert "b" not in recent
+    assert "a" in recent
+    assert "c" in recent
+    assert len(recent) == 2
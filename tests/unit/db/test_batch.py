@@ -0,0 +1,133 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, ClassVar
+
+import pytest
+from beanie import PydanticObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from exp_coord.db.batch import BatchWriteError, BatchWriter
+
+
+@dataclass
+class FakeDocument:
+    """Stands in for a Beanie document, recording what would have been inserted."""
+
+    value: int
+    id: PydanticObjectId | None = None
+
+    batches: ClassVar[list[list["FakeDocument"]]] = []
+    error: ClassVar[Exception | None] = None
+
+    @classmethod
+    async def insert_many(cls, documents: list["FakeDocument"], **kwargs: Any) -> None:
+        assert kwargs == {"ordered": False}
+        cls.batches.append(list(documents))
+        if cls.error is not None:
+            raise cls.error
+
+
+@pytest.fixture(autouse=True)
+def reset_fake_document():
+    FakeDocument.batches = []
+    FakeDocument.error = None
+
+
+async def test_flush_on_size():
+    writer = BatchWriter(FakeDocument, max_batch_size=2, max_delay=60)  # pyright: ignore[reportArgumentType]
+    documents = [FakeDocument(value) for value in range(3)]
+    for document in documents:
+        writer.add(document)
+
+    await asyncio.sleep(0)  # Let the full batch be written
+    assert FakeDocument.batches == [documents[:2]]
+    assert all(document.id is not None for document in documents)
+
+    await writer.flush()
+    assert FakeDocument.batches == [documents[:2], documents[2:]]
+
+
+async def test_flush_after_batch_was_written():
+    writer = BatchWriter(FakeDocument, max_batch_size=1, max_delay=60)  # pyright: ignore[reportArgumentType]
+    writer.add(FakeDocument(1))
+
+    # The batch is written, but its done callback has not run yet
+    await asyncio.sleep(0)
+    assert len(FakeDocument.batches) == 1
+
+    await writer.flush()
+    assert len(FakeDocument.batches) == 1
+
+
+async def test_flush_on_delay():
+    writer = BatchWriter(FakeDocument, max_batch_size=100, max_delay=0.01)  # pyright: ignore[reportArgumentType]
+    writer.add(FakeDocument(1))
+
+    assert FakeDocument.batches == []
+    await asyncio.sleep(0.05)
+    assert [[document.value for document in batch] for batch in FakeDocument.batches] == [[1]]
+
+
+async def test_flush_reports_failed_documents():
+    FakeDocument.error = BulkWriteError(
+        {"writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"}]}
+    )
+    writer = BatchWriter(FakeDocument, max_batch_size=100, max_delay=60)  # pyright: ignore[reportArgumentType]
+    documents = [FakeDocument(value) for value in range(3)]
+    for document in documents:
+        writer.add(document)
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await writer.flush()
+
+    [error] = exc_info.value.exceptions
+    assert isinstance(error, BatchWriteError)
+    assert error.document is documents[1]
+    assert isinstance(error.error, DuplicateKeyError)
+
+    # The errors are only reported once
+    await writer.flush()
+
+
+async def test_flush_reports_failed_batch():
+    FakeDocument.error = ConnectionError("Connection lost")
+    writer = BatchWriter(FakeDocument, max_batch_size=100, max_delay=60)  # pyright: ignore[reportArgumentType]
+    writer.add(FakeDocument(1))
+    writer.add(FakeDocument(2))
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await writer.flush()
+
+    assert len(exc_info.value.exceptions) == 2
+
+
+async def test_ignore_duplicates_reports_written_documents():
+    FakeDocument.error = BulkWriteError(
+        {
+            "writeErrors": [
+                {"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error"},
+                {"index": 2, "code": 121, "errmsg": "Document failed validation"},
+            ]
+        }
+    )
+    written, inserted = [], []
+    writer = BatchWriter(
+        FakeDocument,  # pyright: ignore[reportArgumentType]
+        max_batch_size=100,
+        max_delay=60,
+        ignore_duplicates=True,
+        on_written=written.extend,
+        on_inserted=inserted.extend,
+    )
+    documents = [FakeDocument(value) for value in range(3)]
+    for document in documents:
+        writer.add(document)
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await writer.flush()
+
+    [error] = exc_info.value.exceptions
+    assert error.document is documents[2]
+    # The duplicate is already in the collection, so it counts as written
+    assert written == documents[:2]
+    assert inserted == documents[1:2]
@@ -0,0 +1,88 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from exp_coord.db.device import Device, DeviceRegistry
+
+KNOWN_ID = "s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3"
+NEW_ID = "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c"
+UNKNOWN_ID = "s3i:0e0e4d3f-5a5c-4ab4-b0ba-d2f0a1e1a1f4"
+
+
+def make_device(s3i_id: str) -> Device:
+    # Documents can't be instantiated without initializing beanie
+    return Device.model_construct(s3i_id=s3i_id, type="camera", rhizotron_num=1)
+
+
+@pytest.fixture
+def find_all(mocker):
+    query = MagicMock()
+    query.to_list = AsyncMock(return_value=[make_device(KNOWN_ID)])
+    return mocker.patch.object(Device, "find_all", return_value=query)
+
+
+@pytest.fixture
+def find_one(mocker):
+    async def find_one(query):
+        return make_device(NEW_ID) if query["s3i_id"] == NEW_ID else None
+
+    return mocker.patch.object(Device, "find_one", side_effect=find_one)
+
+
+async def test_lookups_are_served_from_memory(find_all, find_one):
+    registry = DeviceRegistry()
+
+    for _ in range(3):
+        assert (await registry.get(KNOWN_ID)).s3i_id == KNOWN_ID
+
+    find_all.assert_called_once()
+    find_one.assert_not_called()
+    assert registry.stats.hits == 3
+    assert registry.stats.reloads == 1
+
+
+async def test_new_device_is_queried_once(find_all, find_one):
+    registry = DeviceRegistry()
+
+    assert (await registry.get(NEW_ID)).s3i_id == NEW_ID
+    assert (await registry.get(NEW_ID)).s3i_id == NEW_ID
+
+    find_one.assert_called_once()
+    assert registry.stats.misses == 1
+    assert registry.stats.hits == 1
+
+
+async def test_unknown_device_is_negatively_cached(find_all, find_one):
+    registry = DeviceRegistry()
+
+    for _ in range(3):
+        with pytest.raises(ValueError, match="No device found"):
+            await registry.get(UNKNOWN_ID)
+
+    find_one.assert_called_once()
+    assert registry.stats.negative_hits == 2
+
+
+async def test_invalidate(find_all, find_one):
+    registry = DeviceRegistry()
+    await registry.get(KNOWN_ID)
+
+    registry.invalidate()
+    await registry.get(KNOWN_ID)
+    assert registry.stats.reloads == 2
+
+    with pytest.raises(ValueError):
+        await registry.get(UNKNOWN_ID)
+    registry.invalidate(UNKNOWN_ID)
+    with pytest.raises(ValueError):
+        await registry.get(UNKNOWN_ID)
+    assert find_one.call_count == 2
+
+
+async def test_reload_after_ttl(find_all, find_one):
+    registry = DeviceRegistry(ttl=0)
+
+    await registry.get(KNOWN_ID)
+    await registry.get(KNOWN_ID)
+
+    assert find_all.call_count == 2
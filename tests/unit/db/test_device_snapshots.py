@@ -0,0 +1,79 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from beanie import Link, PydanticObjectId
+from bson import DBRef
+
+from exp_coord.db.device import Device
+from exp_coord.db.device_snapshots import backfill_device_snapshots, resolve_device_links
+from exp_coord.db.image import Image
+from exp_coord.db.status import Status
+
+
+def make_device(rhizotron_num: int) -> Device:
+    # Documents can't be instantiated without initializing beanie
+    return Device.model_construct(
+        id=PydanticObjectId(),
+        name=f"camera_{rhizotron_num}",
+        s3i_id=f"s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0{rhizotron_num}",
+        rhizotron_num=rhizotron_num,
+        type="camera",
+    )
+
+
+def link(device_id: PydanticObjectId | None) -> Link[Device]:
+    return Link(DBRef("devices", device_id), Device)
+
+
+async def test_resolve_device_links_with_one_query(mocker):
+    devices = [make_device(1), make_device(2)]
+    query = MagicMock()
+    query.to_list = AsyncMock(return_value=devices)
+    find = mocker.patch.object(Device, "find", return_value=query)
+    missing = PydanticObjectId()
+    statuses = [Status.model_construct(device=link(devices[i % 2].id)) for i in range(10)]
+    images = [
+        Image.model_construct(device=link(devices[0].id)),
+        Image.model_construct(device=link(missing)),
+    ]
+
+    resolved = await resolve_device_links([*statuses, *images])
+
+    find.assert_called_once()
+    assert set(find.call_args.args[0]["_id"]["$in"]) == {devices[0].id, devices[1].id, missing}
+    assert resolved == {device.id: device for device in devices}
+    assert [status.device for status in statuses[:2]] == devices
+    assert images[0].device is devices[0]
+    assert isinstance(images[1].device, Link)
+
+
+async def test_backfill_updates_per_device_and_collection(mocker, fake_collection):
+    devices = [make_device(1), make_device(2)]
+    query = MagicMock()
+    query.to_list = AsyncMock(return_value=devices)
+    mocker.patch.object(Device, "find_all", return_value=query)
+    snapshot = {"s3i_id": devices[1].s3i_id}
+    statuses = fake_collection(
+        [
+            *({"device": {"$id": device.id}} for device in devices for _ in range(3)),
+            {"device": {"$id": devices[1].id}, "device_snapshot": snapshot},
+        ],
+        document_type=Status,
+        name="statuses",
+    )
+    images = fake_collection(
+        [{"device": {"$id": devices[0].id}, "device_snapshot": None}],
+        document_type=Image,
+        name="images",
+    )
+
+    assert await backfill_device_snapshots() == {"statuses": 6, "images": 1}
+    assert len(statuses.calls["update_many"]) == len(images.calls["update_many"]) == 2
+    filter_, update = images.calls["update_many"][0]
+    assert filter_ == {"device.$id": devices[0].id, "device_snapshot": None}
+    assert update["$set"]["device_snapshot"] == {
+        "s3i_id": devices[0].s3i_id,
+        "name": "camera_1",
+        "rhizotron_num": 1,
+        "type": "camera",
+    }
+    assert statuses.documents[-1]["device_snapshot"] is snapshot
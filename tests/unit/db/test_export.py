@@ -0,0 +1,103 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pyarrow.parquet as parquet
+import pytest
+from bson import DBRef, ObjectId
+
+from exp_coord.db.export import TABLES, export_table, load_watermarks
+from exp_coord.db.queries import TimeWindow
+from exp_coord.db.status import Status
+
+
+def _status(received: datetime) -> dict[str, Any]:
+    return {
+        "_id": ObjectId(),
+        "device": DBRef("devices", ObjectId()),
+        "device_snapshot": {"s3i_id": "s3i:device"},
+        "status": "idle",
+        "detail": "",
+        "sent_timestamp": received - timedelta(seconds=1),
+        "received_timestamp": received,
+    }
+
+
+def test_rows_match_the_columns():
+    status = _status(datetime(2025, 4, 6))
+    event = {
+        "_id": ObjectId(),
+        "added_at": datetime(2025, 4, 6),
+        "data": {
+            "messageType": "eventMessage",
+            "identifier": "s3i:id",
+            "sender": "s3i:device",
+            "topic": "s3i:device.status",
+            "timestamp": 1743897600,
+            "content": {"status": "error"},
+        },
+    }
+    image = {
+        "_id": ObjectId(),
+        "device": DBRef("devices", ObjectId()),
+        "taken_at": datetime(2025, 4, 6),
+    }
+
+    for table, document in (
+        ("statuses", status),
+        ("messages_and_events", event),
+        ("images", image),
+    ):
+        row = TABLES[table].to_row(document)
+        assert list(row) == list(TABLES[table].columns)
+    assert TABLES["statuses"].to_row(status)["device_id"] == str(status["device"].id)
+    assert TABLES["messages_and_events"].to_row(event)["status"] == "error"
+    assert TABLES["images"].to_row(image)["device_s3i_id"] is None
+
+
+def test_no_watermarks(tmp_path: Path):
+    assert load_watermarks(tmp_path) == {}
+
+
+async def test_export_requires_pyarrow(tmp_path: Path, mocker):
+    # Imports of modules set to None fail, as if pyarrow wasn't installed
+    mocker.patch.dict(sys.modules, {"pyarrow": None, "pyarrow.parquet": None})
+
+    with pytest.raises(ImportError, match="exp-coord\\[export\\]"):
+        await export_table("statuses", tmp_path)
+
+
+async def test_incremental_export(tmp_path: Path, fake_collection):
+    documents = [_status(datetime(2025, 4, day, hour)) for day in (6, 7) for hour in (1, 2)]
+    collection = fake_collection(documents, document_type=Status)
+    window = TimeWindow(datetime(2025, 4, 1), datetime(2025, 5, 1))
+
+    files = await export_table("statuses", tmp_path, window=window, incremental=True, batch_size=1)
+
+    assert sorted(path.parent.name for path in files) == ["date=2025-04-06", "date=2025-04-07"]
+    assert not list(tmp_path.rglob(".part-*"))
+    table = parquet.read_table(tmp_path / "statuses" / "date=2025-04-06")
+    assert table.column("id").to_pylist() == [str(d["_id"]) for d in documents[:2]]
+    assert collection.calls["find"][0][0] == window.match("received_timestamp")
+    assert load_watermarks(tmp_path) == {"statuses": str(documents[-1]["_id"])}
+
+    documents.append(_status(datetime(2025, 4, 7, 3)))
+    files = await export_table("statuses", tmp_path, incremental=True)
+
+    assert [path.parent.name for path in files] == ["date=2025-04-07"]
+    assert parquet.read_metadata(files[0]).num_rows == 1
+    assert collection.calls["find"][1][0] == {"_id": {"$gt": documents[-2]["_id"]}}
+
+
+async def test_failed_export_leaves_no_files(tmp_path: Path, fake_collection):
+    documents = [_status(datetime(2025, 4, 6, hour)) for hour in range(4)]
+    # Fails after the first rows were written, as it lacks the time field
+    documents.insert(2, {"_id": ObjectId()})
+    fake_collection(documents, document_type=Status)
+
+    with pytest.raises(KeyError):
+        await export_table("statuses", tmp_path, incremental=True, batch_size=1)
+
+    assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+    assert load_watermarks(tmp_path) == {}
@@ -0,0 +1,123 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+from bson import ObjectId
+
+from exp_coord.db import image_download
+from exp_coord.db.image_download import download_images
+from exp_coord.db.queries import TimeWindow
+
+
+class FakeStream:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+class FakeBucket:
+    def __init__(self, contents: dict[ObjectId, bytes]) -> None:
+        self.contents = contents
+        self.downloaded: list[ObjectId] = []
+
+    async def open_download_stream(self, file_id: ObjectId) -> FakeStream:
+        self.downloaded.append(file_id)
+        return FakeStream(self.contents[file_id])
+
+
+def _file(filename: str, data: bytes) -> dict[str, Any]:
+    return {
+        "_id": ObjectId(),
+        "filename": filename,
+        "length": len(data),
+        "metadata": {
+            "from_collection": "images",
+            "from_id": str(ObjectId()),
+            "taken_at": datetime(2025, 4, 6),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        },
+    }
+
+
+@pytest.fixture
+def gridfs(mocker, fake_collection):
+    contents = {}
+    files = []
+    for index in range(5):
+        data = f"image {index}".encode()
+        file = _file(f"s3i:device-2025-04-06T00:0{index}:00.jpg", data)
+        files.append(file)
+        contents[file["_id"]] = data
+    bucket = FakeBucket(contents)
+    collection = fake_collection(files, name="images.files")
+    mocker.patch.object(image_download, "create_grid_fs_client", return_value=bucket)
+    mocker.patch.object(image_download, "get_db", return_value={"images.files": collection})
+    mocker.patch.object(
+        image_download.get_settings().mongodb.collection_names, "image_gridfs", "images"
+    )
+    return bucket, collection
+
+
+async def test_download_images(tmp_path: Path, gridfs):
+    bucket, collection = gridfs
+
+    result = await download_images(tmp_path, concurrency=2)
+
+    assert (result.total, result.downloaded, result.skipped, result.failed) == (5, 5, 0, 0)
+    assert result.bytes_downloaded == sum(len(data) for data in bucket.contents.values())
+    for file in collection.documents:
+        path = tmp_path / file["filename"].replace(":", "_")
+        assert path.read_bytes() == bucket.contents[file["_id"]]
+    assert not list(tmp_path.glob("*.partial"))
+    assert set(json.loads((tmp_path / "metadata.json").read_text())) == {
+        file["filename"] for file in collection.documents
+    }
+
+
+async def test_download_skips_present_files(tmp_path: Path, gridfs):
+    bucket, collection = gridfs
+    await download_images(tmp_path)
+    bucket.downloaded.clear()
+    changed, truncated = collection.documents[:2]
+    # Same length, different content: only noticed when verifying
+    (tmp_path / changed["filename"].replace(":", "_")).write_bytes(b"x" * changed["length"])
+    (tmp_path / truncated["filename"].replace(":", "_")).write_bytes(b"x")
+
+    result = await download_images(tmp_path)
+    assert bucket.downloaded == [truncated["_id"]]
+    assert (result.downloaded, result.skipped) == (1, 4)
+
+    bucket.downloaded.clear()
+    result = await download_images(tmp_path, verify=True)
+    assert bucket.downloaded == [changed["_id"]]
+    assert (result.downloaded, result.skipped) == (1, 4)
+
+
+async def test_download_continues_after_failures(tmp_path: Path, gridfs):
+    bucket, collection = gridfs
+    del bucket.contents[collection.documents[0]["_id"]]
+
+    result = await download_images(tmp_path)
+
+    assert (result.downloaded, result.failed) == (4, 1)
+
+
+async def test_download_filters(tmp_path: Path, gridfs):
+    _, collection = gridfs
+    window = TimeWindow(datetime(2025, 4, 6), datetime(2025, 4, 7))
+
+    await download_images(tmp_path, device_s3i_id="s3i:device", window=window)
+
+    query = {"filename": {"$regex": "^s3i:device-"}, **window.match("metadata.taken_at")}
+    assert collection.calls["count_documents"] == [query]
+    assert [query for query, _ in collection.calls["find"]] == [query]
+
+
+async def test_download_requires_a_worker(tmp_path: Path):
+    with pytest.raises(ValueError, match="concurrency"):
+        await download_images(tmp_path, concurrency=0)
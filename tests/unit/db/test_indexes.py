@@ -0,0 +1,97 @@
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import pytest
+from pymongo import ASCENDING, IndexModel
+
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.device import Device
+from exp_coord.db.image import Image
+from exp_coord.db.indexes import sync_indexes
+from exp_coord.db.status import Status
+
+
+def _index_stats(collection) -> Callable[[list[dict[str, Any]]], list[dict[str, Any]]]:
+    """Answer the `$indexStats` and `$collStats` aggregations from the indexes of the collection."""
+
+    def results(pipeline: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        if "$indexStats" in pipeline[0]:
+            return [
+                {"name": name, "accesses": {"ops": 3, "since": datetime(2025, 1, 1)}}
+                for name in collection.indexes
+            ]
+        return [{"storageStats": {"indexSizes": dict.fromkeys(collection.indexes, 4096)}}]
+
+    return results
+
+
+@pytest.fixture
+def devices(fake_collection) -> Callable[..., Any]:
+    """Create a fake devices model with the declared indexes, over a collection with `existing`."""
+
+    def create(existing: dict[str, list[tuple[str, int]]], declared: list[IndexModel]) -> Any:
+        collection = fake_collection(name="devices", indexes=existing)
+        collection.aggregate_results = _index_stats(collection)
+        settings = SimpleNamespace(indexes=declared)
+        return SimpleNamespace(
+            collection=collection,
+            get_motor_collection=lambda: collection,
+            get_settings=lambda: settings,
+        )
+
+    return create
+
+
+def _declared(model) -> set[str]:
+    return {index.document["name"] for index in model.Settings.indexes}
+
+
+def test_documents_declare_indexes():
+    assert _declared(Device) == {"s3i_id_unique"}
+    assert Device.Settings.indexes[0].document["unique"]
+    assert _declared(Status) == {
+        "device_received_timestamp",
+        "received_timestamp",
+        "identifier_unique",
+    }
+    assert _declared(Image) == {"device_taken_at", "taken_at", "identifier_unique"}
+    assert _declared(AllMessagesAndEvents) == {
+        "added_at",
+        "data_topic",
+        "data_message_type",
+        "identifier_unique",
+    }
+
+
+async def test_sync_creates_declared_and_keeps_undeclared(devices):
+    model = devices(
+        {"name_1": [("name", ASCENDING)]},
+        [IndexModel([("s3i_id", ASCENDING)], name="s3i_id_unique")],
+    )
+
+    reports = await sync_indexes([model])
+
+    assert {report.name: report.state for report in reports} == {
+        "_id_": "declared",
+        "name_1": "undeclared",
+        "s3i_id_unique": "created",
+    }
+    assert all(report.size_bytes == 4096 and report.accesses == 3 for report in reports)
+    assert "name_1" in model.collection.indexes
+
+
+async def test_sync_drops_undeclared(devices):
+    model = devices(
+        {"name_1": [("name", ASCENDING)], "s3i_id_unique": [("s3i_id", ASCENDING)]},
+        [IndexModel([("s3i_id", ASCENDING)], name="s3i_id_unique")],
+    )
+
+    reports = await sync_indexes([model], drop_undeclared=True)
+
+    assert {report.name: report.state for report in reports} == {
+        "_id_": "declared",
+        "s3i_id_unique": "declared",
+        "name_1": "dropped",
+    }
+    assert set(model.collection.indexes) == {"_id_", "s3i_id_unique"}
@@ -0,0 +1,128 @@
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from exp_coord.db import orphans
+from exp_coord.db.image import Image
+from exp_coord.db.orphans import _relink_images_without_file, sweep_orphaned_image_files
+
+DEVICE_ID = "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c"
+
+
+def _file(age: timedelta = timedelta(hours=1), **metadata: Any) -> dict[str, Any]:
+    return {
+        "_id": ObjectId(),
+        "uploadDate": datetime.now(UTC) - age,
+        "metadata": {
+            "from_id": ObjectId(),
+            "device_id": ObjectId(),
+            "taken_at": datetime(2025, 4, 6),
+            "identifier": "s3i:event",
+            "device_snapshot": {"s3i_id": DEVICE_ID, "type": "camera"},
+            **metadata,
+        },
+    }
+
+
+@pytest.fixture
+def gridfs(mocker, fake_collection):
+    """The files collection and the bucket, with the image records in `gridfs.images`."""
+    files = fake_collection(name="images.files")
+    bucket = SimpleNamespace(delete=mocker.AsyncMock())
+    image_type = mocker.patch.object(orphans, "Image")
+    image_type.return_value.insert = mocker.AsyncMock()
+    images = fake_collection()
+    image_type.get_motor_collection.return_value = images
+    mocker.patch.object(orphans.Device, "link_from_id")
+    mocker.patch.object(orphans, "create_grid_fs_client", return_value=bucket)
+    mocker.patch.object(
+        orphans,
+        "get_db",
+        return_value={
+            f"{orphans.get_settings().mongodb.collection_names.image_gridfs}.files": files
+        },
+    )
+    return SimpleNamespace(files=files, bucket=bucket, image_type=image_type, images=images)
+
+
+async def test_restores_the_record_with_identifier_and_snapshot(gridfs):
+    file = _file()
+    gridfs.files.documents.append(file)
+
+    result = await sweep_orphaned_image_files()
+
+    assert result.restored == 1
+    kwargs = gridfs.image_type.call_args.kwargs
+    assert (kwargs["id"], kwargs["file_id"]) == (file["metadata"]["from_id"], file["_id"])
+    assert kwargs["identifier"] == "s3i:event"
+    assert kwargs["device_snapshot"].s3i_id == DEVICE_ID
+    gridfs.image_type.return_value.insert.assert_awaited_once()
+
+
+async def test_skips_files_with_a_record(gridfs):
+    file = _file()
+    gridfs.files.documents.append(file)
+    gridfs.images.documents.append({"_id": file["metadata"]["from_id"], "file_id": file["_id"]})
+
+    result = await sweep_orphaned_image_files()
+
+    assert (result.restored, result.unrecoverable) == (0, 0)
+    gridfs.image_type.assert_not_called()
+
+
+async def test_skips_files_within_the_grace_period(gridfs):
+    gridfs.files.documents.append(_file(age=timedelta(minutes=1)))
+
+    result = await sweep_orphaned_image_files(grace_period=timedelta(minutes=10))
+
+    assert result.restored == 0
+    gridfs.image_type.assert_not_called()
+    [(query, _)] = gridfs.files.calls["find"][:1]
+    assert query["uploadDate"]["$lt"].tzinfo is not None
+
+
+async def test_reports_unrecoverable_files(gridfs):
+    gridfs.files.documents.append(_file(taken_at=None))
+
+    result = await sweep_orphaned_image_files()
+
+    assert (result.unrecoverable, result.deleted) == (1, 0)
+    gridfs.bucket.delete.assert_not_awaited()
+
+
+async def test_deletes_unrecoverable_files(gridfs):
+    file = _file(device_id=None)
+    gridfs.files.documents.append(file)
+
+    result = await sweep_orphaned_image_files(delete_unrecoverable=True)
+
+    assert (result.unrecoverable, result.deleted) == (1, 1)
+    gridfs.bucket.delete.assert_awaited_once_with(file["_id"])
+
+
+async def test_deletes_files_of_events_stored_again(gridfs):
+    file = _file()
+    gridfs.files.documents.append(file)
+    gridfs.image_type.return_value.insert.side_effect = DuplicateKeyError("identifier")
+
+    result = await sweep_orphaned_image_files()
+
+    assert (result.restored, result.duplicates) == (0, 1)
+    gridfs.bucket.delete.assert_awaited_once_with(file["_id"])
+
+
+async def test_only_modified_images_are_counted_as_relinked(fake_collection):
+    image_id = ObjectId()
+    images = fake_collection([{"_id": image_id, "file_id": None}], document_type=Image)
+    # Two files of the same image, only the first one is linked
+    files = fake_collection(
+        [{"_id": ObjectId(), "metadata": {"from_id": image_id}} for _ in range(2)]
+    )
+
+    assert await _relink_images_without_file(files) == 1
+    assert images.documents[0]["file_id"] == files.documents[0]["_id"]
+    assert len(images.calls["update_one"]) == 2
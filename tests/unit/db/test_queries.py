@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+from bson import DBRef, ObjectId
+
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.image import Image
+from exp_coord.db.queries import (
+    TimeWindow,
+    count_by,
+    stream_messages_and_events,
+    stream_statuses,
+    time_histogram,
+)
+from exp_coord.db.status import Status
+
+WINDOW = TimeWindow(datetime(2025, 4, 6), datetime(2025, 4, 12))
+
+
+def test_window_must_not_end_before_start():
+    with pytest.raises(ValueError):
+        TimeWindow(datetime(2025, 4, 12), datetime(2025, 4, 6))
+
+
+async def test_stream_statuses_projects_rows(fake_collection):
+    device_id = ObjectId()
+    status = {
+        "_id": ObjectId(),
+        "device": DBRef("devices", device_id),
+        "device_snapshot": {"s3i_id": "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c"},
+        "status": "error",
+        "sent_timestamp": datetime(2025, 4, 7),
+        "received_timestamp": datetime(2025, 4, 7, 0, 0, 1),
+    }
+    statuses = fake_collection([status], document_type=Status)
+
+    rows = [row async for row in stream_statuses(WINDOW, status="error", batch_size=50)]
+
+    assert [(row.device_id, row.device_s3i_id, row.detail) for row in rows] == [
+        (device_id, "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c", "")
+    ]
+    [(query, projection)] = statuses.calls["find"]
+    assert query == {
+        "received_timestamp": {"$gte": WINDOW.start, "$lt": WINDOW.end},
+        "status": "error",
+    }
+    assert "status_error_text" not in projection
+    assert statuses.calls["batch_size"] == [50]
+
+
+async def test_stream_messages_and_events_only_requests_content_fields(fake_collection):
+    messages = fake_collection(document_type=AllMessagesAndEvents)
+
+    async for _ in stream_messages_and_events(WINDOW, topic="status", content_fields=["status"]):
+        pass
+
+    [(query, projection)] = messages.calls["find"]
+    assert query["data.topic"] == "status"
+    assert projection["data.content.status"] == 1
+    assert "data.content" not in projection
+    assert messages.calls["sort"] == [("added_at", 1)]
+
+
+async def test_count_by(fake_collection):
+    messages = fake_collection(
+        document_type=AllMessagesAndEvents, aggregate_results=[{"_id": "status", "count": 3}]
+    )
+
+    assert await count_by(AllMessagesAndEvents, WINDOW, "data.topic") == {"status": 3}
+    assert messages.calls["aggregate"][0][1] == {
+        "$group": {"_id": "$data.topic", "count": {"$sum": 1}}
+    }
+
+
+async def test_time_histogram_bins_on_the_server(fake_collection):
+    start = datetime(2025, 4, 6, 12)
+    images = fake_collection(
+        document_type=Image, aggregate_results=[{"_id": {"start": start, "key": "a"}, "count": 2}]
+    )
+
+    bins = await time_histogram(Image, WINDOW, unit="minute", bin_size=15, key="device.$id")
+
+    assert [(bin_.start, bin_.key, bin_.count) for bin_ in bins] == [(start, "a", 2)]
+    [(match, group, _)] = images.calls["aggregate"]
+    assert match == {"$match": {"taken_at": {"$gte": WINDOW.start, "$lt": WINDOW.end}}}
+    assert group["$group"]["_id"]["start"] == {
+        "$dateTrunc": {"date": "$taken_at", "unit": "minute", "binSize": 15}
+    }
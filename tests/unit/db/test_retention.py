@@ -0,0 +1,78 @@
+import gzip
+from datetime import date, datetime
+from typing import Any
+
+import pytest
+from bson import ObjectId, json_util
+
+from exp_coord.core.config import get_settings
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.retention import archive_messages_and_events, restore_messages_and_events
+
+
+def _document(day: int, hour: int) -> dict[str, Any]:
+    return {
+        "_id": ObjectId(),
+        "data": {"topic": "status", "payload": "x" * 10},
+        "added_at": datetime(2025, 4, day, hour),
+    }
+
+
+@pytest.fixture
+def collection(monkeypatch: pytest.MonkeyPatch, tmp_path, fake_collection):
+    retention = get_settings().mongodb.retention
+    monkeypatch.setattr(retention, "archive_dir", tmp_path)
+    monkeypatch.setattr(retention, "batch_size", 2)
+    documents = [_document(6, 1), _document(6, 2), _document(6, 3), _document(7, 1)]
+    return fake_collection(
+        [*documents, _document(20, 1)],
+        document_type=AllMessagesAndEvents,
+        name="all_messages_and_events",
+    )
+
+
+async def test_archive_partitions_by_day_and_batch(collection, tmp_path):
+    result = await archive_messages_and_events(datetime(2025, 4, 10))
+
+    assert result.archived == 4
+    assert [(path.parent.name, path.suffix) for path in result.files] == [
+        ("2025-04-06", ".gz"),
+        ("2025-04-06", ".gz"),
+        ("2025-04-07", ".gz"),
+    ]
+    assert all(path.parent.parent == tmp_path / collection.name for path in result.files)
+    assert [d["added_at"].day for d in collection.documents] == [20]
+
+    with gzip.open(result.files[0], "rt") as f:
+        archived = [json_util.loads(line) for line in f]
+    assert [d["added_at"] for d in archived] == [datetime(2025, 4, 6, 1), datetime(2025, 4, 6, 2)]
+    assert isinstance(archived[0]["_id"], ObjectId)
+
+
+async def test_restore_date_range_skips_existing(collection):
+    before = sorted(collection.documents, key=lambda d: d["_id"])
+    await archive_messages_and_events(datetime(2025, 4, 10))
+
+    assert await restore_messages_and_events(date(2025, 4, 6), date(2025, 4, 6)) == 3
+    assert await restore_messages_and_events(date(2025, 4, 1), date(2025, 4, 30)) == 1
+    assert sorted(collection.documents, key=lambda d: d["_id"]) == before
+
+
+async def test_failed_archive_keeps_the_batch(collection, tmp_path):
+    # Fails while writing the second batch, as it can't be serialized
+    collection.documents[2]["data"]["payload"] = object()
+
+    with pytest.raises(TypeError):
+        await archive_messages_and_events(datetime(2025, 4, 10))
+
+    files = [path for path in tmp_path.rglob("*") if path.is_file()]
+    assert [path.name.endswith(".jsonl.gz") for path in files] == [True]
+    assert len(collection.documents) == 3
+
+
+async def test_restore_inserts_in_chunks(collection, monkeypatch: pytest.MonkeyPatch):
+    await archive_messages_and_events(datetime(2025, 4, 10))
+    monkeypatch.setattr(get_settings().mongodb.retention, "batch_size", 1)
+
+    assert await restore_messages_and_events(date(2025, 4, 1), date(2025, 4, 30)) == 4
+    assert [len(documents) for documents in collection.calls["insert_many"]] == [1, 1, 1, 1]
@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import Any
+
+import pytest
+from pymongo import UpdateOne
+
+from exp_coord.core.config import get_settings
+from exp_coord.db.all_messages_and_events import AllMessagesAndEvents
+from exp_coord.db.queries import TimeWindow
+from exp_coord.db.rollups import (
+    HourlyMessageCount,
+    HourlyStatusCount,
+    RollupCounter,
+    count_messages_by,
+)
+from exp_coord.services.s3i import S3IEvent
+
+SENDER = "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c"
+
+
+@pytest.fixture
+def collections(fake_collection) -> dict[type, Any]:
+    return {
+        document_type: fake_collection(document_type=document_type)
+        for document_type in (HourlyMessageCount, HourlyStatusCount)
+    }
+
+
+def _status_event(minute: int, status: str) -> AllMessagesAndEvents:
+    event = S3IEvent(
+        sender=SENDER,
+        identifier=f"s3i:{minute}",
+        timestamp=0,
+        topic=get_settings().s3i.topics.status,
+        content={"type": "status", "status": status},
+    )
+    # Documents can't be instantiated without initializing beanie
+    return AllMessagesAndEvents.model_construct(
+        data=event, added_at=datetime(2025, 4, 6, 12, minute)
+    )
+
+
+async def test_counts_are_incremented_per_hour(collections):
+    counter = RollupCounter()
+    counter.add([_status_event(1, "idle"), _status_event(2, "idle"), _status_event(3, "error")])
+
+    await counter.flush()
+
+    hour = datetime(2025, 4, 6, 12)
+    topic = get_settings().s3i.topics.status
+    [message_requests] = collections[HourlyMessageCount].calls["bulk_write"]
+    [status_requests] = collections[HourlyStatusCount].calls["bulk_write"]
+    assert message_requests == [
+        UpdateOne(
+            {"hour": hour, "message_type": "eventMessage", "topic": topic, "sender": SENDER},
+            {"$inc": {"total": 3}},
+            upsert=True,
+        )
+    ]
+    assert status_requests == [
+        UpdateOne(
+            {"hour": hour, "device_s3i_id": SENDER, "status": status},
+            {"$inc": {"total": total}},
+            upsert=True,
+        )
+        for status, total in (("idle", 2), ("error", 1))
+    ]
+
+    # The counts are only written once
+    await counter.flush()
+    assert len(collections[HourlyMessageCount].calls["bulk_write"]) == 1
+
+
+async def test_count_messages_by_sums_rollups(collections):
+    collections[HourlyMessageCount].aggregate_results = [{"_id": "status", "total": 7}]
+    window = TimeWindow(datetime(2025, 4, 6), datetime(2025, 4, 7))
+
+    assert await count_messages_by("topic", window) == {"status": 7}
+    assert collections[HourlyMessageCount].calls["aggregate"][0][:2] == [
+        {"$match": {"hour": {"$gte": window.start, "$lt": window.end}}},
+        {"$group": {"_id": "$topic", "total": {"$sum": "$total"}}},
+    ]
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from beanie import PydanticObjectId, TimeSeriesConfig
+
+from exp_coord.db.status import (
+    Status,
+    StatusTimelineEntry,
+    get_status_timeline,
+    migrate_statuses_to_time_series,
+)
+
+
+@pytest.fixture
+def collections(monkeypatch: pytest.MonkeyPatch, fake_collection):
+    source = fake_collection([{"_id": i, "status": "fetch"} for i in range(5)], name="statuses")
+    migrations = fake_collection(name="migrations")
+    target = fake_collection(
+        document_type=Status,
+        name="statuses_timeseries",
+        database={"statuses": source, "migrations": migrations},
+    )
+    monkeypatch.setattr(
+        Status.Settings,
+        "timeseries",
+        TimeSeriesConfig(time_field="sent_timestamp", meta_field="device"),
+        raising=False,
+    )
+    return source, target
+
+
+async def test_migrate_statuses_in_batches(collections):
+    source, target = collections
+
+    assert await migrate_statuses_to_time_series(batch_size=2) == 5
+    assert [len(documents) for documents in target.calls["insert_many"]] == [2, 2, 1]
+    assert target.documents == source.documents
+
+
+async def test_migrate_statuses_resumes_after_last_copied(collections):
+    source, target = collections
+    target.documents.extend(source.documents[:3])
+    target.database["migrations"].documents.append({"_id": "statuses_to_time_series", "last_id": 2})
+
+    assert await migrate_statuses_to_time_series() == 2
+    assert [d["_id"] for d in target.documents] == [0, 1, 2, 3, 4]
+
+
+async def test_migrate_statuses_ignores_live_statuses(collections):
+    source, target = collections
+    # Stored by the ingestion after the time-series collection was enabled
+    target.documents.append({"_id": 100, "status": "idle"})
+
+    assert await migrate_statuses_to_time_series(batch_size=2) == 5
+    assert sorted(d["_id"] for d in target.documents) == [0, 1, 2, 3, 4, 100]
+    assert target.database["migrations"].documents == [
+        {"_id": "statuses_to_time_series", "last_id": 4}
+    ]
+
+
+async def test_migrate_statuses_skips_batch_copied_before_interruption(collections):
+    source, target = collections
+    # The batch after the saved ID was inserted, but the ID wasn't saved anymore
+    target.documents.extend(source.documents[:4])
+    target.database["migrations"].documents.append({"_id": "statuses_to_time_series", "last_id": 1})
+
+    assert await migrate_statuses_to_time_series(batch_size=2) == 1
+    assert [d["_id"] for d in target.documents] == [0, 1, 2, 3, 4]
+
+
+async def test_migrate_statuses_requires_time_series(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(Status.Settings, "timeseries", None, raising=False)
+    with pytest.raises(RuntimeError):
+        await migrate_statuses_to_time_series()
+
+
+async def test_status_timeline_filters_on_device_and_sent_timestamp(mocker):
+    entries = [StatusTimelineEntry(status="fetch", sent_timestamp=datetime(2025, 4, 6))]
+    find = mocker.patch.object(Status, "find")
+    find.return_value.sort.return_value.project.return_value.to_list = mocker.AsyncMock(
+        return_value=entries
+    )
+    device_id = PydanticObjectId()
+    start, end = datetime(2025, 4, 6), datetime(2025, 4, 12)
+
+    assert await get_status_timeline(device_id, start, end, status="fetch") == entries
+    find.assert_called_once_with(
+        {
+            "device.$id": device_id,
+            "sent_timestamp": {"$gte": start, "$lt": end},
+            "status": "fetch",
+        }
+    )
+    find.return_value.sort.return_value.project.assert_called_once_with(StatusTimelineEntry)
@@ -0,0 +1,102 @@
+import base64
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from exp_coord.core.config import get_settings
+from exp_coord.core.utils import RecentIds
+from exp_coord.handlers import new_image
+from exp_coord.handlers.new_image import handle_new_image_event, pop_stored_image
+from exp_coord.services.s3i import S3IEvent
+
+DEVICE_ID = "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c"
+IMAGE = b"\xff\xd8" + bytes(range(256)) + b"\xff"
+
+
+def _event(identifier: str, image: str) -> S3IEvent:
+    content = {
+        "type": "image/jpeg; encoding=base64url",
+        "path": "/tmp/image.jpg",
+        "takenAt": 1743900000,
+        "image": image,
+    }
+    return S3IEvent(
+        sender=DEVICE_ID,
+        identifier=identifier,
+        timestamp=0,
+        topic=get_settings().s3i.topics.new_image,
+        content=content,
+    )
+
+
+@pytest.fixture
+def file_id(mocker) -> ObjectId:
+    file_id = ObjectId()
+    mocker.patch.object(new_image, "_recent", RecentIds(maxsize=10))
+    device = SimpleNamespace(
+        id=ObjectId(), s3i_id=DEVICE_ID, name="Camera", rhizotron_num=1, type="camera"
+    )
+    mocker.patch.object(new_image, "get_device_by_s3i_id", mocker.AsyncMock(return_value=device))
+    mocker.patch.object(new_image, "upload_to_gridfs", mocker.AsyncMock(return_value=file_id))
+    mocker.patch.object(new_image, "delete_from_gridfs", mocker.AsyncMock())
+    image_type = mocker.patch.object(new_image, "Image")
+    image_type.find_one = mocker.AsyncMock(return_value=None)
+    image_type.return_value.insert = mocker.AsyncMock()
+    return file_id
+
+
+async def test_stored_image_is_remembered(file_id: ObjectId):
+    await handle_new_image_event(_event("stored", base64.urlsafe_b64encode(IMAGE).decode()))
+
+    [(_, _, metadata), _] = new_image.upload_to_gridfs.await_args
+    assert (metadata.identifier, metadata.device_snapshot.s3i_id) == ("stored", DEVICE_ID)
+    stored = pop_stored_image("stored")
+    assert stored is not None
+    assert (stored.file_id, stored.size) == (file_id, len(IMAGE))
+    assert pop_stored_image("stored") is None
+
+
+async def test_non_canonical_payload_is_not_remembered(file_id: ObjectId):
+    # The standard alphabet is decoded too, but can't be restored from the reference
+    await handle_new_image_event(_event("standard", base64.b64encode(IMAGE).decode()))
+
+    assert pop_stored_image("standard") is None
+
+
+async def test_image_stored_before_a_restart_is_not_uploaded(file_id: ObjectId):
+    # The recent identifiers are empty, as after a restart, but the image record exists
+    new_image.Image.find_one.return_value = new_image.Image.return_value
+    event = _event("restarted", base64.urlsafe_b64encode(IMAGE).decode())
+
+    await handle_new_image_event(event)
+
+    new_image.upload_to_gridfs.assert_not_awaited()
+    new_image.delete_from_gridfs.assert_not_awaited()
+    assert pop_stored_image("restarted") is None
+    # Now known, so a further redelivery is skipped without a query
+    await handle_new_image_event(event)
+    new_image.Image.find_one.assert_awaited_once()
+
+
+async def test_concurrently_stored_image_is_not_remembered(file_id: ObjectId):
+    new_image.Image.return_value.insert.side_effect = DuplicateKeyError("duplicate")
+    event = _event("duplicate", base64.urlsafe_b64encode(IMAGE).decode())
+
+    await handle_new_image_event(event)
+    await handle_new_image_event(event)
+
+    assert pop_stored_image("duplicate") is None
+    new_image.delete_from_gridfs.assert_awaited_once()
+    # The redelivery is skipped by the recent identifiers, without uploading again
+    new_image.upload_to_gridfs.assert_awaited_once()
+
+
+async def test_failed_upload_is_not_remembered(file_id: ObjectId):
+    new_image.upload_to_gridfs.side_effect = RuntimeError("upload failed")
+
+    with pytest.raises(RuntimeError):
+        await handle_new_image_event(_event("failed", base64.urlsafe_b64encode(IMAGE).decode()))
+
+    assert pop_stored_image("failed") is None
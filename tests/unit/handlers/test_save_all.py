@@ -0,0 +1,120 @@
+import base64
+import hashlib
+
+import pytest
+from beanie import PydanticObjectId
+
+from exp_coord.core.config import get_settings
+from exp_coord.core.utils import RecentIds
+from exp_coord.handlers import save_all
+from exp_coord.handlers.new_image import StoredImage
+from exp_coord.handlers.save_all import ImagePayloadReference, reference_image_payload
+from exp_coord.services.s3i import S3IEvent
+
+# Not a multiple of 3 bytes, so the encoding is padded
+IMAGE = b"\xff\xd8" + bytes(range(256)) * 64 + b"\xff"
+SENDER = "s3i:4eadfd01-0eef-4567-ab01-0d6add9c9a0c"
+
+
+def _event(topic: str, content) -> S3IEvent:
+    return S3IEvent(sender=SENDER, identifier="1", timestamp=0, topic=topic, content=content)
+
+
+def _new_image_event(image: str) -> S3IEvent:
+    content = {
+        "type": "image/jpeg; encoding=base64url",
+        "path": "/tmp/image.jpg",
+        "takenAt": 1743900000,
+        "image": image,
+    }
+    return _event(get_settings().s3i.topics.new_image, content)
+
+
+def _stored() -> StoredImage:
+    return StoredImage(PydanticObjectId(), hashlib.sha256(IMAGE).hexdigest(), len(IMAGE))
+
+
+def test_stored_image_is_replaced_by_reference():
+    event = _new_image_event(base64.urlsafe_b64encode(IMAGE).decode())
+    stored = _stored()
+
+    referenced = reference_image_payload(event, stored)
+
+    reference = ImagePayloadReference.model_validate(referenced.content["image"])
+    assert reference.file_id == stored.file_id
+    assert reference.sha256 == stored.sha256
+    assert reference.size == len(IMAGE)
+    assert referenced.content["takenAt"] == 1743900000
+    # The event handled by the other handlers keeps its image
+    assert isinstance(event.content["image"], str)
+
+
+def test_image_not_stored_is_kept():
+    event = _new_image_event(base64.urlsafe_b64encode(IMAGE).decode())
+
+    assert reference_image_payload(event, None) is event
+
+
+async def test_reference_resolves_to_payload(mocker):
+    payload = base64.urlsafe_b64encode(IMAGE).decode()
+    stored = _stored()
+    referenced = reference_image_payload(_new_image_event(payload), stored)
+    stream = mocker.AsyncMock()
+    stream.read.return_value = IMAGE
+    bucket = mocker.patch("exp_coord.handlers.save_all.create_grid_fs_client").return_value
+    bucket.open_download_stream = mocker.AsyncMock(return_value=stream)
+
+    resolved = await ImagePayloadReference.model_validate(referenced.content["image"]).resolve()
+
+    assert resolved == payload
+    bucket.open_download_stream.assert_awaited_once_with(stored.file_id)
+
+
+async def test_reference_to_changed_file(mocker):
+    referenced = reference_image_payload(
+        _new_image_event(base64.urlsafe_b64encode(IMAGE).decode()), _stored()
+    )
+    stream = mocker.AsyncMock()
+    stream.read.return_value = b"another image"
+    bucket = mocker.patch("exp_coord.handlers.save_all.create_grid_fs_client").return_value
+    bucket.open_download_stream = mocker.AsyncMock(return_value=stream)
+
+    with pytest.raises(ValueError, match="referenced image"):
+        await ImagePayloadReference.model_validate(referenced.content["image"]).download()
+
+
+def test_inline_payloads_setting(monkeypatch):
+    monkeypatch.setattr(get_settings().mongodb, "inline_image_payloads", True)
+    event = _new_image_event(base64.urlsafe_b64encode(IMAGE).decode())
+
+    assert reference_image_payload(event, _stored()) is event
+
+
+async def test_events_stored_before_are_skipped(mocker):
+    add = mocker.patch.object(save_all._event_saver.writer, "add")
+    mocker.patch.object(save_all, "AllMessagesAndEvents")
+    mocker.patch.object(save_all, "_recent", RecentIds(maxsize=10))
+    event = _event(get_settings().s3i.topics.status, {"status": "fetch"})
+
+    await save_all.SaveAllEventsHandler.handle(event)
+    save_all._recent.add(event.identifier)
+    await save_all.SaveAllEventsHandler.handle(event)
+
+    add.assert_called_once()
+
+
+def test_events_are_saved_after_new_images():
+    assert save_all.SaveAllEventsHandler.after == ["new_image"]
+
+
+async def test_events_and_messages_are_flushed_separately(mocker):
+    savers = (save_all._event_saver, save_all._message_saver)
+    flushes = [mocker.patch.object(saver.writer, "flush") for saver in savers]
+    for saver in savers:
+        mocker.patch.object(saver.rollups, "flush")
+
+    await save_all.SaveAllEventsHandler.flush()
+
+    flushes[0].assert_awaited_once()
+    flushes[1].assert_not_awaited()
+    assert save_all.SaveAllEventsHandler.flush != save_all.SaveAllMessagesHandler.flush
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 
 import httpx
@@ -103,6 +104,7 @@ async def test_get_valid_token_with_refresh(respx_mock, http_client, auth_config
     # Next call should refresh the token
     token = await auth.get_valid_token()
     assert token == "new_access_token"
+    await auth.aclose()
 
 
 async def test_auth_flow(respx_mock, http_client, auth_config):
@@ -127,3 +129,67 @@ async def test_auth_flow(respx_mock, http_client, auth_config):
     authorized_request = await anext(flow)
 
     assert authorized_request.headers["Authorization"] == "Bearer new_access_token"
+    await auth.aclose()
+
+
+def _mock_token_endpoint(respx_mock, auth_config, expires_in: int = 3600):
+    route = respx_mock.post(
+        f"{auth_config['keycloak_url']}/realms/{auth_config['realm']}/protocol/openid-connect/token"
+    )
+    return route.mock(
+        side_effect=lambda request: httpx.Response(
+            200,
+            json={
+                "access_token": f"access_token_{route.call_count + 1}",
+                "refresh_token": "refresh_token",
+                "expires_in": expires_in,
+            },
+        )
+    )
+
+
+async def test_get_valid_token_concurrently(respx_mock, http_client, auth_config):
+    """Test that concurrent callers share a single token request."""
+    route = _mock_token_endpoint(respx_mock, auth_config)
+
+    auth = KeycloakAuth(http_client=http_client, **auth_config)
+    tokens = await asyncio.gather(*(auth.get_valid_token() for _ in range(100)))
+
+    assert set(tokens) == {"access_token_1"}
+    assert route.call_count == 1
+    await auth.aclose()
+
+
+async def test_get_valid_token_fast_path(respx_mock, http_client, auth_config, mocker):
+    """Test that a valid token is returned without taking the lock."""
+    auth = KeycloakAuth(http_client=http_client, background_refresh=False, **auth_config)
+    auth._token_data = TokenData(
+        access_token="valid_access_token",
+        refresh_token=None,
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+    )
+    acquire = mocker.spy(auth._lock, "acquire")
+
+    assert await auth.get_valid_token() == "valid_access_token"
+    acquire.assert_not_called()
+
+
+async def test_background_refresh(respx_mock, http_client, auth_config):
+    """Test that the token is replaced before requests would have to refresh it."""
+    route = _mock_token_endpoint(respx_mock, auth_config, expires_in=1)
+
+    auth = KeycloakAuth(
+        http_client=http_client,
+        token_refresh_margin=timedelta(milliseconds=200),
+        refresh_retry_delay=timedelta(milliseconds=10),
+        **auth_config,
+    )
+    assert await auth.get_valid_token() == "access_token_1"
+
+    # Refreshed in the background 2 margins before expiry, i.e. after around 0.6s
+    await asyncio.sleep(0.75)
+    assert route.call_count == 2
+    assert auth._token_data.access_token == "access_token_2"
+
+    await auth.aclose()
+    assert auth._refresh_task is None
@@ -0,0 +1,83 @@
+import httpx
+import pytest
+
+from exp_coord.core.config import S3ISettings
+from exp_coord.services.s3i import HTTPPool, S3IBrokerClient, S3IError
+
+EVENT = {
+    "sender": "s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3",
+    "identifier": "s3i:6b1e5b41-1b0a-4bb8-9a2e-3fb8e58b6d35",
+    "timestamp": 1744000000,
+    "topic": "plant-growth-observation_status",
+    "messageType": "eventMessage",
+    "content": {"type": "status", "status": "fetch"},
+}
+
+
+@pytest.fixture
+def s3i_settings() -> S3ISettings:
+    return S3ISettings.model_validate(
+        {
+            "client_id": "s3i:ab1b96cb-2181-41c6-8aaa-8ad61b813198",
+            "client_secret": "test-secret",
+            "message_queue": "s3ibs://s3i:ab1b96cb-2181-41c6-8aaa-8ad61b813198",
+            "event_queue": "s3ib://s3i:ab1b96cb-2181-41c6-8aaa-8ad61b813198/event",
+            "auth_url": "https://keycloak.example.com",
+            "auth_realm": "myrealm",
+            "broker_url": "https://broker.example.com",
+            "config_url": "https://config.example.com",
+        }
+    )
+
+
+@pytest.fixture(autouse=True)
+def mock_token(respx_mock, s3i_settings):
+    respx_mock.post(
+        f"{s3i_settings.auth_url}/realms/{s3i_settings.auth_realm}/protocol/openid-connect/token"
+    ).mock(return_value=httpx.Response(200, json={"access_token": "token", "expires_in": 3600}))
+
+
+async def test_iter_all_events(respx_mock, s3i_settings):
+    events = [EVENT, {**EVENT, "identifier": "s3i:0e0e4d3f-5a5c-4ab4-b0ba-d2f0a1e1a1f4"}]
+    respx_mock.get(f"{s3i_settings.broker_url}/{s3i_settings.event_queue}/all").mock(
+        return_value=httpx.Response(200, json=events)
+    )
+
+    async with S3IBrokerClient(s3i_settings) as client:
+        received = [event async for event in client.iter_all_events()]
+
+    assert [event.model_dump() for event in received] == events
+
+
+async def test_iter_all_events_error(respx_mock, s3i_settings):
+    respx_mock.get(f"{s3i_settings.broker_url}/{s3i_settings.event_queue}/all").mock(
+        return_value=httpx.Response(500, json={"error_message": "Broken"})
+    )
+
+    async with S3IBrokerClient(s3i_settings) as client:
+        with pytest.raises(S3IError, match="Broken"):
+            _ = [event async for event in client.iter_all_events()]
+
+
+async def test_iter_all_messages_empty(respx_mock, s3i_settings):
+    respx_mock.get(f"{s3i_settings.broker_url}/{s3i_settings.message_queue}/all").mock(
+        return_value=httpx.Response(200, json=[])
+    )
+
+    async with S3IBrokerClient(s3i_settings) as client:
+        assert [message async for message in client.iter_all_messages()] == []
+
+
+async def test_closes_own_pool(s3i_settings):
+    client = S3IBrokerClient(s3i_settings)
+    await client.aclose()
+
+    assert client.pool.is_closed
+
+
+async def test_leaves_shared_pool_open(s3i_settings):
+    async with HTTPPool() as pool:
+        async with S3IBrokerClient(s3i_settings, pool=pool) as client:
+            assert client.pool is pool
+
+        assert not pool.is_closed
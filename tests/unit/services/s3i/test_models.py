@@ -3,9 +3,9 @@ from pathlib import Path
 from typing import Iterable
 
 import pytest
-from pydantic import TypeAdapter
+from pydantic import TypeAdapter, ValidationError
 
-from exp_coord.services.s3i.broker.models import S3IMessage
+from exp_coord.services.s3i.broker.models import S3IEvent, S3IMessage, S3IMessageOrEvent
 
 
 def get_broker_api_examples() -> Iterable[dict]:
@@ -23,3 +23,27 @@ def s3i_message_adapter() -> TypeAdapter[S3IMessage]:
 def test_message_models(example: dict, s3i_message_adapter):
     """Test the message models against the broker API examples from the Swagger docs."""
     s3i_message_adapter.validate_python(example)
+
+
+@pytest.mark.parametrize("example", get_broker_api_examples())
+def test_message_or_event_model(example: dict):
+    """Test that messages are decoded into the model named by their messageType."""
+    decoded = TypeAdapter(S3IMessageOrEvent).validate_python(example)
+    assert decoded.messageType == example["messageType"]
+
+
+def test_event_in_message_or_event_model():
+    event = {
+        "sender": "s3i:eb13aa70-ede6-4f98-9eb9-fc7e2f91f1d3",
+        "identifier": "s3i:6b1e5b41-1b0a-4bb8-9a2e-3fb8e58b6d35",
+        "timestamp": 1744000000,
+        "topic": "status",
+        "messageType": "eventMessage",
+        "content": {},
+    }
+    assert isinstance(TypeAdapter(S3IMessageOrEvent).validate_python(event), S3IEvent)
+
+
+def test_unknown_message_type(s3i_message_adapter):
+    with pytest.raises(ValidationError, match="union_tag_invalid"):
+        s3i_message_adapter.validate_python({"messageType": "unknownMessage"})
@@ -1,7 +1,10 @@
+import asyncio
+from dataclasses import dataclass
 from unittest.mock import AsyncMock
 
 import pytest
 
+from exp_coord.core.metrics import registry
 from exp_coord.services.s3i import Handler, Processor
 
 
@@ -98,3 +101,186 @@ async def test_all_handlers_processed_even_if_one_failed():
     assert len(exc_info.value.exceptions) == 1
     assert isinstance(exc_info.value.exceptions[0], ValueError)
     assert str(exc_info.value.exceptions[0]) == "Test error"
+
+
+def _handler_sample(name: str, handler: str) -> float:
+    return registry.get_sample_value(name, {"handler": handler}) or 0
+
+
+async def test_process_records_handler_metrics():
+    handlers = [
+        Handler("metrics_ok", None, AsyncMock()),
+        Handler("metrics_failing", None, AsyncMock(side_effect=ValueError("Test error"))),
+    ]
+    processor = Processor[str](handlers)
+    calls, failures = "exp_coord_handler_duration_seconds_count", "exp_coord_handler_failures_total"
+    calls_before = {h.name: _handler_sample(calls, h.name) for h in handlers}
+    failures_before = {h.name: _handler_sample(failures, h.name) for h in handlers}
+
+    with pytest.raises(ExceptionGroup):
+        await processor.process("test")
+
+    for handler in handlers:
+        assert _handler_sample(calls, handler.name) == calls_before[handler.name] + 1
+    assert _handler_sample(failures, "metrics_ok") == failures_before["metrics_ok"]
+    assert _handler_sample(failures, "metrics_failing") == failures_before["metrics_failing"] + 1
+
+
+async def test_process_all_async_iterable():
+    handle = AsyncMock()
+    processor = Processor[str]([Handler("test", lambda m: True, handle)])
+
+    async def messages():
+        yield "test1"
+        yield "test2"
+
+    assert await processor.process_all(messages()) == 2
+    assert [call.args for call in handle.await_args_list] == [("test1",), ("test2",)]
+
+
+async def test_process_all_async_iterable_fails():
+    handle = AsyncMock()
+    processor = Processor[str]([Handler("test", lambda m: True, handle)])
+
+    async def messages():
+        yield "test1"
+        raise ValueError("Connection lost")
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await processor.process_all(messages())
+
+    # The messages received before the failure are still processed
+    handle.assert_awaited_once_with("test1")
+    assert [str(exc) for exc in exc_info.value.exceptions] == ["Connection lost"]
+
+
+async def test_process_all_pooled_limits_concurrency():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handle(message):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+
+    processor = Processor[int]([Handler("test", lambda m: True, handle)], max_concurrency=3)
+
+    assert await processor.process_all(range(20)) == 20
+    assert max_in_flight == 3
+
+
+async def test_process_all_pooled_merges_exceptions():
+    async def handle(message):
+        if message % 2:
+            raise ValueError(message)
+
+    async def messages():
+        for message in range(5):
+            yield message
+
+    processor = Processor[int]([Handler("test", lambda m: True, handle)], max_concurrency=2)
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await processor.process_all(messages())
+
+    assert sorted(str(exc) for exc in exc_info.value.exceptions) == ["1", "3"]
+    assert all(isinstance(exc, ValueError) for exc in exc_info.value.exceptions)
+
+
+@dataclass
+class TopicMessage:
+    topic: str
+    messageType: str = "eventMessage"
+
+
+def test_find_handlers_by_topic():
+    async def handle(message):
+        pass
+
+    handlers = [
+        Handler("topic_a", None, handle, topic="a"),
+        Handler("any_event", None, handle, message_type="eventMessage"),
+        Handler("topic_b_filtered", lambda m: m.messageType == "other", handle, topic="b"),
+        Handler("everything", None, handle),
+    ]
+    processor = Processor[TopicMessage](handlers)
+
+    assert processor.find_handlers(TopicMessage("a")) == [handlers[0], handlers[1], handlers[3]]
+    assert processor.find_handlers(TopicMessage("b")) == [handlers[1], handlers[3]]
+    assert processor.find_handlers(TopicMessage("b", "other")) == [handlers[2], handlers[3]]
+    assert processor.find_handlers(TopicMessage("unknown", "other")) == [handlers[3]]
+
+
+async def test_process_concurrent_handlers():
+    order = []
+
+    def make_handle(name, delay):
+        async def handle(message):
+            order.append(f"{name} started")
+            await asyncio.sleep(delay)
+            order.append(f"{name} finished")
+
+        return handle
+
+    handlers = [
+        Handler("slow", None, make_handle("slow", 0.02)),
+        Handler("fast", None, make_handle("fast", 0)),
+        Handler("after_slow", None, make_handle("after_slow", 0), after=["slow", "not_selected"]),
+    ]
+    processor = Processor[str](handlers, concurrent_handlers=True)
+
+    await processor.process("test")
+
+    # "fast" doesn't wait for "slow", but "after_slow" does
+    assert order.index("fast finished") < order.index("slow finished")
+    assert order.index("slow finished") < order.index("after_slow started")
+
+
+async def test_process_concurrent_handlers_failing():
+    handle_1 = AsyncMock(side_effect=ValueError("Test error"))
+    handle_2 = AsyncMock()
+
+    handlers = [
+        Handler("test1_handler1", None, handle_1),
+        Handler("test1_handler2", None, handle_2, after=["test1_handler1"]),
+    ]
+    processor = Processor[str](handlers, concurrent_handlers=True)
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await processor.process("test1")
+
+    # A failed dependency doesn't prevent the dependent handler from running
+    handle_2.assert_awaited_once_with("test1")
+    assert [str(exc) for exc in exc_info.value.exceptions] == ["Test error"]
+
+
+def test_dependency_cycle():
+    async def handle(message):
+        pass
+
+    handlers = [
+        Handler("a", None, handle, after=["c"]),
+        Handler("b", None, handle, after=["a"]),
+        Handler("c", None, handle, after=["b"]),
+    ]
+
+    with pytest.raises(ValueError, match="a -> c -> b -> a"):
+        Processor[str](handlers)
+
+
+async def test_process_all_flushes_handlers():
+    flush = AsyncMock(side_effect=ExceptionGroup("Failed to insert", [ValueError("Deferred")]))
+    handlers = [
+        Handler("test1", None, AsyncMock(), flush=flush),
+        Handler("test2", None, AsyncMock(), flush=flush),
+    ]
+    processor = Processor[str](handlers)
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        await processor.process_all(["test1", "test2"])
+
+    # Shared flushes are only called once
+    flush.assert_awaited_once()
+    assert [str(exc) for exc in exc_info.value.exceptions] == ["Deferred"]
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from exp_coord.services.s3i.base.streaming import (
+    JSONArrayDecodeError,
+    JSONArrayStreamSplitter,
+    aiter_json_array,
+)
+
+SAMPLE = [
+    {"text": 'brackets ]}[{ and "quotes", inside strings', "nested": [1, {"a": "\\"}]},
+    12,
+    "a string with an escaped backslash \\",
+    [],
+    {},
+    None,
+    {"image": "A" * 5000},
+]
+
+
+def split(raw: bytes, chunk_size: int) -> list[bytes]:
+    splitter = JSONArrayStreamSplitter()
+    items = []
+    for i in range(0, len(raw), chunk_size):
+        items.extend(splitter.feed(raw[i : i + chunk_size]))
+    splitter.close()
+    return items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_split_items_across_chunk_boundaries(chunk_size):
+    raw = json.dumps(SAMPLE).encode()
+    assert [json.loads(item) for item in split(raw, chunk_size)] == SAMPLE
+
+
+def test_items_are_returned_as_soon_as_they_are_complete():
+    splitter = JSONArrayStreamSplitter()
+    assert splitter.feed(b'[{"a": 1}, {"b"') == [b'{"a": 1}']
+    assert splitter.feed(b": 2}]") == [b'{"b": 2}']
+    splitter.close()
+
+
+@pytest.mark.parametrize("raw", [b"", b"  ", b"[]", b" [ \n ] "])
+def test_empty(raw):
+    assert split(raw, 1) == []
+
+
+@pytest.mark.parametrize("raw", [b'{"a": 1}', b"[1, 2", b"[1,,2]", b"[1] 2"])
+def test_malformed(raw):
+    with pytest.raises(JSONArrayDecodeError):
+        split(raw, 1)
+
+
+async def test_aiter_json_array():
+    async def chunks():
+        yield b'[{"a": '
+        yield b'1}, {"b": 2}'
+        yield b"]"
+
+    assert [item async for item in aiter_json_array(chunks())] == [b'{"a": 1}', b'{"b": 2}']
@@ -0,0 +1,82 @@
+import importlib.util
+
+import httpx
+import pytest
+
+from exp_coord.core.config import HTTPPoolSettings
+from exp_coord.services.s3i import HTTPPool
+from exp_coord.services.s3i.base.transport import _PoolTransport
+
+
+async def test_clients_share_pool(respx_mock):
+    respx_mock.get("https://a.example.com/").mock(return_value=httpx.Response(200))
+    respx_mock.get("https://b.example.com/").mock(return_value=httpx.Response(200))
+
+    async with HTTPPool() as pool:
+        client_a = pool.create_client(base_url="https://a.example.com")
+        client_b = pool.create_client(base_url="https://b.example.com")
+
+        await client_a.get("/")
+        await client_a.aclose()
+        # Closing one client leaves the pool usable for the others
+        await client_b.get("/")
+        await client_b.aclose()
+
+        stats = pool.stats()
+        assert stats.requests == 2
+        assert stats.in_flight == 0
+        assert stats.peak_in_flight == 1
+        assert stats.queued == 0
+
+    assert pool.is_closed
+    with pytest.raises(RuntimeError, match="already closed"):
+        pool.create_client()
+
+
+def test_from_settings():
+    pool = HTTPPool.from_settings(
+        HTTPPoolSettings(max_connections=7, keepalive_expiry=12, timeout=3, pool_timeout=4)
+    )
+
+    assert pool.limits.max_connections == 7
+    assert pool.limits.keepalive_expiry == 12
+    assert pool.timeout == httpx.Timeout(3, pool=4)
+    assert pool.create_client().timeout == httpx.Timeout(3, pool=4)
+
+
+@pytest.mark.skipif(importlib.util.find_spec("h2") is not None, reason="h2 is installed")
+def test_http2_requires_h2():
+    with pytest.raises(ImportError, match="httpx\\[http2\\]"):
+        HTTPPool(http2=True)
+
+
+async def test_custom_transport():
+    transport = httpx.MockTransport(lambda request: httpx.Response(204))
+
+    async with HTTPPool(transport=transport) as pool:
+        async with pool.create_client(base_url="https://example.com") as client:
+            response = await client.get("/")
+
+        assert response.status_code == 204
+        assert pool.stats().requests == 1
+        assert pool.stats().connections_opened == 0
+
+
+async def test_traced_request_is_queued_until_it_gets_a_connection():
+    traced = []
+
+    async def outer_trace(event_name: str, info: dict) -> None:
+        traced.append(event_name)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert transport.queued == 1
+        await request.extensions["trace"]("connection.connect_tcp.complete", {})
+        assert transport.queued == 0
+        return httpx.Response(204)
+
+    transport = _PoolTransport(httpx.MockTransport(handler), traced=True)
+    async with httpx.AsyncClient(transport=transport) as client:
+        await client.get("https://example.com/", extensions={"trace": outer_trace})
+
+    assert (transport.requests, transport.queued, transport.connections_opened) == (1, 0, 1)
+    assert traced == ["connection.connect_tcp.complete"]